@@ -48,8 +48,12 @@
 
 
 from .. import pylivecoding
-from . import backend,core,tests
-from .PIL import Image
+from . import backend,atlas,textures,bundle,profiler,core,tests
+try:
+    from .PIL import Image
+except ImportError:
+    from PIL import Image
 
 live_environment = pylivecoding.LiveEnvironment()
-live_environment.live_modules=["pylivecoding","morpheas.backend","morpheas.core","morpheas.tests"]
+live_environment.live_modules=["pylivecoding","morpheas.backend","morpheas.atlas","morpheas.textures",
+                               "morpheas.bundle","morpheas.profiler","morpheas.core","morpheas.tests"]
@@ -0,0 +1,240 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Texture atlases. Skins are made of many small PNG files and each one becomes its own texture, so drawing a GUI
+# means binding a different texture for almost every morph. The atlas builder packs all the textures used by
+# the morphs of a World into one or a few big textures (pages) and points each texture of the morphs to the part
+# of the page that holds it. Building the pages is slow so they are saved to disk, together with their layout,
+# and are loaded from there as long as none of the PNG files has changed. A skin bundle can hold the pages and
+# layouts too, see bundle.py
+
+import os, json, hashlib, numpy
+from .. import pylivecoding
+try:
+    from .PIL import Image
+except ImportError:
+    from PIL import Image
+
+
+# The skyline packer places rectangles inside a page of fixed size. It remembers the skyline, the upper outline
+# of the rectangles placed so far, as segments [x, y, width] sorted by x, with y growing downwards. A new rectangle
+# is placed where its bottom would be the highest, ties going to the leftmost place, which is the bottom left rule
+# of skyline packing turned upside down to match the rows of a PNG. Padding is the space kept around each
+# rectangle so that filtering does not blend neighbouring textures
+class MSkylinePacker(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, width=2048, height=2048, padding=2):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.skyline = [[0, 0, width]]
+
+    # places a rectangle and returns its [x, y] or None if it does not fit in the page
+    def insert(self, width, height):
+        width = width + self.padding * 2
+        height = height + self.padding * 2
+        best = None
+        for index in range(len(self.skyline)):
+            x = self.skyline[index][0]
+            if x + width > self.width:
+                break
+            y = self.fit_height(index, width)
+            if y + height > self.height:
+                continue
+            if best is None or (y + height, x) < (best[1] + height, best[0]):
+                best = (x, y)
+        if best is None:
+            return None
+        self.place(best[0], best[1], width, height)
+        return [best[0] + self.padding, best[1] + self.padding]
+
+    # the lowest y a rectangle of this width can have starting at the segment of the index
+    def fit_height(self, index, width):
+        end = self.skyline[index][0] + width
+        y = 0
+        while index < len(self.skyline) and self.skyline[index][0] < end:
+            y = max(y, self.skyline[index][1])
+            index += 1
+        return y
+
+    # raises the skyline under the placed rectangle
+    def place(self, x, y, width, height):
+        end = x + width
+        skyline = [[x, y + height, width]]
+        for segment_x, segment_y, segment_width in self.skyline:
+            segment_end = segment_x + segment_width
+            if segment_end <= x or segment_x >= end:
+                skyline.append([segment_x, segment_y, segment_width])
+                continue
+            if segment_x < x:
+                skyline.append([segment_x, segment_y, x - segment_x])
+            if segment_end > end:
+                skyline.append([end, segment_y, segment_end - end])
+        skyline.sort()
+        self.skyline = [skyline[0]]
+        for segment in skyline[1:]:
+            if segment[1] == self.skyline[-1][1]:
+                self.skyline[-1][2] += segment[2]
+            else:
+                self.skyline.append(segment)
+
+
+# The atlas builder collects the textures of all morphs of a World, packs them into pages with MSkylinePacker
+# and saves each page as a PNG file in the cache folder, with a JSON file describing where each texture went.
+# The padding around each texture repeats its edge pixels, so filtering at its border samples the texture
+# and not the empty page. Then it loads the pages through the texture cache of the World and gives the morphs of
+# the World copies of their texture records with two more entries, the records themselves are shared through the
+# texture cache with morphs of other worlds. 'atlas' is the texture of the page and 'uv_rectangle' is
+# [u1, v1, u2, v2] the part of the page that holds the texture, where v starts at the first row of the PNG. The
+# backend draws the page instead of the texture itself, so the copies do not keep the pixels of the texture.
+# Textures bigger than a page are left as they are. Building again releases the pages of the previous build
+class MTextureAtlasBuilder(pylivecoding.LiveObject):
+    instances = []
+
+    # changes whenever the way pages are built changes, so old pages in the cache are not used
+    layout_version = 2
+
+    def __init__(self, world, cache_path, page_size=2048, padding=2):
+        super().__init__()
+        self.world = world
+        self.cache_path = cache_path
+        self.page_size = page_size
+        self.padding = padding
+
+        # the textures of the pages and the layout, for each PNG file [x, y, width, height, page]
+        self.pages = []
+        self.page_paths = []
+        self.layout = {}
+        self.key = None
+        self.loaded_from_cache = False
+
+    # all textures of the morphs of the world grouped by the PNG file they come from
+    def collect_textures(self):
+        textures = {}
+        for morph in self.world.all_morphs():
+            for texture in morph.textures.values():
+                if not texture.get('is_loaded', True):
+                    continue
+                textures.setdefault(texture['full_path'], []).append(texture)
+        return textures
+
+    # the name of the files in the cache, it changes if any PNG file is added, removed or modified
+    def cache_key(self, full_paths):
+        key = hashlib.sha1()
+        key.update(repr((self.layout_version, self.page_size, self.padding)).encode())
+        for full_path in sorted(full_paths):
+            key.update(full_path.encode())
+            key.update(repr(os.path.getmtime(full_path)).encode())
+        return key.hexdigest()
+
+    def build(self):
+        textures = self.collect_textures()
+        key = self.cache_key(textures.keys())
+        layout_path = os.path.join(self.cache_path, key + '.json')
+        skin_bundle = self.world.skin_bundle
+        if os.path.exists(layout_path):
+            with open(layout_path) as layout_file:
+                cached = json.load(layout_file)
+            self.layout = cached['layout']
+            page_paths = cached['pages']
+            self.loaded_from_cache = True
+        elif skin_bundle is not None and key in skin_bundle.atlas_layouts:
+            self.layout = skin_bundle.atlas_layouts[key]['layout']
+            page_paths = skin_bundle.atlas_layouts[key]['pages']
+            self.loaded_from_cache = True
+        else:
+            page_paths = self.pack(textures, key)
+            os.makedirs(self.cache_path, exist_ok=True)
+            with open(layout_path, 'w') as layout_file:
+                json.dump({'layout': self.layout, 'pages': page_paths}, layout_file)
+            self.loaded_from_cache = False
+
+        self.key = key
+        self.page_paths = page_paths
+        # the pages are only drawn, hit testing uses the alpha masks of the textures themselves
+        options = dict(self.world.texture_options(), alpha_mask_threshold=None)
+        old_pages = self.pages
+        self.pages = [self.world.texture_cache.acquire(os.path.join(self.cache_path, page_path),
+                                                       self.world.read_texture, options)
+                      for page_path in page_paths]
+        self.release_pages(old_pages)
+        atlas_textures = {}
+        for morph in self.world.all_morphs():
+            for name, texture in morph.textures.items():
+                if not texture.get('is_loaded', True) or texture['full_path'] not in self.layout:
+                    continue
+                if id(texture) not in atlas_textures:
+                    x, y, width, height, page = self.layout[texture['full_path']]
+                    page_width, page_height = self.pages[page]['dimensions']
+                    atlas_textures[id(texture)] = dict(texture, atlas=self.pages[page], pixels=None, data=None,
+                                                       uv_rectangle=[x / page_width, y / page_height,
+                                                                     (x + width) / page_width,
+                                                                     (y + height) / page_height])
+                morph.textures[name] = atlas_textures[id(texture)]
+            if morph.active_texture_name in morph.textures:
+                morph.active_texture = morph.textures[morph.active_texture_name]
+            morph.appearance_changed()
+        return self.pages
+
+    # gives the pages back to the texture cache. The pages no longer in use are dropped from the cache at once and
+    # their OpenGL textures are deleted the next time the world draws, pages of an old layout are not used again
+    def release_pages(self, pages):
+        texture_cache = self.world.texture_cache
+        for page in pages:
+            texture_cache.release(page)
+            if all(page is not new_page for new_page in self.pages):
+                texture_cache.discard(page)
+
+    # packs the PNG files in pages, biggest first, and saves the pages. Returns the file names of the pages
+    def pack(self, textures, key):
+        sizes = {}
+        for full_path, texture_list in textures.items():
+            sizes[full_path] = texture_list[0]['dimensions']
+        order = sorted(sizes, key=lambda full_path: (sizes[full_path][1], sizes[full_path][0]), reverse=True)
+        packers = []
+        self.layout = {}
+        for full_path in order:
+            width, height = sizes[full_path]
+            position = None
+            for page, packer in enumerate(packers):
+                position = packer.insert(width, height)
+                if position is not None:
+                    break
+            if position is None:
+                packer = MSkylinePacker(self.page_size, self.page_size, self.padding)
+                position = packer.insert(width, height)
+                if position is None:
+                    continue
+                packers.append(packer)
+                page = len(packers) - 1
+            self.layout[full_path] = [position[0], position[1], width, height, page]
+
+        padding = self.padding
+        page_pixels = [numpy.zeros((self.page_size, self.page_size, 4), dtype=numpy.uint8) for packer in packers]
+        for full_path, (x, y, width, height, page) in self.layout.items():
+            pixels = numpy.array(Image.open(full_path).convert('RGBA'), dtype=numpy.uint8)
+            page_pixels[page][y - padding:y + height + padding, x - padding:x + width + padding] = \
+                numpy.pad(pixels, ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+        os.makedirs(self.cache_path, exist_ok=True)
+        page_paths = []
+        for page, pixels in enumerate(page_pixels):
+            page_path = '%s_%d.png' % (key, page)
+            Image.fromarray(pixels).save(os.path.join(self.cache_path, page_path))
+            page_paths.append(page_path)
+        return page_paths
@@ -1,206 +1,1019 @@
-from bgl import *
-from .PIL import Image
+# outside Blender the headless stand-in of bgl is used, see headless
+try:
+    import bpy
+except ImportError:
+    from .headless.bgl import *
+else:
+    from bgl import *
+try:
+    from .PIL import Image
+except ImportError:
+    from PIL import Image
 from .. import pylivecoding
-import numpy,pdb
+from . import textures
+import numpy,logging
+
+logger = logging.getLogger(__name__)
+
+# The display list is what MOpenGLCanvas draws. It is compiled from the morphs of a world into a NumPy array
+# with one row, a draw command, for each morph in the order the morphs are drawn (each parent before its children).
+# A command holds the rectangle of the morph and the rectangle it is clipped by in world coordinates, its color,
+# the index of its texture in the textures list, whether it is visible at all, the part of the texture it shows
+# as [u1, v1, u2, v2] (all of it unless the texture is in an atlas, see atlas.py) and whether its children are
+# visible, which they are even while its own texture is still loading. A morph whose texture has
+# nine slice insets takes 9 rows instead of one, see write_nine_slice. When morphs are added or removed
+# the whole list is compiled again. Any other change only patches the rows of the morphs that changed, see update.
+# Morphs whose subtree bounds are outside the viewport or outside the rectangle they are clipped by are left out
+# of the list together with all the morphs inside them, so a large scrolled canvas costs only what is on screen.
+# When such a morph comes into view the list is compiled again
+class MDisplayList(pylivecoding.LiveObject):
+    instances = []
+
+    # the columns of a draw command
+    X1, Y1, X2, Y2 = 0, 1, 2, 3
+    CLIP_X1, CLIP_Y1, CLIP_X2, CLIP_Y2 = 4, 5, 6, 7
+    R, G, B, ALPHA = 8, 9, 10, 11
+    TEXTURE = 12
+    VISIBLE = 13
+    U1, V1, U2, V2 = 14, 15, 16, 17
+    CHILDREN_VISIBLE = 18
+    COLUMNS = 19
+
+    def __init__(self, world):
+        super().__init__()
+        self.world = world
+        self.commands = numpy.zeros((0, self.COLUMNS), dtype=numpy.float32)
+
+        # the morph of each row, the first row of each morph and how many rows each morph takes
+        self.morphs = []
+        self.slots = {}
+        self.row_counts = {}
+
+        # the textures used by the commands, the TEXTURE column is an index to this list, -1 means no texture.
+        # New textures are added at the end and compiling removes the textures no longer in use, so it holds only
+        # the textures still in use. textures_version changes only when the textures in the list change
+        self.textures = []
+        self.texture_indices = {}
+        self.textures_version = 0
+
+        # the world's structure version the list was compiled for
+        self.compiled_structure_version = -1
+
+        # the part of the world on screen [x1, y1, x2, y2] set by the canvas before each update, None means the
+        # whole world. The list is compiled again when it changes
+        self.viewport = None
+        self.compiled_viewport = None
+
+        # how many morphs were left out with everything inside them the last time the list was compiled and
+        # whether a morph that was left out came into view while patching
+        self.culled_morphs = 0
+        self.needs_compile = False
+
+        # the rows changed since the last time they were taken with take_changed_slots
+        # all_changed means every row changed, for example after compiling
+        self.changed_slots = set()
+        self.all_changed = True
+
+        # how many times the list was compiled from scratch and how many rows were patched
+        self.recompiles = 0
+        self.patches = 0
+
+    # builds the whole list again from the morphs of the world
+    def compile(self):
+        self.morphs = []
+        self.slots = {}
+        self.row_counts = {}
+        self.culled_morphs = 0
+        self.needs_compile = False
+        self.compiled_viewport = self.viewport
+        world_clip = self.world_clip()
+        stack = [(morph, world_clip) for morph in reversed(self.world.children)]
+        while len(stack) > 0:
+            morph, clip = stack.pop()
+            if self.clip_rectangle(morph.subtree_bounds, clip) is None:
+                self.culled_morphs += 1
+                continue
+            self.slots[morph] = len(self.morphs)
+            self.row_counts[morph] = self.row_count(morph)
+            self.morphs.extend([morph] * self.row_counts[morph])
+            children_clip = self.clip_rectangle(self.morph_rectangle(morph), clip)
+            stack.extend((child, children_clip) for child in reversed(morph.children))
+        self.commands = numpy.zeros((len(self.morphs), self.COLUMNS), dtype=numpy.float32)
+        for morph, slot in self.slots.items():
+            self.write_command(slot)
+        self.remove_unused_textures()
+        self.compiled_structure_version = self.world.structure_version
+        self.changed_slots = set()
+        self.all_changed = True
+        self.recompiles += 1
+
+    # brings the list up to date after the given morphs have changed. If morphs were added or removed it compiles
+    # the whole list, otherwise it patches the rows of the changed morphs. If the rectangle or the visibility of a
+    # morph changed its children are patched too because they are clipped by it. The morphs are patched in the
+    # order of their rows, parents before their children, and each only once
+    def update(self, changed_morphs):
+        if self.compiled_structure_version != self.world.structure_version or \
+                self.compiled_viewport != self.viewport or \
+                any(self.row_count(morph) != self.row_counts[morph]
+                    for morph in changed_morphs if morph in self.slots) or \
+                any(self.is_in_view(morph) for morph in changed_morphs if morph not in self.slots):
+            self.compile()
+            return
+        patched_morphs = set()
+        for morph in sorted((morph for morph in changed_morphs if morph in self.slots), key=self.slots.get):
+            self.patch(morph, patched_morphs)
+        if self.needs_compile:
+            self.compile()
+
+    def patch(self, morph, patched_morphs):
+        if morph in patched_morphs:
+            return
+        patched_morphs.add(morph)
+        slot = self.slots[morph]
+        end = slot + self.row_counts[morph]
+        old_commands = self.commands[slot:end].copy()
+        self.write_command(slot)
+        self.changed_slots.update(range(slot, end))
+        self.patches += 1
+        new_commands = self.commands[slot:end]
+        if (old_commands[:, self.X1:self.CLIP_Y2 + 1] != new_commands[:, self.X1:self.CLIP_Y2 + 1]).any() or \
+                (old_commands[:, self.CHILDREN_VISIBLE] != new_commands[:, self.CHILDREN_VISIBLE]).any():
+            for child in morph.children:
+                if child in self.slots:
+                    self.patch(child, patched_morphs)
+                elif self.is_in_view(child):
+                    self.needs_compile = True
+
+    # the rectangle the children of the world are clipped by, the world itself inside the viewport
+    def world_clip(self):
+        clip = [0, 0, self.world.width, self.world.height]
+        if self.viewport is not None:
+            clip = self.clip_rectangle(clip, self.viewport)
+        return clip
+
+    def morph_rectangle(self, morph):
+        world_position = morph.world_position
+        return [world_position[0], world_position[1], world_position[0] + morph.width,
+                world_position[1] + morph.height]
+
+    # the part of the rectangle inside the clip rectangle, None if there is none or either of them is None
+    def clip_rectangle(self, rectangle, clip):
+        if rectangle is None or clip is None:
+            return None
+        clipped = [max(rectangle[0], clip[0]), max(rectangle[1], clip[1]), min(rectangle[2], clip[2]),
+                   min(rectangle[3], clip[3])]
+        if clipped[0] >= clipped[2] or clipped[1] >= clipped[3]:
+            return None
+        return clipped
+
+    # whether a morph of the world that is not in the list should be, because part of its subtree bounds is inside
+    # the viewport and the rectangles of all its parents
+    def is_in_view(self, morph):
+        if morph.world is not self.world:
+            return False
+        bounds = morph.subtree_bounds
+        parent = morph.parent
+        while bounds is not None and parent is not self.world:
+            if parent is None:
+                return False
+            bounds = self.clip_rectangle(bounds, self.morph_rectangle(parent))
+            parent = parent.parent
+        return self.clip_rectangle(bounds, self.world_clip()) is not None
+
+    # how many rows the morph takes, 9 if its texture is a nine slice texture
+    def row_count(self, morph):
+        texture = morph.active_texture
+        if isinstance(texture, dict) and texture.get('is_loaded', True) and morph.nine_slice_insets() is not None:
+            return 9
+        return 1
+
+    # fills the rows of the morph. Morphs which are children of the world are clipped by the world, all others by
+    # the part of their parent that is not clipped itself
+    def write_command(self, slot):
+        morph = self.morphs[slot]
+        command = self.commands[slot]
+        world_position = morph.world_position
+        command[self.X1] = world_position[0]
+        command[self.Y1] = world_position[1]
+        command[self.X2] = world_position[0] + morph.width
+        command[self.Y2] = world_position[1] + morph.height
+        parent_slot = self.slots.get(morph.parent)
+        if parent_slot is None:
+            command[self.CLIP_X1:self.CLIP_Y2 + 1] = (0, 0, self.world.width, self.world.height)
+            parent_visible = True
+        else:
+            # the first row of a morph starts at its bottom left corner and the last ends at its top right corner
+            parent_command = self.commands[parent_slot]
+            parent_last_command = self.commands[parent_slot + self.row_counts[morph.parent] - 1]
+            command[self.CLIP_X1] = max(parent_command[self.X1], parent_command[self.CLIP_X1])
+            command[self.CLIP_Y1] = max(parent_command[self.Y1], parent_command[self.CLIP_Y1])
+            command[self.CLIP_X2] = min(parent_last_command[self.X2], parent_command[self.CLIP_X2])
+            command[self.CLIP_Y2] = min(parent_last_command[self.Y2], parent_command[self.CLIP_Y2])
+            parent_visible = parent_command[self.CHILDREN_VISIBLE] != 0
+        command[self.R:self.ALPHA + 1] = morph.color
+        texture = morph.active_texture
+        texture_loaded = not isinstance(texture, dict) or texture.get('is_loaded', True)
+        if not texture_loaded:
+            command[self.TEXTURE] = -1
+            command[self.U1:self.V2 + 1] = (0, 0, 1, 1)
+        elif isinstance(texture, dict) and 'atlas' in texture:
+            command[self.TEXTURE] = self.texture_index(texture['atlas'])
+            command[self.U1:self.V2 + 1] = texture['uv_rectangle']
+        else:
+            command[self.TEXTURE] = self.texture_index(texture)
+            command[self.U1:self.V2 + 1] = (0, 0, 1, 1)
+        # a morph whose texture is still loading is not drawn until it has loaded, but its children are
+        command[self.CHILDREN_VISIBLE] = parent_visible and morph.can_draw and not morph.is_hidden
+        command[self.VISIBLE] = command[self.CHILDREN_VISIBLE] and texture_loaded
+        if self.row_counts[morph] == 9:
+            self.write_nine_slice(slot, morph.nine_slice_insets(), texture['dimensions'], morph.active_texture_scale)
+
+    # splits the row of a nine slice morph in 9 rows, one for each piece, from the bottom left to the top right.
+    # insets are [left, bottom, right, top] in pixels of the texture. The corners keep their size, the edges
+    # stretch along their length and the middle stretches both ways. If the morph is smaller than its corners
+    # the corners shrink to fit
+    def write_nine_slice(self, slot, insets, dimensions, scale):
+        command = self.commands[slot].copy()
+        left, bottom, right, top = [inset * scale for inset in insets]
+        width = command[self.X2] - command[self.X1]
+        height = command[self.Y2] - command[self.Y1]
+        shrink_x = min(1.0, width / (left + right)) if left + right > 0 else 1.0
+        shrink_y = min(1.0, height / (bottom + top)) if bottom + top > 0 else 1.0
+        xs = [command[self.X1], command[self.X1] + left * shrink_x, command[self.X2] - right * shrink_x,
+              command[self.X2]]
+        ys = [command[self.Y1], command[self.Y1] + bottom * shrink_y, command[self.Y2] - top * shrink_y,
+              command[self.Y2]]
+
+        # the texture coordinates of the cuts inside the part of the texture the morph shows, v goes from the top
+        u1, v1, u2, v2 = command[self.U1:self.V2 + 1]
+        us = [u1, u1 + (u2 - u1) * insets[0] / dimensions[0], u2 - (u2 - u1) * insets[2] / dimensions[0], u2]
+        vs = [v1, v1 + (v2 - v1) * insets[3] / dimensions[1], v2 - (v2 - v1) * insets[1] / dimensions[1], v2]
+        for row in range(3):
+            for column in range(3):
+                piece = self.commands[slot + row * 3 + column]
+                piece[:] = command
+                piece[self.X1:self.Y2 + 1] = (xs[column], ys[row], xs[column + 1], ys[row + 1])
+                piece[self.U1:self.V2 + 1] = (us[column], vs[2 - row], us[column + 1], vs[3 - row])
+
+    def texture_index(self, texture):
+        if not isinstance(texture, dict):
+            return -1
+        index = self.texture_indices.get(id(texture))
+        if index is None:
+            index = len(self.textures)
+            self.textures.append(texture)
+            self.texture_indices[id(texture)] = index
+            self.textures_version += 1
+        return index
+
+    # removes from the textures list the textures no command uses any more, the textures that stay keep their
+    # order so the indices of the commands only move down
+    def remove_unused_textures(self):
+        used = numpy.zeros(len(self.textures) + 1, dtype=bool)
+        used[self.commands[:, self.TEXTURE].astype(numpy.intp)] = True
+        used = used[:-1]
+        if used.all():
+            return
+        new_indices = numpy.cumsum(used) - 1
+        self.textures = [texture for texture, is_used in zip(self.textures, used) if is_used]
+        self.texture_indices = {id(texture): index for index, texture in enumerate(self.textures)}
+        texture_column = self.commands[:, self.TEXTURE]
+        has_texture = texture_column >= 0
+        texture_column[has_texture] = new_indices[texture_column[has_texture].astype(numpy.intp)]
+        self.textures_version += 1
+
+    # returns the rows that changed since the last call and forgets them, or None if every row changed
+    def take_changed_slots(self):
+        if self.all_changed:
+            changed_slots = None
+        else:
+            changed_slots = sorted(self.changed_slots)
+        self.all_changed = False
+        self.changed_slots = set()
+        return changed_slots
+
+    # how often the list was compiled and patched
+    def stats(self):
+        return {'recompiles': self.recompiles, 'patches': self.patches, 'commands': len(self.morphs),
+                'morphs': len(self.slots), 'culled_morphs': self.culled_morphs}
+
+
+# The state cache remembers the OpenGL state the canvas has set during the current frame, the shader program,
+# the bound textures, the enabled capabilities, the blend function and the integer uniforms. Asking it to set a
+# state that is already set does nothing. Blender and other addons draw between our frames so the cache forgets
+# everything at the beginning of each frame. It also counts what it actually sent to OpenGL during the frame
+class MGLStateCache(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self):
+        super().__init__()
+        self.begin_frame()
+
+    def begin_frame(self):
+        self.program = None
+        self.bound_textures = {}
+        self.capabilities = {}
+        self.blend = None
+        self.uniforms = {}
+        self.draw_calls = 0
+        self.texture_binds = 0
+        self.state_changes = 0
+        self.redundant_changes = 0
+
+    def use_program(self, program):
+        if self.program == program:
+            self.redundant_changes += 1
+            return
+        glUseProgram(program)
+        self.program = program
+        self.uniforms = {}
+        self.state_changes += 1
+
+    def bind_texture(self, target, texture_id):
+        if self.bound_textures.get(target) == texture_id:
+            self.redundant_changes += 1
+            return
+        glBindTexture(target, texture_id)
+        self.bound_textures[target] = texture_id
+        self.texture_binds += 1
+        self.state_changes += 1
+
+    def enable(self, capability):
+        if self.capabilities.get(capability) is True:
+            self.redundant_changes += 1
+            return
+        glEnable(capability)
+        self.capabilities[capability] = True
+        self.state_changes += 1
+
+    def disable(self, capability):
+        if self.capabilities.get(capability) is False:
+            self.redundant_changes += 1
+            return
+        glDisable(capability)
+        self.capabilities[capability] = False
+        self.state_changes += 1
+
+    def blend_function(self, source, destination):
+        if self.blend == (source, destination):
+            self.redundant_changes += 1
+            return
+        glBlendFunc(source, destination)
+        self.blend = (source, destination)
+        self.state_changes += 1
+
+    # uniforms belong to the shader program in use, they are forgotten when the program changes
+    def uniform_int(self, location, value):
+        if self.uniforms.get(location) == value:
+            self.redundant_changes += 1
+            return
+        glUniform1i(location, value)
+        self.uniforms[location] = value
+        self.state_changes += 1
+
+    def draw_elements(self, mode, count, element_type, offset_pointer):
+        glDrawElements(mode, count, element_type, offset_pointer)
+        self.draw_calls += 1
+
+    def draw_arrays_instanced(self, mode, first, count, instance_count):
+        glDrawArraysInstanced(mode, first, count, instance_count)
+        self.draw_calls += 1
+
+    def stats(self):
+        return {'draw_calls': self.draw_calls, 'texture_binds': self.texture_binds,
+                'state_changes': self.state_changes, 'redundant_changes': self.redundant_changes}
+
 
 class MOpenGLCanvas(pylivecoding.LiveObject):
     instances = []
+
+    # floats per vertex, x, y, r, g, b, alpha, u, v
+    VERTEX_SIZE = 8
+
+    # floats per instance in instanced rendering, rectangle (x1, y1, x2, y2), texture rectangle (u1, v1, u2, v2),
+    # color (r, g, b, alpha), texture layer and clip rectangle (x1, y1, x2, y2)
+    INSTANCE_SIZE = 17
+
+    # the biggest array texture instanced rendering makes, the width and height of a layer and the bytes of all
+    # layers. If the textures of the world do not fit the canvas draws each morph separately instead
+    TEXTURE_ARRAY_MAX_SIZE = 2048
+    TEXTURE_ARRAY_MAX_BYTES = 128 * 1024 * 1024
+
     def __init__(self,world):
         super().__init__()
         self.world = world
         self.openGLversion = 3.3
-        self.vertices_list = []
+
+        # the vertices of all morphs as generated by generate_vertices_list
+        self.vertex_data = numpy.zeros((0, self.VERTEX_SIZE), dtype=numpy.float32)
         self.needs_to_update_vertices_list = False
         self.initialised_OpenGL_context = False
         self.success_pointer = None
         self.void_pointer = None
         self.VAO_pointer = None
         self.VBO_pointer = None
+        self.EBO_pointer = None
+        self.has_texture_location = None
+        self.premultiplied_alpha_location = None
         self.vertex_shader = None
         self.vertex_shader_source = None
         self.fragment_shader = None
         self.fragment_shader_source = None
-        self.vertices = []
         self.shader_program = None
 
+        # the vertex buffer stays on the graphic card and each morph owns the vertices of its slot, see
+        # upload_vertices. The capacity is counted in morphs. The counters tell how many uploads happened,
+        # how many bytes they sent and how many times the buffer had to grow
+        self.vertex_buffer_capacity = 0
+        self.vertices_draw_area = None
+        self.vertex_uploads = 0
+        self.bytes_uploaded = 0
+        self.buffer_reallocations = 0
+
+        # instanced rendering draws all morphs with one call, each morph is an instance of the same unit rectangle
+        # so it sends a quarter of the data of the vertices. It needs OpenGL 3.3 functions that may be missing
+        # from the OpenGL module, in that case the canvas goes back to drawing each morph separately
+        self.instanced_rendering = False
+        self.uploaded_instanced = False
+        self.initialised_instanced_rendering = False
+        self.instanced_VAO_pointer = None
+        self.unit_rectangle_VBO_pointer = None
+        self.instance_VBO_pointer = None
+        self.instanced_shader_program = None
+        self.draw_area_size_location = None
+        self.texture_array_pointer = None
+        self.texture_array_version = -1
+
+        # the width, height and number of layers of the array texture and for each layer the texture uploaded to it
+        # and whether that texture was loaded, so a texture that finishes loading is uploaded again
+        self.texture_array_size = (0, 0, 0)
+        self.texture_array_textures = []
+        self.texture_array_loaded = []
+        self.texture_array_allocations = 0
+        self.texture_layer_rectangles = numpy.zeros((1, 4), dtype=numpy.float32)
+        self.instance_data = numpy.zeros((0, self.INSTANCE_SIZE), dtype=numpy.float32)
+        self.instance_buffer_capacity = 0
+
+        # the damaged rectangles of the last draw in world coordinates, see World.collect_damage
+        self.damaged_rectangles = []
+
+        # with partial redraw each damaged rectangle is cleared and drawn again, everything outside them is left as
+        # it was drawn in the previous frame and a frame without damage is not drawn at all. Enable it only when
+        # the canvas draws into a framebuffer that keeps its content between frames, like an offscreen buffer of
+        # your own. Blender repaints its regions completely before every redraw, so in a Blender region partial
+        # redraw would lose everything outside the damage. Without it the whole world is drawn every frame, though
+        # the vertices are still generated only when something was damaged
+        self.partial_redraw = False
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+
+        # all changes to the OpenGL state go through the state cache so that the same state is not set twice
+        # in a frame. frame_stats holds the draw calls, texture binds and state changes of the last frame
+        self.gl_state = MGLStateCache()
+        self.frame_stats = self.gl_state.stats()
+
+        # the display list holds what has to be drawn for each morph, so drawing does not need to go
+        # through the morphs of the world
+        self.display_list = MDisplayList(world)
+
 
 
 
     def draw(self):
-        #print("ok maybe it does not")
-        if self.needs_to_update_vertices_list:
-            self.vertices_list = []
-            self.generate_vertices_list()
+        profiler = self.world.profiler
+        if profiler is not None:
+            start = profiler.start()
+        damaged_morphs = list(self.world.damaged_morphs)
+        self.damaged_rectangles = self.world.collect_damage()
+        self.display_list.viewport = [0, 0, self.world.draw_area_width, self.world.draw_area_height]
+        if len(self.damaged_rectangles) > 0:
+            self.display_list.update(damaged_morphs)
+            self.needs_to_update_vertices_list = True
         if not self.initialised_OpenGL_context:
             self.initialise_OpenGL_context()
+        for texture_id in self.world.texture_cache.take_released_texture_ids():
+            glDeleteTextures(1, texture_id)
+        if self.instanced_rendering and not self.supports_instanced_rendering():
+            logger.info("instanced rendering is not supported, drawing each morph separately")
+            self.instanced_rendering = False
+        if self.instanced_rendering and self.texture_array_outdated() and \
+                self.texture_array_layout(self.display_list.textures) is None:
+            logger.info("the textures are too big for an array texture, drawing each morph separately")
+            self.instanced_rendering = False
+        if self.instanced_rendering != self.uploaded_instanced:
+            # the other buffer has not seen the changes of the display list since it was last used
+            self.display_list.all_changed = True
+            self.uploaded_instanced = self.instanced_rendering
+            self.needs_to_update_vertices_list = True
+        if self.needs_to_update_vertices_list:
+            if self.instanced_rendering:
+                self.upload_instances()
+            else:
+                self.upload_vertices()
+            self.needs_to_update_vertices_list = False
+        if profiler is not None:
+            profiler.stop('vertices', start)
+
+        if self.partial_redraw:
+            if len(self.damaged_rectangles) == 0:
+                self.frames_skipped += 1
+                return
+        if profiler is not None:
+            start = profiler.start()
+        self.gl_state.begin_frame()
+        if self.partial_redraw:
+            self.gl_state.enable(GL_SCISSOR_TEST)
+            for rectangle in self.damaged_rectangles:
+                x = int(rectangle[0] + self.world.draw_area[0])
+                y = int(rectangle[1] + self.world.draw_area[1])
+                glScissor(x, y, int(rectangle[2] - rectangle[0]) + 1, int(rectangle[3] - rectangle[1]) + 1)
+                # what was drawn there before, like a morph that moved away, must not stay
+                glClearColor(0.0, 0.0, 0.0, 0.0)
+                glClear(GL_COLOR_BUFFER_BIT)
+                self.draw_vertices()
+            self.gl_state.disable(GL_SCISSOR_TEST)
+        else:
+            self.draw_vertices()
+
+        # leave blending as Blender expects it
+        self.gl_state.disable(GL_BLEND)
+        self.frame_stats = self.gl_state.stats()
+        self.frames_drawn += 1
+        if profiler is not None:
+            profiler.stop('submission', start)
 
-        glUseProgram(self.shader_program)
+    # sends the vertices to the graphic card to be drawn, the rectangle of each visible morph is drawn
+    # with its own texture
+    def draw_vertices(self):
+        if self.instanced_rendering:
+            self.draw_instances()
+            return
+        self.gl_state.use_program(self.shader_program)
         glBindVertexArray(self.VAO_pointer.to_list()[0])
-        glClearColor(0.0, 0.0, 0.4, 0.0)
-        glDrawArrays(GL_TRIANGLES, 0, 3)
-        # if self.openGLversion < 1.9:
-        #     if not texture['is_gl_initialised']:
-        #         self.initialise_texture(texture)
-        #     else:
-        #         glBindTexture(bgl.GL_TEXTURE_2D, texture['texture_id'].to_list()[0])
+        self.gl_state.enable(GL_BLEND)
+        for first_slot, last_slot, texture_index in self.draw_batches():
+            premultiplied_alpha = False
+            if texture_index >= 0:
+                texture = self.display_list.textures[texture_index]
+                if not texture['is_gl_initialised']:
+                    self.initialise_texture(texture)
+                self.gl_state.bind_texture(GL_TEXTURE_2D, texture['texture_id'].to_list()[0])
+                self.gl_state.uniform_int(self.has_texture_location, 1)
+                premultiplied_alpha = texture.get('premultiplied_alpha', False)
+            else:
+                self.gl_state.uniform_int(self.has_texture_location, 0)
+            self.gl_state.uniform_int(self.premultiplied_alpha_location, int(premultiplied_alpha))
+            if premultiplied_alpha:
+                self.gl_state.blend_function(GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+            else:
+                self.gl_state.blend_function(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            self.gl_state.draw_elements(GL_TRIANGLES, (last_slot - first_slot + 1) * 6, GL_UNSIGNED_INT,
+                                        self.offset_pointer(first_slot * 6 * 4))
 
+    # splits the visible morphs in batches that can be drawn with a single call, keeping the order morphs
+    # are drawn. A batch is a run of visible morphs one after the other with the same texture, morphs that are not
+    # visible between them do not break the batch because their rectangles have no area and draw nothing.
+    # Each batch is (first slot, last slot, texture index)
+    def draw_batches(self):
+        commands = self.display_list.commands
+        visible_slots = numpy.nonzero(commands[:, MDisplayList.VISIBLE])[0]
+        if len(visible_slots) == 0:
+            return []
+        texture_indices = commands[visible_slots, MDisplayList.TEXTURE].astype(numpy.intp)
+        starts = numpy.concatenate(([0], numpy.nonzero(texture_indices[1:] != texture_indices[:-1])[0] + 1))
+        ends = numpy.concatenate((starts[1:] - 1, [len(visible_slots) - 1]))
+        return list(zip(visible_slots[starts].tolist(), visible_slots[ends].tolist(),
+                        texture_indices[starts].tolist()))
+
+    # OpenGL expects the offsets inside the bound buffers in the place of a pointer. bgl passes a plain int given
+    # for a pointer argument on as that offset, a Buffer would instead pass the address of its own memory
+    def offset_pointer(self, offset):
+        return int(offset)
 
-            #self.clean_up()
     def initialise_OpenGL_context(self):
-        print("initialising OpenGL context")
-        self.vertices = [-0.5,-0.5,0.0,
-                    0.5,-0.5,0.0,
-                    0.0,0.5,0.0]
-        vertices_pointer = Buffer(GL_FLOAT,[len(self.vertices)],self.vertices)
 
         #initialise VAO
         self.VAO_pointer = Buffer(GL_INT, [1])
         glGenVertexArrays(1, self.VAO_pointer)
         glBindVertexArray(self.VAO_pointer.to_list()[0])
 
-        #initialise VBO
+        #initialise VBO and the EBO with the indices of the vertices of each triangle , their size is
+        # decided by grow_vertex_buffer when the vertices are uploaded
         self.VBO_pointer = Buffer(GL_INT,[1])
         glGenBuffers(1,self.VBO_pointer)
         glBindBuffer(GL_ARRAY_BUFFER,self.VBO_pointer.to_list()[0])
-        glBufferData(GL_ARRAY_BUFFER,len(self.vertices),vertices_pointer, GL_STATIC_DRAW)
-        self.void_pointer = Buffer(GL_INT,[1])
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, self.void_pointer)
+        self.EBO_pointer = Buffer(GL_INT, [1])
+        glGenBuffers(1, self.EBO_pointer)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO_pointer.to_list()[0])
+
+        # each vertex is position (x, y), color (r, g, b, alpha) and texture coordinates (u, v)
+        stride = self.VERTEX_SIZE * 4
+        self.void_pointer = self.offset_pointer(0)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, stride, self.void_pointer)
         glEnableVertexAttribArray(0)
-        print("initialising vertext shader")
+        glVertexAttribPointer(1, 4, GL_FLOAT, GL_FALSE, stride, self.offset_pointer(2 * 4))
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE, stride, self.offset_pointer(6 * 4))
+        glEnableVertexAttribArray(2)
         #vertex shader
-        self.vertex_shader_source= " # version 330 core \nlayout(location=0) in vec3 aPos; \nvoid main()\n{\n" \
-                              "gl_Position = vec4(aPos.x, aPos.y, aPos.z, 1.0);\n}"
-        print("vertex shader source : ",self.vertex_shader_source)
-        self.vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        glShaderSource(self.vertex_shader,self.vertex_shader_source)
-        glCompileShader(self.vertex_shader)
+        self.vertex_shader_source= "#version 330 core\n" \
+                                   "layout(location=0) in vec2 position;\n" \
+                                   "layout(location=1) in vec4 color;\n" \
+                                   "layout(location=2) in vec2 texture_coordinates;\n" \
+                                   "out vec4 vertex_color;\n" \
+                                   "out vec2 vertex_texture_coordinates;\n" \
+                                   "void main()\n{\n" \
+                                   "gl_Position = vec4(position.x, position.y, 0.0, 1.0);\n" \
+                                   "vertex_color = color;\n" \
+                                   "vertex_texture_coordinates = texture_coordinates;\n}"
+
+        #fragment shadert
+        # the color of the morph tints its texture and gives it transparency. A premultiplied texture has its
+        # colors multiplied by the transparency of the morph as well
+        self.fragment_shader_source = "#version 330 core\n" \
+                                      "in vec4 vertex_color;\n" \
+                                      "in vec2 vertex_texture_coordinates;\n" \
+                                      "uniform sampler2D morph_texture;\n" \
+                                      "uniform int has_texture;\n" \
+                                      "uniform int premultiplied_alpha;\n" \
+                                      "out vec4 FragColor;\n" \
+                                      "void main()\n{\n" \
+                                      "FragColor = vertex_color;\n" \
+                                      "if (has_texture != 0)\n" \
+                                      "    FragColor = FragColor * " \
+                                      "texture(morph_texture, vertex_texture_coordinates);\n" \
+                                      "if (premultiplied_alpha != 0)\n" \
+                                      "    FragColor.rgb = FragColor.rgb * vertex_color.a;\n}"
+        self.vertex_shader, self.fragment_shader, self.shader_program = self.create_shader_program(
+            self.vertex_shader_source, self.fragment_shader_source)
+        self.has_texture_location = glGetUniformLocation(self.shader_program, "has_texture")
+        self.premultiplied_alpha_location = glGetUniformLocation(self.shader_program, "premultiplied_alpha")
+
+        err = glGetError()
+        while err != GL_NO_ERROR:
+            logger.warning("OpenGL error while initialising the OpenGL context : %d", err)
+            err = glGetError()
+        self.initialised_OpenGL_context = True
+
+        return
+
+    # the instanced rendering uses its own vertex array, with the buffer of the unit rectangle shared by all
+    # morphs and the buffer of the instances, one instance per slot of the display list. All textures of the
+    # display list are kept as layers of a single array texture so the whole world is drawn by a single call
+    def initialise_instanced_rendering(self):
+        self.instanced_VAO_pointer = Buffer(GL_INT, [1])
+        glGenVertexArrays(1, self.instanced_VAO_pointer)
+        glBindVertexArray(self.instanced_VAO_pointer.to_list()[0])
+
+        # the corners of the unit rectangle in the order of a triangle fan
+        unit_rectangle = [0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0]
+        self.unit_rectangle_VBO_pointer = Buffer(GL_INT, [1])
+        glGenBuffers(1, self.unit_rectangle_VBO_pointer)
+        glBindBuffer(GL_ARRAY_BUFFER, self.unit_rectangle_VBO_pointer.to_list()[0])
+        glBufferData(GL_ARRAY_BUFFER, len(unit_rectangle) * 4, Buffer(GL_FLOAT, [len(unit_rectangle)], unit_rectangle),
+                     GL_STATIC_DRAW)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 2 * 4, self.offset_pointer(0))
+        glEnableVertexAttribArray(0)
+
+        # each instance is rectangle, texture rectangle, color, texture layer and clip rectangle, every
+        # attribute advances once per instance instead of once per vertex
+        self.instance_VBO_pointer = Buffer(GL_INT, [1])
+        glGenBuffers(1, self.instance_VBO_pointer)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_VBO_pointer.to_list()[0])
+        stride = self.INSTANCE_SIZE * 4
+        for location, size, offset in ((1, 4, 0), (2, 4, 4), (3, 4, 8), (4, 1, 12), (5, 4, 13)):
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, self.offset_pointer(offset * 4))
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+
+        # the rectangle and the clip rectangle are in world coordinates, the texture coordinates are clipped
+        # together with the rectangle
+        self.instanced_vertex_shader_source = "#version 330 core\n" \
+                                              "layout(location=0) in vec2 corner;\n" \
+                                              "layout(location=1) in vec4 rectangle;\n" \
+                                              "layout(location=2) in vec4 texture_rectangle;\n" \
+                                              "layout(location=3) in vec4 color;\n" \
+                                              "layout(location=4) in float layer;\n" \
+                                              "layout(location=5) in vec4 clip_rectangle;\n" \
+                                              "uniform vec2 draw_area_size;\n" \
+                                              "out vec4 vertex_color;\n" \
+                                              "out vec3 vertex_texture_coordinates;\n" \
+                                              "void main()\n{\n" \
+                                              "vec2 position = clamp(mix(rectangle.xy, rectangle.zw, corner), " \
+                                              "clip_rectangle.xy, clip_rectangle.zw);\n" \
+                                              "vec2 size = max(rectangle.zw - rectangle.xy, vec2(1.0));\n" \
+                                              "vec2 fraction = (position - rectangle.xy) / size;\n" \
+                                              "vertex_texture_coordinates = vec3(mix(texture_rectangle.xy, " \
+                                              "texture_rectangle.zw, fraction), layer);\n" \
+                                              "vertex_color = color;\n" \
+                                              "gl_Position = vec4(position / draw_area_size * 2.0 - 1.0, 0.0, 1.0);\n}"
+        self.instanced_fragment_shader_source = "#version 330 core\n" \
+                                                "in vec4 vertex_color;\n" \
+                                                "in vec3 vertex_texture_coordinates;\n" \
+                                                "uniform sampler2DArray morph_textures;\n" \
+                                                "out vec4 FragColor;\n" \
+                                                "void main()\n{\n" \
+                                                "FragColor = vertex_color;\n" \
+                                                "if (vertex_texture_coordinates.z >= 0.0)\n" \
+                                                "    FragColor = FragColor * texture(morph_textures, " \
+                                                "vertex_texture_coordinates);\n}"
+        self.instanced_vertex_shader, self.instanced_fragment_shader, self.instanced_shader_program = \
+            self.create_shader_program(self.instanced_vertex_shader_source, self.instanced_fragment_shader_source)
+        self.draw_area_size_location = glGetUniformLocation(self.instanced_shader_program, "draw_area_size")
+
+        self.texture_array_pointer = Buffer(GL_INT, [1])
+        glGenTextures(1, self.texture_array_pointer)
+        self.initialised_instanced_rendering = True
+
+    # whether the OpenGL module offers the functions instanced rendering needs
+    def supports_instanced_rendering(self):
+        return all(name in globals() for name in ('glDrawArraysInstanced', 'glVertexAttribDivisor', 'glTexImage3D'))
+
+    # whether the display list has textures the array texture does not have yet or a texture of the array
+    # finished loading
+    def texture_array_outdated(self):
+        return self.texture_array_version != self.display_list.textures_version or not all(self.texture_array_loaded)
+
+    # the width, height and number of layers of an array texture that can hold the textures, or None if it would
+    # be bigger than TEXTURE_ARRAY_MAX_SIZE or TEXTURE_ARRAY_MAX_BYTES. The layers are rounded up to a power of two
+    # and the array gets twice the layers it needs, so a few new or bigger textures still fit without making
+    # the array again
+    def texture_array_layout(self, textures):
+        width = max([texture['dimensions'][0] for texture in textures] + [1])
+        height = max([texture['dimensions'][1] for texture in textures] + [1])
+        if width > self.TEXTURE_ARRAY_MAX_SIZE or height > self.TEXTURE_ARRAY_MAX_SIZE:
+            return None
+        width = min(1 << (width - 1).bit_length(), self.TEXTURE_ARRAY_MAX_SIZE)
+        height = min(1 << (height - 1).bit_length(), self.TEXTURE_ARRAY_MAX_SIZE)
+        layer_bytes = width * height * 4
+        if layer_bytes * max(len(textures), 1) > self.TEXTURE_ARRAY_MAX_BYTES:
+            return None
+        layers = min(max(len(textures) * 2, 4), self.TEXTURE_ARRAY_MAX_BYTES // layer_bytes)
+        return width, height, layers
+
+    # puts every texture of the display list in a layer of the array texture. The layers are as big as the
+    # biggest texture, so each texture covers only a part of its layer, texture_layer_rectangles holds that part
+    # for each texture as (u, v) of the bottom left corner and (u, v) of the top right corner. The last row is
+    # used by morphs without a texture. Only the textures added to the display list since the last time and the
+    # textures that finished loading are uploaded, with glTexSubImage3D. The array is made again only when the
+    # textures were removed or do not fit in it. All layers are blended the same way, with straight alpha, so
+    # textures loaded with premultiplied_alpha do not blend correctly in instanced rendering. For the same reason
+    # all layers take the internal format of the texture that was first when the array was made, see
+    # internal_format
+    def update_texture_array(self):
+        textures = self.display_list.textures
+        width, height, layers = self.texture_array_size
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.texture_array_pointer.to_list()[0])
+        uploaded = self.texture_array_textures
+        kept = len(textures) >= len(uploaded) and all(texture is uploaded_texture
+                                                      for texture, uploaded_texture in zip(textures, uploaded))
+        fits = len(textures) <= layers and all(texture['dimensions'][0] <= width and
+                                               texture['dimensions'][1] <= height for texture in textures)
+        if not kept or not fits:
+            width, height, layers = self.texture_array_layout(textures)
+            glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, self.internal_format(textures[0] if textures else {}),
+                         width, height, layers, 0,
+                         GL_RGBA, GL_UNSIGNED_BYTE, Buffer(GL_BYTE, [width * height * layers * 4]))
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            self.texture_array_size = (width, height, layers)
+            self.texture_array_textures = []
+            self.texture_array_loaded = []
+            self.texture_array_allocations += 1
+        self.texture_layer_rectangles = numpy.zeros((len(textures) + 1, 4), dtype=numpy.float32)
+        for layer, texture in enumerate(textures):
+            texture_width, texture_height = texture['dimensions']
+            is_loaded = texture.get('is_loaded', True)
+            if layer >= len(self.texture_array_textures):
+                self.texture_array_textures.append(texture)
+                self.texture_array_loaded.append(False)
+            if is_loaded and not self.texture_array_loaded[layer]:
+                glTexSubImage3D(GL_TEXTURE_2D_ARRAY, 0, 0, 0, layer, texture_width, texture_height, 1,
+                                GL_RGBA, texture.get('data_type', GL_FLOAT), self.texture_data(texture))
+                self.texture_array_loaded[layer] = True
+            self.texture_layer_rectangles[layer] = (0.0, texture_height / height, texture_width / width, 0.0)
+        self.texture_array_version = self.display_list.textures_version
+
+    # the instance of each draw command, see INSTANCE_SIZE
+    def calculate_instances(self, commands):
+        instances = numpy.empty((len(commands), self.INSTANCE_SIZE), dtype=numpy.float32)
+        instances[:, 0:4] = commands[:, MDisplayList.X1:MDisplayList.Y2 + 1]
+        hidden = commands[:, MDisplayList.VISIBLE] == 0
+        instances[hidden, 2:4] = instances[hidden, 0:2]
+        texture_indices = commands[:, MDisplayList.TEXTURE].astype(numpy.intp)
+        layer_rectangles = self.texture_layer_rectangles[texture_indices]
+        instances[:, 4] = commands[:, MDisplayList.U1] * layer_rectangles[:, 2]
+        instances[:, 5] = commands[:, MDisplayList.V2] * layer_rectangles[:, 1]
+        instances[:, 6] = commands[:, MDisplayList.U2] * layer_rectangles[:, 2]
+        instances[:, 7] = commands[:, MDisplayList.V1] * layer_rectangles[:, 1]
+        instances[:, 8:12] = commands[:, MDisplayList.R:MDisplayList.ALPHA + 1]
+        instances[:, 12] = commands[:, MDisplayList.TEXTURE]
+        instances[:, 13:17] = commands[:, MDisplayList.CLIP_X1:MDisplayList.CLIP_Y2 + 1]
+        return instances
+
+    # the same as upload_vertices but for the instance buffer, each slot of the display list is one instance
+    def upload_instances(self):
+        if not self.initialised_instanced_rendering:
+            self.initialise_instanced_rendering()
+        changed_slots = self.display_list.take_changed_slots()
+        count = len(self.display_list.morphs)
+        if self.texture_array_outdated():
+            old_layer_rectangles = self.texture_layer_rectangles[:-1]
+            self.update_texture_array()
+            # the commands of new textures changed anyway, only a change for the old textures changes every row
+            if not numpy.array_equal(old_layer_rectangles,
+                                     self.texture_layer_rectangles[:len(old_layer_rectangles)]):
+                changed_slots = None
+        if len(self.instance_data) != count:
+            changed_slots = None
+        if count > self.instance_buffer_capacity:
+            self.instance_buffer_capacity = max(count, self.instance_buffer_capacity * 2, 64)
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_VBO_pointer.to_list()[0])
+            glBufferData(GL_ARRAY_BUFFER, self.instance_buffer_capacity * self.INSTANCE_SIZE * 4,
+                         Buffer(GL_FLOAT, [self.instance_buffer_capacity * self.INSTANCE_SIZE]), GL_DYNAMIC_DRAW)
+            self.buffer_reallocations += 1
+            changed_slots = None
+
+        if changed_slots is None:
+            self.instance_data = self.calculate_instances(self.display_list.commands)
+            runs = [(0, count)]
+        else:
+            runs = self.slot_runs(changed_slots)
+            for start, end in runs:
+                self.instance_data[start:end] = self.calculate_instances(self.display_list.commands[start:end])
+        self.upload_slot_runs(self.instance_VBO_pointer, self.instance_data, runs, self.INSTANCE_SIZE)
+
+    # draws the whole world with a single call
+    def draw_instances(self):
+        self.gl_state.use_program(self.instanced_shader_program)
+        glBindVertexArray(self.instanced_VAO_pointer.to_list()[0])
+        glUniform2f(self.draw_area_size_location, max(self.world.draw_area_width, 1),
+                    max(self.world.draw_area_height, 1))
+        self.gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.texture_array_pointer.to_list()[0])
+        self.gl_state.enable(GL_BLEND)
+        self.gl_state.blend_function(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.gl_state.draw_arrays_instanced(GL_TRIANGLE_FAN, 0, 4, len(self.display_list.morphs))
+
+    # compiles the two shaders and links them into a shader program, returns all three. Compile and link errors
+    # are logged
+    def create_shader_program(self, vertex_shader_source, fragment_shader_source):
+        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
+        glShaderSource(vertex_shader,vertex_shader_source)
+        glCompileShader(vertex_shader)
         self.success_pointer = Buffer(GL_INT,[1])
         infolog=[]
-        glGetShaderiv(self.vertex_shader,GL_COMPILE_STATUS, self.success_pointer)
+        glGetShaderiv(vertex_shader,GL_COMPILE_STATUS, self.success_pointer)
         if not self.success_pointer.to_list()[0]:
-            glGetShaderInfoLog(self.vertex_shader, 512, 0, infolog)
-            print("vertex shader error log:",infolog)
-
+            glGetShaderInfoLog(vertex_shader, 512, 0, infolog)
+            logger.error("vertex shader error log : %s", infolog)
 
-        #fragment shadert
-        print("intialising fragment shader")
-        self.fragment_shader_source = "#version 330 core\n out vec4 FragColor; \n void main()\n{\n FragColor = vec4(" \
-                                   "1.0f, " \
-                                 "0.0f, 0.0f, 0.2f);\n }\n "
-        print("fragment shader source : ",self.fragment_shader_source )
-        self.fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-        glShaderSource(self.fragment_shader,self.fragment_shader_source)
-        glCompileShader(self.fragment_shader)
-        glGetShaderiv(self.fragment_shader, GL_COMPILE_STATUS, self.success_pointer)
+        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
+        glShaderSource(fragment_shader,fragment_shader_source)
+        glCompileShader(fragment_shader)
+        glGetShaderiv(fragment_shader, GL_COMPILE_STATUS, self.success_pointer)
         if not self.success_pointer.to_list()[0]:
-            glGetShaderInfoLog(self.fragment_shader, 512, 0, infolog)
-            #print("fragment shader error log:", infolog)
+            glGetShaderInfoLog(fragment_shader, 512, 0, infolog)
+            logger.error("fragment shader error log : %s", infolog)
 
         #shader program
-        print("initialsing shader program")
-        self.shader_program = glCreateProgram()
-        glAttachShader(self.shader_program, self.vertex_shader)
-        glAttachShader(self.shader_program, self.fragment_shader)
-        glLinkProgram(self.shader_program)
-        glGetProgramiv(self.shader_program,GL_LINK_STATUS,self.success_pointer)
+        shader_program = glCreateProgram()
+        glAttachShader(shader_program, vertex_shader)
+        glAttachShader(shader_program, fragment_shader)
+        glLinkProgram(shader_program)
+        glGetProgramiv(shader_program,GL_LINK_STATUS,self.success_pointer)
         if not self.success_pointer.to_list()[0]:
-            glGetProgramInfoLog(self.shader_program, 512, 0, infolog)
-            print("fragment shader error log:", infolog)
+            glGetProgramInfoLog(shader_program, 512, 0, infolog)
+            logger.error("shader program error log : %s", infolog)
+        return vertex_shader, fragment_shader, shader_program
 
-        err = 1
-        while err is not GL_NO_ERROR :
-            print("new OpenGL error : ",err)
-            err = glGetError()
-        self.initialised_OpenGL_context = True
+    # generates the vertices of all the morphs from the display list into vertex_data, a single float32 array
+    # ready to be copied to a vertex buffer
+    def generate_vertices_list(self):
+        self.vertex_data = self.calculate_vertices(self.display_list.commands)
+        self.vertices_draw_area = (self.world.draw_area_width, self.world.draw_area_height)
 
-        return
-    def generate_vertices_list(self, morph_target= None):
-
-        if morph_target is None or morph_target is self.world:
-            # world bounds in screen coordinates
-            morph_target=self.world
-            px1 = self.world.draw_area_position[0]
-            py1 = self.world.draw_area_position[1]
-            px2 = self.world.draw_area_position[0]+self.world.width
-            py2 = self.world.draw_area_position[1]+self.world.height
+    # brings the vertex buffer up to date with the display list. Each morph owns the 4 vertices of its slot in the
+    # display list, so only the slots that changed are calculated again and copied to the graphic card. Everything
+    # is uploaded only when the display list was compiled again, the size of the draw area changed (so the OpenGL
+    # coordinates of every vertex changed) or the buffer had to grow
+    def upload_vertices(self):
+        changed_slots = self.display_list.take_changed_slots()
+        count = len(self.display_list.morphs)
+        if self.vertices_draw_area != (self.world.draw_area_width, self.world.draw_area_height) or \
+                len(self.vertex_data) != count * 4:
+            changed_slots = None
+        if count > self.vertex_buffer_capacity:
+            self.grow_vertex_buffer(count)
+            changed_slots = None
+
+        if changed_slots is None:
+            self.generate_vertices_list()
+            runs = [(0, count)]
         else:
-            # parent bounds in screen coordinates
-            px1 = morph_target.parent.absolute_position[0]
-            py1 = morph_target.parent.absolute_position[1]
-            px2 = morph_target.parent.absolute_position[0] + morph_target.parent.width
-            py2 = morph_target.parent.absolute_position[1] + morph_target.parent.height
-
-
-        # morph bounds in screen coordinates (bottom left and top right corners)
-        mx1 = morph_target.absolute_position[0]
-        mx2 = morph_target.absolute_position[0] + morph_target.width
-        my1 = morph_target.absolute_position[1]
-        my2 = morph_target.absolute_position[0] + morph_target.height
-
-        # morph bounds in OpenGL coordinates for vertices and textures
-        # bottom left vertice
-        mxv1 = self.convert_pixels_to_world_coordinates(mx1,px1,px2)
-        myv1 = self.convert_pixels_to_world_coordinates(my1, py1, py2)
-        mxt1= self.calculate_texture_clipping(mx1,morph_target.width,px1,px2)
-        myt1= self.calculate_texture_clipping(my1,morph_target.height,py1,py2)
-
-        # bottom right vertice
-        mxv2 =  self.convert_pixels_to_world_coordinates(mx2,px1,px2)
-        myv2 = myv1
-        mxt2 = self.calculate_texture_clipping(mx2,morph_target.width,px1,px2)
-        myt2 = myt1
-
-        # top right vertice
-        mxv3 = mxv2
-        myv3 = self.convert_pixels_to_world_coordinates(my2,py1,py2)
-        mxt3 = mxt2
-        myt3 = self.calculate_texture_clipping(my2,morph_target.height,px1,px2)
-
-        # top left vertice
-        mxv4 = mxv1
-        myv4 = myv3
-        mxt4 = mxt1
-        myt4 = myt2
-
-        #colors
-        r = morph_target.color[0]
-        g = morph_target.color[1]
-        b = morph_target.color[2]
-        alpha = morph_target.color[3]
-
-        # append them to the vertices_list
-        vl = [ mxv1, myv1, 0.0, r,g,b, mxt1,myt1,
-               mxv2, myv2, 0.0, r, g, b, mxt2, myt2,
-               mxv3, myv3, 0.0, r, g, b, mxt3, myt3,
-               mxv4, myv4, 0.0, r, g, b, mxt4, myt4]
-        indices = [0,1,2, #first triamgle and then second
-                   0,2,3]
-
-        for morph in morph_target:
-            if morph.can_draw:
-                self.generate_vertices_list(morph)
-
-    # texture of a morph will be clipped by the boundaries of the world or its parent morph
-    def calculate_texture_clipping(self,value, value_width, min_value,max_value):
-        # limit value to its range (min_value <--> max_value)
-        lv = float(max(min(value, max_value), min_value))
-        if value < min_value:
-            return (lv-value)/value_width
-        if value > max_value:
-            return 1-((value - lv)/value_width)
-
-
-
-
-    def convert_pixels_to_world_coordinates(self,value,min_value,max_value):
-
-        center_value = ((max_value - min_value)/2)+min_value
-
-        # limit value to its range (min_value <--> max_value)
-        lv = float(max(min(value, max_value), min_value))
-
-        half_width = center_value - min_value
-        return float((lv - half_width)/half_width)
+            runs = self.slot_runs(changed_slots)
+            for start, end in runs:
+                self.vertex_data[start * 4:end * 4] = self.calculate_vertices(
+                    self.display_list.commands[start:end])
+
+        self.upload_slot_runs(self.VBO_pointer, self.vertex_data.reshape(-1, 4 * self.VERTEX_SIZE), runs,
+                              4 * self.VERTEX_SIZE)
+
+    # copies the rows of data that belong to the runs of slots to the buffer, each slot is floats_per_slot floats
+    def upload_slot_runs(self, buffer_pointer, data, runs, floats_per_slot):
+        glBindBuffer(GL_ARRAY_BUFFER, buffer_pointer.to_list()[0])
+        for start, end in runs:
+            if end > start:
+                run_data = data[start:end].ravel()
+                glBufferSubData(GL_ARRAY_BUFFER, start * floats_per_slot * 4, len(run_data) * 4,
+                                Buffer(GL_FLOAT, [len(run_data)], run_data))
+                self.vertex_uploads += 1
+                self.bytes_uploaded += len(run_data) * 4
+
+    # groups sorted slots in runs of consecutive slots [start, end) , so each run is uploaded at once
+    def slot_runs(self, slots):
+        runs = []
+        for slot in slots:
+            if len(runs) > 0 and runs[-1][1] == slot:
+                runs[-1][1] = slot + 1
+            else:
+                runs.append([slot, slot + 1])
+        return runs
+
+    # gives the vertex buffer space for at least the given number of morphs, doubling its size every time so it
+    # does not have to grow again soon. The element buffer grows with it, it holds the 6 indices of the two
+    # triangles of each rectangle
+    def grow_vertex_buffer(self, count):
+        capacity = max(count, self.vertex_buffer_capacity * 2, 64)
+        glBindBuffer(GL_ARRAY_BUFFER, self.VBO_pointer.to_list()[0])
+        glBufferData(GL_ARRAY_BUFFER, capacity * 4 * self.VERTEX_SIZE * 4,
+                     Buffer(GL_FLOAT, [capacity * 4 * self.VERTEX_SIZE]), GL_DYNAMIC_DRAW)
+        first_vertices = numpy.arange(capacity, dtype=numpy.int32) * 4
+        indices = (first_vertices[:, None] + numpy.array([0, 1, 2, 0, 2, 3], dtype=numpy.int32)).ravel()
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO_pointer.to_list()[0])
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(indices) * 4, Buffer(GL_INT, [len(indices)], indices),
+                     GL_STATIC_DRAW)
+        self.vertex_buffer_capacity = capacity
+        self.buffer_reallocations += 1
+
+    # calculates the vertices of the draw commands all together with NumPy. Each command becomes a rectangle of
+    # 4 vertices (bottom left, bottom right, top right, top left) and each vertex is VERTEX_SIZE floats:
+    # position in OpenGL coordinates (x, y), color (r, g, b, alpha) and texture coordinates (u, v).
+    # The rectangle is clipped by the clip rectangle of the command and its texture coordinates are clipped
+    # the same way so the texture is cut instead of squeezed. Commands that are not visible or are clipped
+    # completely become rectangles with no area so every command keeps its place in the array
+    def calculate_vertices(self, commands):
+        count = len(commands)
+        x1 = commands[:, MDisplayList.X1]
+        y1 = commands[:, MDisplayList.Y1]
+        x2 = commands[:, MDisplayList.X2]
+        y2 = commands[:, MDisplayList.Y2]
+
+        # the part of the morph that is not clipped
+        cx1 = numpy.maximum(x1, commands[:, MDisplayList.CLIP_X1])
+        cy1 = numpy.maximum(y1, commands[:, MDisplayList.CLIP_Y1])
+        cx2 = numpy.minimum(x2, commands[:, MDisplayList.CLIP_X2])
+        cy2 = numpy.minimum(y2, commands[:, MDisplayList.CLIP_Y2])
+        visible = (commands[:, MDisplayList.VISIBLE] != 0) & (cx2 > cx1) & (cy2 > cy1)
+
+        # texture coordinates, the first row of the texture data is the top of the PNG. They are mapped to the
+        # part of the texture the command shows
+        width = numpy.where(x2 > x1, x2 - x1, 1.0)
+        height = numpy.where(y2 > y1, y2 - y1, 1.0)
+        texture_u1 = commands[:, MDisplayList.U1]
+        texture_v1 = commands[:, MDisplayList.V1]
+        texture_width = commands[:, MDisplayList.U2] - texture_u1
+        texture_height = commands[:, MDisplayList.V2] - texture_v1
+        u1 = texture_u1 + (cx1 - x1) / width * texture_width
+        u2 = texture_u1 + (cx2 - x1) / width * texture_width
+        v1 = texture_v1 + (1.0 - (cy1 - y1) / height) * texture_height
+        v2 = texture_v1 + (1.0 - (cy2 - y1) / height) * texture_height
+
+        # world coordinates start at the bottom left corner of the draw area, OpenGL coordinates go from -1 to 1
+        scale_x = 2.0 / max(self.world.draw_area_width, 1)
+        scale_y = 2.0 / max(self.world.draw_area_height, 1)
+        nx1 = cx1 * scale_x - 1.0
+        ny1 = cy1 * scale_y - 1.0
+        nx2 = numpy.where(visible, cx2 * scale_x - 1.0, nx1)
+        ny2 = numpy.where(visible, cy2 * scale_y - 1.0, ny1)
+
+        vertices = numpy.empty((count, 4, self.VERTEX_SIZE), dtype=numpy.float32)
+        vertices[:, 0, 0] = nx1
+        vertices[:, 0, 1] = ny1
+        vertices[:, 1, 0] = nx2
+        vertices[:, 1, 1] = ny1
+        vertices[:, 2, 0] = nx2
+        vertices[:, 2, 1] = ny2
+        vertices[:, 3, 0] = nx1
+        vertices[:, 3, 1] = ny2
+        vertices[:, :, 2:6] = commands[:, None, MDisplayList.R:MDisplayList.ALPHA + 1]
+        vertices[:, 0, 6] = u1
+        vertices[:, 0, 7] = v1
+        vertices[:, 1, 6] = u2
+        vertices[:, 1, 7] = v1
+        vertices[:, 2, 6] = u2
+        vertices[:, 2, 7] = v2
+        vertices[:, 3, 6] = u1
+        vertices[:, 3, 7] = v2
+        return vertices.reshape(count * 4, self.VERTEX_SIZE)
 
     def draw_quad_face(self,x,y,color):
 
@@ -227,16 +1040,35 @@ class MOpenGLCanvas(pylivecoding.LiveObject):
             glDisable(bgl.GL_TEXTURE_2D)
             glDisable(bgl.GL_BLEND)
 
+    # uploads the data of a texture loaded by Morph.load_texture to the graphic card
+    # the pixels of the texture in a bgl Buffer. Textures read by Morph.read_texture keep their pixels in a NumPy
+    # array until they are uploaded the first time, bgl has no unsigned byte buffers so the bytes go in a GL_BYTE
+    # buffer unchanged
+    def texture_data(self, texture):
+        if texture['data'] is None:
+            pixels = texture['pixels'].view(numpy.int8)
+            texture['data'] = Buffer(GL_BYTE, [len(pixels), len(pixels[0])], pixels)
+            texture['pixels'] = None
+        return texture['data']
+
+    # the colors of a texture loaded with srgb_to_linear are still sRGB, as GL_SRGB8_ALPHA8 the graphic card turns
+    # them to linear when it samples them
+    def internal_format(self, texture):
+        if texture.get('srgb_to_linear', False):
+            return GL_SRGB8_ALPHA8
+        return GL_RGBA
+
     def initialise_texture(self,texture):
-        texture.texture_id = Buffer(bgl.GL_INT, [1])
-        glGenTextures(1, texture.texture_id)
-        glBindTexture(GL_TEXTURE_2D, texture.texture_id.to_list()[0])
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, texture.width, texture.height, 0,
-                         GL_RGBA, GL_FLOAT, texture.data)
-        bgl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        bgl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        texture.is_gl_initialised = True
-        return texture 
+        texture['texture_id'] = Buffer(GL_INT, [1])
+        glGenTextures(1, texture['texture_id'])
+        glBindTexture(GL_TEXTURE_2D, texture['texture_id'].to_list()[0])
+        glTexImage2D(GL_TEXTURE_2D, 0, self.internal_format(texture), texture['dimensions'][0],
+                     texture['dimensions'][1], 0, GL_RGBA, texture.get('data_type', GL_FLOAT),
+                     self.texture_data(texture))
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        texture['is_gl_initialised'] = True
+        return texture
 
     class MOpenGLTexture:
         textures_list = []
@@ -280,4 +1112,139 @@ class MOpenGLCanvas(pylivecoding.LiveObject):
             self.id= 0
 
             return self
-        
\ No newline at end of file
+        
+
+# The software canvas draws a world into a NumPy array instead of OpenGL, for rendering without a graphic card,
+# for example golden image tests, benchmarks or thumbnails. It draws the same display list MOpenGLCanvas does and
+# the same way, each command is a rectangle clipped by its clip rectangle, its texture is sampled at the center
+# of each pixel with the nearest pixel of the texture, tinted by the color of the command and blended over what is
+# already drawn. Each rectangle is drawn with NumPy as a whole. The framebuffer is float RGBA with its first row
+# at the bottom, like OpenGL, image gives it as 8 bit RGBA with the first row at the top, like a PNG file.
+# A world is drawn either by its MOpenGLCanvas or by a software canvas, both take the damage of the world
+class MSoftwareCanvas(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, world, width=None, height=None, clear_color=(0.0, 0.0, 0.0, 0.0)):
+        super().__init__()
+        self.world = world
+        self.display_list = MDisplayList(world)
+
+        # the size of the framebuffer, by default the size of the draw area of the world
+        self.width = width
+        self.height = height
+        self.clear_color = clear_color
+        self.framebuffer = numpy.zeros((0, 0, 4), dtype=numpy.float32)
+
+        # the texture and its pixels as floats from 0 to 1, by id of the texture. Only the textures of the display
+        # list are kept, texture_images_version is the textures_version of the display list they were pruned for
+        self.texture_images = {}
+        self.texture_images_version = -1
+
+        # the morphs damaged since the last draw, the world adds them here as well as to its own damaged morphs
+        # which are left to mOpenGLCanvas, see World.damage
+        self.damaged_morphs = set()
+        world.damage_listeners.add(self)
+
+        self.frames_drawn = 0
+        self.frame_stats = {}
+
+    def draw(self):
+        textures.finish_all_loading()
+        damaged_morphs = list(self.damaged_morphs)
+        self.damaged_morphs.clear()
+        width = self.width if self.width is not None else max(int(self.world.draw_area_width), 1)
+        height = self.height if self.height is not None else max(int(self.world.draw_area_height), 1)
+        self.display_list.viewport = [0, 0, width, height]
+        self.display_list.update(damaged_morphs)
+        if self.texture_images_version != self.display_list.textures_version:
+            used_ids = {id(texture) for texture in self.display_list.textures}
+            self.texture_images = {texture_id: texture_image for texture_id, texture_image
+                                   in self.texture_images.items() if texture_id in used_ids}
+            self.texture_images_version = self.display_list.textures_version
+        self.framebuffer = numpy.empty((height, width, 4), dtype=numpy.float32)
+        self.framebuffer[:, :] = self.clear_color
+        quads = 0
+        pixels = 0
+        for command in self.display_list.commands:
+            drawn = self.draw_command(command)
+            if drawn > 0:
+                quads += 1
+                pixels += drawn
+        self.frames_drawn += 1
+        self.frame_stats = {'quads': quads, 'pixels': pixels}
+        return self.framebuffer
+
+    # draws one command and returns how many pixels it covered
+    def draw_command(self, command):
+        if command[MDisplayList.VISIBLE] == 0:
+            return 0
+        height, width = self.framebuffer.shape[0:2]
+        x1, y1, x2, y2 = command[MDisplayList.X1:MDisplayList.Y2 + 1]
+        clip_x1 = max(x1, command[MDisplayList.CLIP_X1], 0)
+        clip_y1 = max(y1, command[MDisplayList.CLIP_Y1], 0)
+        clip_x2 = min(x2, command[MDisplayList.CLIP_X2], width)
+        clip_y2 = min(y2, command[MDisplayList.CLIP_Y2], height)
+
+        # the pixels whose centers are inside the clipped rectangle
+        column1 = int(numpy.ceil(clip_x1 - 0.5))
+        column2 = int(numpy.ceil(clip_x2 - 0.5))
+        row1 = int(numpy.ceil(clip_y1 - 0.5))
+        row2 = int(numpy.ceil(clip_y2 - 0.5))
+        if column2 <= column1 or row2 <= row1:
+            return 0
+
+        color = command[MDisplayList.R:MDisplayList.ALPHA + 1]
+        texture_index = int(command[MDisplayList.TEXTURE])
+        premultiplied_alpha = False
+        if texture_index >= 0:
+            texture = self.display_list.textures[texture_index]
+            image = self.texture_image(texture)
+            premultiplied_alpha = texture.get('premultiplied_alpha', False)
+            u1, v1, u2, v2 = command[MDisplayList.U1:MDisplayList.V2 + 1]
+            fraction_x = (numpy.arange(column1, column2) + 0.5 - x1) / max(x2 - x1, 1e-6)
+            fraction_y = (numpy.arange(row1, row2) + 0.5 - y1) / max(y2 - y1, 1e-6)
+
+            # v goes from the top of the texture, the rows of the framebuffer from the bottom
+            texture_columns = numpy.clip(((u1 + fraction_x * (u2 - u1)) * image.shape[1]).astype(numpy.intp),
+                                         0, image.shape[1] - 1)
+            texture_rows = numpy.clip(((v1 + (1.0 - fraction_y) * (v2 - v1)) * image.shape[0]).astype(numpy.intp),
+                                      0, image.shape[0] - 1)
+            source = image[texture_rows[:, None], texture_columns[None, :]] * color
+        else:
+            source = numpy.empty((row2 - row1, column2 - column1, 4), dtype=numpy.float32)
+            source[:, :] = color
+
+        target = self.framebuffer[row1:row2, column1:column2]
+        alpha = source[:, :, 3:4]
+        if premultiplied_alpha:
+            target[:, :, 0:3] = source[:, :, 0:3] * color[3] + target[:, :, 0:3] * (1.0 - alpha)
+        else:
+            target[:, :, 0:3] = source[:, :, 0:3] * alpha + target[:, :, 0:3] * (1.0 - alpha)
+        target[:, :, 3:4] = alpha + target[:, :, 3:4] * (1.0 - alpha)
+        return (row2 - row1) * (column2 - column1)
+
+    # the pixels of the texture as an array of rows of RGBA floats, the first row is the top of the PNG file
+    def texture_image(self, texture):
+        texture_image = self.texture_images.get(id(texture))
+        if texture_image is not None and texture_image[0] is texture:
+            return texture_image[1]
+        width, height = texture['dimensions']
+        if texture.get('pixels') is not None:
+            image = texture['pixels'].reshape(height, width, 4) / numpy.float32(255.0)
+        elif texture.get('data_type', GL_FLOAT) == GL_FLOAT:
+            image = numpy.array(texture['data'].to_list(), dtype=numpy.float32).reshape(height, width, 4)
+        else:
+            image = numpy.array(texture['data'].to_list(), dtype=numpy.int8).view(numpy.uint8)
+            image = image.reshape(height, width, 4) / numpy.float32(255.0)
+        if texture.get('srgb_to_linear', False):
+            image[:, :, 0:3] = numpy.where(image[:, :, 0:3] <= 0.04045, image[:, :, 0:3] / 12.92,
+                                           ((image[:, :, 0:3] + 0.055) / 1.055) ** 2.4)
+        self.texture_images[id(texture)] = (texture, image)
+        return image
+
+    # the framebuffer as 8 bit RGBA with the first row at the top
+    def image(self):
+        return (numpy.clip(self.framebuffer[::-1], 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8)
+
+    def save_png(self, path):
+        Image.fromarray(self.image(), 'RGBA').save(path)
+        return path
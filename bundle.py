@@ -0,0 +1,146 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Skin bundles. Decoding the PNG files of a skin every time the addon starts is slow, a skin bundle is one file
+# with the pixels of all the PNG files already decoded and converted, ready to be uploaded. The bundle is mapped
+# in memory and a texture read from it is only a view of its part of the file, nothing is decoded or copied
+# until the backend uploads it. A bundle remembers the modification time and size of each PNG file it was built
+# from, a PNG file that changed since is read from the PNG file again.
+#
+# The file starts with MAGIC, the version of the format and the size of the header as two little endian
+# 32 bit integers, followed by the header in JSON and then the pixels of each texture as 8 bit RGBA rows.
+# The pixels start at the first multiple of ALIGNMENT after the header and so does each texture. The header
+# holds the options the pixels were converted with (see Morph.read_texture), the textures by path relative to
+# the folder of the bundle with the offset of their pixels, their dimensions and the modification time and size
+# of their PNG file, and the layouts of the texture atlases the bundle has the pages of (see atlas.py)
+
+import os, json, mmap, struct
+import numpy
+from .. import pylivecoding
+
+
+class MSkinBundle(pylivecoding.LiveObject):
+    instances = []
+
+    # the options of Morph.read_texture that change the pixels, a bundle is built for one choice of them
+    PIXEL_OPTIONS = ('premultiplied_alpha', 'srgb_to_linear')
+
+    MAGIC = b'MSKB'
+    VERSION = 2
+    ALIGNMENT = 64
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.folder = os.path.dirname(os.path.realpath(path))
+        self.file = open(path, 'rb')
+        self.memory = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = struct.unpack_from('<4sII', self.memory, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError("not a skin bundle of version %d : %s" % (self.VERSION, path))
+        header = json.loads(bytes(self.memory[12:12 + header_size]).decode('utf-8'))
+        self.options = header['options']
+        self.textures = header['textures']
+        self.atlas_layouts = header['atlas_layouts']
+
+        # the pixels start at the first aligned place after the header, the offsets of the textures count from there
+        self.data_start = (12 + header_size + self.ALIGNMENT - 1) // self.ALIGNMENT * self.ALIGNMENT
+
+        self.hits = 0
+        self.stale = 0
+
+    # the texture record of the PNG file read from the bundle, or None if the bundle does not have it, it was
+    # converted with different options or the PNG file changed after the bundle was built
+    def read_texture(self, full_path, premultiplied_alpha=False, srgb_to_linear=False):
+        entry = self.textures.get(os.path.relpath(os.path.realpath(full_path), self.folder))
+        if entry is None or self.memory is None:
+            return None
+        if self.options != {'premultiplied_alpha': premultiplied_alpha, 'srgb_to_linear': srgb_to_linear}:
+            return None
+        if os.path.exists(full_path):
+            stat = os.stat(full_path)
+            if stat.st_mtime != entry['mtime'] or stat.st_size != entry['file_size']:
+                self.stale += 1
+                return None
+        self.hits += 1
+        width, height = entry['dimensions']
+        size = width * height * 4
+        pixels = numpy.frombuffer(self.memory, dtype=numpy.uint8, count=size, offset=self.data_start + entry['offset'])
+        return {'dimensions': [width, height],
+                'full_path': full_path, 'data': None, 'pixels': pixels.reshape(height, width * 4),
+                'data_type': entry['data_type'], 'is_loaded': True,
+                'bytes': pixels.nbytes, 'from_bundle': True,
+                'bytes_saved': pixels.size * numpy.dtype(numpy.float32).itemsize - pixels.nbytes,
+                'premultiplied_alpha': premultiplied_alpha, 'srgb_to_linear': srgb_to_linear,
+                'is_gl_initialised': False, 'texture_id': 0}
+
+    # no more textures are read from the bundle. Textures already read from it are views of its memory, while any
+    # of them is still used the memory stays mapped and is unmapped when the last of them is dropped
+    def close(self):
+        if self.memory is not None:
+            try:
+                self.memory.close()
+            except BufferError:
+                pass
+            self.memory = None
+        self.file.close()
+
+
+# Builds a skin bundle. reader is the function that reads a PNG file into a texture record and options
+# the options it is called with, usually Morph.read_texture and Morph.texture_options()
+class MSkinBundleBuilder(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, reader, options):
+        super().__init__()
+        self.reader = reader
+        self.options = options
+
+    # writes the bundle with the PNG files of full_paths, which have to be inside the folder of the bundle.
+    # atlas_layouts are the layouts of the texture atlases whose pages are among the PNG files, by atlas key
+    def build(self, path, full_paths, atlas_layouts={}):
+        folder = os.path.dirname(os.path.realpath(path))
+        entries = {}
+        records = {}
+        offset = 0
+        for full_path in sorted(full_paths):
+            record = self.reader(full_path, **self.options)
+            stat = os.stat(full_path)
+            width, height = record['dimensions']
+            relative_path = os.path.relpath(os.path.realpath(full_path), folder)
+            entries[relative_path] = {
+                'offset': offset, 'dimensions': [width, height], 'data_type': record['data_type'],
+                'mtime': stat.st_mtime, 'file_size': stat.st_size}
+            records[relative_path] = record
+            offset = self.aligned(offset + width * height * 4)
+
+        pixel_options = {name: self.options.get(name, False) for name in MSkinBundle.PIXEL_OPTIONS}
+        header = json.dumps({'options': pixel_options, 'textures': entries,
+                             'atlas_layouts': atlas_layouts}).encode('utf-8')
+        with open(path, 'wb') as bundle_file:
+            bundle_file.write(struct.pack('<4sII', MSkinBundle.MAGIC, MSkinBundle.VERSION, len(header)))
+            bundle_file.write(header)
+            data_start = self.aligned(bundle_file.tell())
+            for relative_path, entry in entries.items():
+                record = records[relative_path]
+                bundle_file.write(b'\0' * (data_start + entry['offset'] - bundle_file.tell()))
+                bundle_file.write(numpy.ascontiguousarray(record['pixels'], dtype=numpy.uint8).tobytes())
+        return path
+
+    def aligned(self, offset):
+        return (offset + MSkinBundle.ALIGNMENT - 1) // MSkinBundle.ALIGNMENT * MSkinBundle.ALIGNMENT
@@ -46,13 +46,24 @@
 # ================================================================
 
 
-import bpy, blf,bgl,os
+import os,bisect,fnmatch,json,time,weakref
+
+# outside Blender the headless stand-ins of the Blender modules are used, see headless
+try:
+    import bpy
+except ImportError:
+    from .headless import bpy, blf, bgl
+else:
+    import blf, bgl
 
 from .. import pylivecoding
-from . import backend
-from .PIL import Image
+from . import backend, atlas, textures, bundle, profiler
+# the vendored PIL only has binaries for Blender on Windows, anywhere else Pillow has to be installed
+try:
+    from .PIL import Image
+except ImportError:
+    from PIL import Image
 
-import pdb
 import numpy
 
 live_environment = pylivecoding.LiveEnvironment()
@@ -70,7 +81,45 @@ class Morph(pylivecoding.LiveObject):
     # global variable for the definition of the default folder where
     # the PNG files which are used as textures are located
     texture_path = "media/graphics/"
+
+    # the cache the textures are loaded through, shared by all morphs of all worlds unless a morph class uses
+    # its own
+    texture_cache = textures.shared_texture_cache
+
+    # how the pixels of the PNG files are converted once when they are loaded and how the backend samples them,
+    # see read_texture
+    premultiplied_alpha = False
+    srgb_to_linear = False
+
+    # when True load_texture decodes the PNG files in the background, see load_texture
+    load_textures_asynchronously = False
+
+    # the MSkinBundle textures are read from before their PNG files are decoded, see World.open_skin_bundle
+    skin_bundle = None
+
+    # the mouse is over a morph only where the alpha of its texture is at least alpha_mask_threshold (from 0 to
+    # 255). By default it is None and only the bounds of the morph count, set it (for example to 1) on the
+    # morphs, or the Morph subclasses, whose transparent pixels should let the mouse through. The mask can be
+    # made smaller by keeping one bit for each alpha_mask_downsample x alpha_mask_downsample pixels, see
+    # add_alpha_mask
+    alpha_mask_threshold = None
+    alpha_mask_downsample = 1
     instances =[]
+
+    # the instance variables of a morph live in slots instead of a dictionary, which takes a fraction of the
+    # memory with thousands of morphs. Any other attribute, set by a subclass or by the user, still goes in the
+    # dictionary every object gets from LiveObject. Adding or removing a slot changes the layout of the morphs,
+    # so existing morphs cannot be live reloaded to it and Blender has to be restarted
+    __slots__ = ('_store', '_slot', '_width', '_height', '_position', '_world_position_cache',
+                 '_absolute_position_cache', '_absolute_position_version', '_drawn_bounds', '_color',
+                 'handles_mouse_down', '_subtree_handles_events', '_subtree_bounds', '_subtree_bounds_valid',
+                 '_handles_events', 'handles_mouse_over', 'handles_drag_drop', '_is_hidden', '_can_draw', '_parent',
+                 'children', '_world', '_name', 'draw_count', 'textures', '_scale', 'texture_scales',
+                 'active_texture_scale', 'nine_slices', 'active_texture_name', 'textures_released', 'drag_drop',
+                 'drag_position', 'active_texture', 'on_left_click_action', 'on_left_click_released_action',
+                 'on_right_click_action', 'on_right_click_released_action', 'on_mouse_in_action',
+                 'on_mouse_out_action')
+
     # this is the main suspect, responsible for the creation of the morph, each keyword argument is associated
     # with an instance variable so see the comment of the relevant instance variable for more information
     def __init__(self, texture=None, width=100, height=100, position=[0, 0], color=[1.0, 1.0, 1.0, 1.0], name='noname',
@@ -79,27 +128,62 @@ class Morph(pylivecoding.LiveObject):
                  on_mouse_in_action=None, on_mouse_out_action=None,
                  texture_path=None, scale=1):
         super().__init__()
+
+        # inside a World with compact storage the geometry, color and flags of the morph are not stored in the
+        # morph itself but in the arrays of the world's MorphStore, in the slot assigned to the morph. Outside
+        # such a world store is None and the morph uses its own instance variables as usual
+        self._store = None
+        self._slot = -1
+
         self._width = width
         self._height = height
         self._position = position
 
+        # world and absolute position are cached because they are read several times per morph for every
+        # event and every draw. The caches are cleared for the whole subtree when the position or the parent
+        # of a morph changes. The absolute position also depends on the draw area of the world so it remembers
+        # which version of the draw area it was calculated for
+        self._world_position_cache = None
+        self._absolute_position_cache = None
+        self._absolute_position_version = -1
+
+        # the area of the world the morph occupied the last time the world collected the damaged areas that
+        # need to be drawn again, see World.collect_damage
+        self._drawn_bounds = None
+
         # one may ask why color in a morph with a texture. None the less color can affect not only the color of the
         # active texture but also its transparency . Color is a list of floats following the RGBA ( red, green, blue
         # and alpha (transparency). [ r , g , b, alpha ]
-        self.color = color
+        self._color = color
 
         # essentially these variables enable and disable the handling of specific events. If events are disabled
         # they are ignored by this morph but they do pass to its children. If none handles them as well, the event
         # is passed back to Blender through world's consumed_event instance variable. For more info about this , see
         # World comments
         self.handles_mouse_down = False
-        self.handles_events = False
+
+        # whether this morph or any of its children, their children and so on handles events. It is calculated
+        # when needed and cleared when handles_events of a morph changes or a child is added or removed, so
+        # that events can skip whole branches of morphs that do not handle events. None means not calculated
+        self._subtree_handles_events = None
+
+        # the area of the world where this morph and the morphs inside it can be drawn or receive events, see
+        # subtree_bounds. It is calculated when needed and cleared when the morph or one of the morphs inside it
+        # moves, resizes, hides or a child is added or removed, so that drawing and events can skip whole branches
+        # of morphs that are off screen. None can be a valid value so a flag tells whether it is calculated
+        self._subtree_bounds = None
+        self._subtree_bounds_valid = False
+
+        self._handles_events = False
         self.handles_mouse_over = False
         self.handles_drag_drop = False
 
 
         self._is_hidden = False
 
+        # whether the morph is drawn at all
+        self._can_draw = True
+
         # a morph can be inside another morph. That other morph is the parent while this morph becomes the child
         self._parent = None
         self.children = []
@@ -124,10 +208,24 @@ class Morph(pylivecoding.LiveObject):
         # the scale of the active texture depends on the dimensions of the png file
         self._scale = scale
 
-        # this tells where to find the textures
+        # the scale each texture was loaded with by name. The texture cache shares one texture between all the
+        # morphs that use the same PNG file, so the scale belongs to the morph and not to the texture
+        self.texture_scales = {}
+        self.active_texture_scale = scale
+
+        # the nine slice insets set with set_nine_slice by texture name, for the same reason they belong to the
+        # morph. The name of the active texture finds them
+        self.nine_slices = {}
+        self.active_texture_name = None
+
+        # True when the textures have been given back to the texture cache, see release_textures
+        self.textures_released = False
+
+        # this tells where to find the textures. Like the class variables it is kept in the morph only when it
+        # differs from the one of its class
         if texture_path is None:
-            self.texture_path = Morph.texture_path
-        else:
+            texture_path = Morph.texture_path
+        if texture_path != type(self).texture_path:
             self.texture_path = texture_path
 
         # drag and drop flag
@@ -149,8 +247,6 @@ class Morph(pylivecoding.LiveObject):
         self.on_mouse_in_action = on_mouse_in_action
         self.on_mouse_out_action = on_mouse_out_action
 
-        self.can_draw = True
-
         if texture is not None:
             self.load_texture(self.active_texture, self.scale)
 
@@ -174,7 +270,8 @@ class Morph(pylivecoding.LiveObject):
 
     @property
     def width(self):
-
+        if self._store is not None:
+            return self._store.size(self._slot, 0)
         if self._width < 0:
             raise ValueError("width must not be a negative value")
         else:
@@ -185,11 +282,17 @@ class Morph(pylivecoding.LiveObject):
         if value < 0:
             raise ValueError("new value for width must be a positive number")
         else:
-            self._width = value
+            if self._store is not None:
+                self._store.set_size(self._slot, 0, value)
+            else:
+                self._width = value
+            self.bounds_changed()
 
     # height of the morph
     @property
     def height(self):
+        if self._store is not None:
+            return self._store.size(self._slot, 1)
         if self._height < 0:
             raise ValueError("height must not be a negative value ")
         else:
@@ -200,26 +303,170 @@ class Morph(pylivecoding.LiveObject):
         if value < 0:
             raise ValueError("new value for width must be a positive number")
         else:
-            self._height = value
+            if self._store is not None:
+                self._store.set_size(self._slot, 1, value)
+            else:
+                self._height = value
+            self.bounds_changed()
 
     # position is relative to its parent morph.
     @property
     def position(self):
-            return self._position
+        if self._store is not None:
+            return self._store.position(self._slot)
+        return self._position
 
+    # always assign a new list to position, changing the list in place will not be noticed by the morph
+    # and the cached world position of the morph and its children will be out of date
     @position.setter
     def position(self, value):
-        self._position = value
+        if self._store is not None:
+            self._store.set_position(self._slot, value)
+        else:
+            self._position = value
+        self.invalidate_world_position()
+
+    @property
+    def color(self):
+        if self._store is not None:
+            return self._store.color(self._slot)
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        if self._store is not None:
+            self._store.set_color(self._slot, value)
+        else:
+            self._color = value
+        self.appearance_changed()
+
+    @property
+    def handles_events(self):
+        if self._store is not None:
+            return bool(self._store.flags[self._slot] & MorphStore.HANDLES_EVENTS)
+        return self._handles_events
+
+    @handles_events.setter
+    def handles_events(self, value):
+        if self._store is not None:
+            self._store.set_flag(self._slot, MorphStore.HANDLES_EVENTS, value)
+        else:
+            self._handles_events = value
+        self.invalidate_subtree_handles_events()
+        self.invalidate_subtree_bounds()
+
+    # whether this morph or any morph inside it handles events
+    @property
+    def subtree_handles_events(self):
+        if self._subtree_handles_events is None:
+            result = self.handles_events
+            for morph in self.children:
+                if morph.subtree_handles_events:
+                    result = True
+            self._subtree_handles_events = result
+        return self._subtree_handles_events
+
+    # the summary of this morph and of all its parents has to be calculated again
+    def invalidate_subtree_handles_events(self):
+        morph = self
+        while morph is not None:
+            morph._subtree_handles_events = None
+            morph = morph.parent
+
+    # the rectangle [x1, y1, x2, y2] in world coordinates that holds this morph and every morph inside it that is
+    # drawn or handles events, or None if there is none, for example because the morph is hidden. Children are
+    # clipped by their parent so it never goes outside the rectangle of the morph. A morph that is drawn or handles
+    # events covers its whole rectangle by itself, only a morph that does neither, like a plain container,
+    # needs the union of the subtree bounds of its children
+    @property
+    def subtree_bounds(self):
+        if not self._subtree_bounds_valid:
+            world_position = self.world_position
+            x1 = world_position[0]
+            y1 = world_position[1]
+            x2 = x1 + self.width
+            y2 = y1 + self.height
+            bounds = None
+            if self.is_hidden:
+                bounds = None
+            elif self.can_draw or self.handles_events:
+                bounds = [x1, y1, x2, y2]
+            else:
+                for morph in self.children:
+                    child_bounds = morph.subtree_bounds
+                    if child_bounds is None:
+                        continue
+                    if bounds is None:
+                        bounds = list(child_bounds)
+                    else:
+                        bounds = [min(bounds[0], child_bounds[0]), min(bounds[1], child_bounds[1]),
+                                  max(bounds[2], child_bounds[2]), max(bounds[3], child_bounds[3])]
+                if bounds is not None:
+                    bounds = [max(bounds[0], x1), max(bounds[1], y1), min(bounds[2], x2), min(bounds[3], y2)]
+                    if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+                        bounds = None
+            self._subtree_bounds = bounds
+            self._subtree_bounds_valid = True
+        return self._subtree_bounds
+
+    # the subtree bounds of this morph and of its parents have to be calculated again. A parent whose subtree
+    # bounds are already cleared stops the search, its own parents were cleared with it or do not depend on it
+    def invalidate_subtree_bounds(self):
+        self._subtree_bounds_valid = False
+        morph = self.parent
+        while morph is not None and morph._subtree_bounds_valid:
+            morph._subtree_bounds_valid = False
+            morph = morph.parent
+
+    # whether the point in world coordinates is inside the subtree bounds of the morph
+    def subtree_contains_point(self, x, y):
+        bounds = self.subtree_bounds
+        return bounds is not None and x > bounds[0] and x < bounds[2] and y > bounds[1] and y < bounds[3]
+
+    # whether the point in world coordinates is inside the rectangles of all the parents of the morph. A morph is
+    # clipped by its parents, outside of them it is not drawn and does not receive mouse events
+    def inside_parents(self, x, y):
+        morph = self.parent
+        while morph is not None and morph is not morph.world:
+            world_position = morph.world_position
+            if not (x > world_position[0] and x < world_position[0] + morph.width and
+                    y > world_position[1] and y < world_position[1] + morph.height):
+                return False
+            morph = morph.parent
+        return True
+
+    @property
+    def can_draw(self):
+        if self._store is not None:
+            return bool(self._store.flags[self._slot] & MorphStore.CAN_DRAW)
+        return self._can_draw
+
+    @can_draw.setter
+    def can_draw(self, value):
+        if self._store is not None:
+            self._store.set_flag(self._slot, MorphStore.CAN_DRAW, value)
+        else:
+            self._can_draw = value
+        self.invalidate_subtree_bounds()
+        self.appearance_changed()
 
 
     # world position returns the position of the morph relative to the world it belongs too
+    # it is calculated only once and then cached until the position of the morph or of one of its
+    # parents changes
     @property
     def world_position(self):
-        if self.parent is not None:
-            return [self.parent.world_position[0] + self.position[0],
-                    self.parent.world_position[1] + self.position[1]]
-        else:
-            return [0,0]
+        if self._store is not None:
+            return self._store.world_position(self)
+        if self._world_position_cache is None:
+            if self._parent is not None:
+                parent_position = self._parent.world_position
+                position = self.position
+                self._world_position_cache = [parent_position[0] + position[0],
+                                              parent_position[1] + position[1]]
+            else:
+                self._world_position_cache = [0, 0]
+        return self._world_position_cache
 
     # world position is a read only variable
     @world_position.setter
@@ -227,9 +474,20 @@ class Morph(pylivecoding.LiveObject):
         raise ValueError("world_position is read only !")
 
     # absolute position is the position relative to the entire blender window
+    # it is cached the same way as world position, but it is also recalculated when the draw area of the world changes.
+    # A morph in a store does not cache it, adding the draw area to the world position is cheap
     @property
     def absolute_position(self):
-        return [self.world_position[0] + self.world.draw_area[0] , self.world_position[1]+ self.world.draw_area[1] ]
+        world = self.world
+        if self._store is not None:
+            world_position = self.world_position
+            return [world_position[0] + world.draw_area[0], world_position[1] + world.draw_area[1]]
+        if self._absolute_position_cache is None or self._absolute_position_version != world.draw_area_version:
+            world_position = self.world_position
+            self._absolute_position_cache = [world_position[0] + world.draw_area[0],
+                                             world_position[1] + world.draw_area[1]]
+            self._absolute_position_version = world.draw_area_version
+        return self._absolute_position_cache
 
     # world position is a read only variable
     @absolute_position.setter
@@ -248,13 +506,14 @@ class Morph(pylivecoding.LiveObject):
 
     @property
     def mouse_over_morph(self):
-        apx1 = self.world_position[0]
-        apy1 = self.world_position[1]
-        apx2 = self.world_position[0] + self.width
-        apy2 = self.world_position[1] + self.height
+        world_position = self.world_position
+        apx1 = world_position[0]
+        apy1 = world_position[1]
+        apx2 = world_position[0] + self.width
+        apy2 = world_position[1] + self.height
         ex = self.world.mouse_position[0]
         ey = self.world.mouse_position[1]
-        result = ( ex > apx1 and ex < apx2 and ey > apy1 and ey < apy2)
+        result = ( ex > apx1 and ex < apx2 and ey > apy1 and ey < apy2) and self.covers_point(ex, ey)
         return result
 
 
@@ -270,6 +529,8 @@ class Morph(pylivecoding.LiveObject):
 
     @world.setter
     def world(self, value):
+        if value is not self._world:
+            self._absolute_position_cache = None
         self._world = value
 
 
@@ -296,17 +557,85 @@ class Morph(pylivecoding.LiveObject):
     @parent.setter
     def parent(self, value):
         self._parent = value
+        if self._store is not None:
+            self._store.set_parent(self._slot, value)
+        self.invalidate_world_position()
+
+    # clears the cached world and absolute position of this morph and all its children. If the cache of this morph
+    # is already empty then so are the caches of its children, because a child can only calculate its world position
+    # after its parent has done so, so there is no need to go any deeper
+    def invalidate_world_position(self):
+        if self._store is not None:
+            if not self._store.clear_world_position(self._slot):
+                return
+        elif self._world_position_cache is None and self._absolute_position_cache is None:
+            return
+        self._world_position_cache = None
+        self._absolute_position_cache = None
+        self.bounds_changed()
+        for morph in self.children:
+            morph.invalidate_world_position()
+
+    # lets the world know that the area this morph occupies inside the world has changed, so that
+    # the world can update its spatial index before the next event
+    def bounds_changed(self):
+        self.invalidate_subtree_bounds()
+        world = self.world
+        if world is not None and world is not self:
+            world.spatial_index.mark_dirty(self)
+            world.damage(self)
+            if world.profiler is not None:
+                world.profiler.count_redraw(self)
+
+    # lets the world know that the morph looks different, for example its color or its texture has changed
+    # so the area it occupies has to be drawn again
+    def appearance_changed(self):
+        world = self.world
+        if world is not None and world is not self:
+            world.damage(self)
+            if world.profiler is not None:
+                world.profiler.count_redraw(self)
+
+    # the area the morph occupies in world coordinates [x1, y1, x2, y2] , or None if the morph is not drawn
+    # in this world at all
+    def visible_world_bounds(self, world):
+        if self.world is not world or self.is_hidden or not self.can_draw:
+            return None
+        world_position = self.world_position
+        return [world_position[0], world_position[1],
+                world_position[0] + self.width, world_position[1] + self.height]
+
+    # the area the morph occupied in the world the last time the world collected the damage, or None
+    @property
+    def drawn_bounds(self):
+        if self._store is not None:
+            return self._store.drawn_bounds(self._slot)
+        return self._drawn_bounds
+
+    @drawn_bounds.setter
+    def drawn_bounds(self, value):
+        if self._store is not None:
+            self._store.set_drawn_bounds(self._slot, value)
+        else:
+            self._drawn_bounds = value
 
     @property
     def is_hidden(self):
+        if self._store is not None:
+            return bool(self._store.flags[self._slot] & MorphStore.HIDDEN)
         return self._is_hidden
 
     @is_hidden.setter
     def is_hidden(self, value):
         for morph in self.children:
-            if morph._is_hidden != value:
+            if morph.is_hidden != value:
                 morph.is_hidden = value
-        self._is_hidden = value
+        if value != self.is_hidden:
+            if self._store is not None:
+                self._store.set_flag(self._slot, MorphStore.HIDDEN, value)
+            else:
+                self._is_hidden = value
+            self.bounds_changed()
 
     @property
     def name(self):
@@ -314,7 +643,11 @@ class Morph(pylivecoding.LiveObject):
 
     @name.setter
     def name(self,new_name):
+        old_name = self._name
         self._name = new_name
+        world = self.world
+        if world is not None and world is not self:
+            world.name_registry.rename(self, old_name, new_name)
 
 
     # this is an internal method not to be used directly by the user
@@ -324,39 +657,204 @@ class Morph(pylivecoding.LiveObject):
     # without the extension
     # scale: it allows to scale the texture
     # 1 being texture at full size
-    def load_texture(self, name, scale=1):
+    # asynchronous: the PNG file is decoded by a worker thread of the texture cache, until it has loaded the
+    # morph keeps its size and is not drawn. None uses load_textures_asynchronously
+    def load_texture(self, name, scale=1, asynchronous=None):
+        self.acquire_textures()
+        self.texture_scales[name] = scale
+        self.acquire_texture(name, asynchronous)
+        self.activate_texture(name)
+        return self.textures[name]
+
+    # takes the texture from the texture cache in place of the one the morph had under the same name
+    def acquire_texture(self, name, asynchronous=None):
+        if asynchronous is None:
+            asynchronous = self.load_textures_asynchronously
+        old_texture = self.textures.get(name)
+        self.textures[name] = self.texture_cache.acquire(self.texture_full_path(name), self.read_texture,
+                                                         self.texture_options(), asynchronous,
+                                                         lambda texture: self.texture_loaded(name, texture))
+        if old_texture is not None and not self.textures_released:
+            self.texture_cache.release(old_texture)
+
+    # called by the texture cache when a texture loaded asynchronously is ready
+    def texture_loaded(self, name, texture):
+        if self.textures.get(name) is texture and self.active_texture is texture:
+            self.activate_texture(name)
+
+    # starts loading the textures in the background, so that morphs created later find them in the texture cache
+    def prefetch_textures(self, names):
+        self.texture_cache.prefetch([self.texture_full_path(name) for name in names], self.read_texture,
+                                    self.texture_options())
+
+    # gives the textures of the morph back to the texture cache, so the cache can drop them when it needs the
+    # memory. remove_morph does it for the morphs it removes. The morph keeps the names of its textures and
+    # takes them again with acquire_textures, which add_morph does when the morph is added again
+    def release_textures(self):
+        if self.textures_released:
+            return
+        for texture in self.textures.values():
+            self.texture_cache.release(texture)
+        self.textures_released = True
+
+    # takes back from the texture cache the textures given back by release_textures
+    def acquire_textures(self):
+        if not self.textures_released:
+            return
+        for name in list(self.textures):
+            self.acquire_texture(name)
+        self.textures_released = False
+        if self.active_texture_name in self.textures:
+            self.active_texture = self.textures[self.active_texture_name]
+            self.appearance_changed()
+
+    # the path of the PNG file of a texture
+    def texture_full_path(self, name):
 
         # detect the current location of the addon using Morpheas
         #current_path = __file__[0:-20]
         current_path = os.path.dirname(os.path.realpath(__file__))
         bpy.path.basename(current_path)
 
-        # create the full path of the texture to be loaded and load it
-        full_path = current_path[0:-9] + '/'+self.texture_path + name + '.png'
-        im = Image.open(full_path)
-        data = numpy.array(im)
-        data = data.astype(float)
-        data = numpy.divide(data,255.0)
-        content = numpy.array(data).reshape(im.size[1],im.size[0]*4)
-        buf = bgl.Buffer(bgl.GL_FLOAT, [len(content),len(content[0])], content)
+        # create the full path of the texture to be loaded
+        return current_path[0:-9] + '/'+self.texture_path + name + '.png'
+
+    # the options read_texture is called with for the textures of this morph
+    def texture_options(self):
+        return {'premultiplied_alpha': self.premultiplied_alpha, 'srgb_to_linear': self.srgb_to_linear,
+                'alpha_mask_threshold': self.alpha_mask_threshold, 'alpha_mask_downsample': self.alpha_mask_downsample}
+
+    # loads a PNG file and returns the information about the texture, its dimensions, its path and its data
+    # ready to be uploaded to the graphic card. The texture is not added to the textures of the morph.
+    # The pixels stay 8 bit RGBA, the same as in the PNG file, and are uploaded as GL_UNSIGNED_BYTE, which takes a
+    # quarter of the memory of floats. bytes_saved is how much memory that saves for this texture. It does not
+    # use Blender or OpenGL so it can run in a worker thread, the backend puts the pixels in a bgl Buffer when
+    # it uploads them.
+    # srgb_to_linear keeps the colors in sRGB and marks the texture so the backend uploads it as GL_SRGB8_ALPHA8,
+    # the graphic card then turns the colors to linear when it samples them, without the banding of linear colors
+    # stored in 8 bits. premultiplied_alpha multiplies the colors by the alpha, the backend then blends the
+    # texture as premultiplied. With both the colors are multiplied while they are still sRGB.
+    # alpha_mask_threshold and alpha_mask_downsample make the alpha mask of the texture, see add_alpha_mask
+    def read_texture(self, full_path, premultiplied_alpha=False, srgb_to_linear=False,
+                     alpha_mask_threshold=None, alpha_mask_downsample=1):
+        texture = self.decode_texture(full_path, premultiplied_alpha, srgb_to_linear)
+        if alpha_mask_threshold is not None:
+            self.add_alpha_mask(texture, alpha_mask_threshold, alpha_mask_downsample)
+        return texture
+
+    # the pixels of the texture from the skin bundle, or from the PNG file if the bundle does not have them
+    def decode_texture(self, full_path, premultiplied_alpha, srgb_to_linear):
+        if self.skin_bundle is not None:
+            texture = self.skin_bundle.read_texture(full_path, premultiplied_alpha, srgb_to_linear)
+            if texture is not None:
+                return self.read_texture_metadata(texture)
+        im = Image.open(full_path).convert('RGBA')
+        data = numpy.array(im, dtype=numpy.uint8)
+        if premultiplied_alpha:
+            data[:, :, 0:3] = (data[:, :, 0:3].astype(numpy.uint16) * data[:, :, 3:4] + 127) // 255
 
         # a Morph can have multiple textures if it is needed, the information
         # about those textures are fetched directly from the PNG file
-        self.textures[name] = {'dimensions': [im.size[0], im.size[1]],
-                               'full_path': full_path, 'data': buf,
-                               'is_gl_initialised': False, 'scale': scale, 'texture_id': 0}
-
-        self.activate_texture(name)
-        return self.textures[name]
+        return self.read_texture_metadata({'dimensions': [im.size[0], im.size[1]],
+                'full_path': full_path, 'data': None, 'pixels': data.reshape(im.size[1], im.size[0] * 4),
+                'data_type': bgl.GL_UNSIGNED_BYTE, 'is_loaded': True,
+                'bytes': data.nbytes, 'bytes_saved': data.size * numpy.dtype(numpy.float32).itemsize - data.nbytes,
+                'premultiplied_alpha': premultiplied_alpha, 'srgb_to_linear': srgb_to_linear,
+                'is_gl_initialised': False, 'texture_id': 0})
+
+    # the alpha mask tells which pixels of the texture are not transparent, one bit for each pixel with the rows
+    # packed in bytes. With a downsample bigger than 1 a bit stands for a square of pixels and is set if any of
+    # them is not transparent. The mask is part of the texture so all the morphs with the texture share it
+    def add_alpha_mask(self, texture, threshold, downsample):
+        width, height = texture['dimensions']
+        alpha = texture['pixels'].reshape(height, width, 4)[:, :, 3]
+        mask_width = -(-width // downsample)
+        mask_height = -(-height // downsample)
+        padded = numpy.zeros((mask_height * downsample, mask_width * downsample), dtype=numpy.uint8)
+        padded[0:height, 0:width] = alpha
+        blocks = padded.reshape(mask_height, downsample, mask_width, downsample).max(axis=(1, 3))
+        texture['alpha_mask'] = numpy.packbits(blocks >= threshold, axis=1)
+        texture['alpha_mask_downsample'] = downsample
+        texture['bytes'] += texture['alpha_mask'].nbytes
+        return texture
+
+    # whether the point, in world coordinates, is on a part of the morph that is not transparent according to the
+    # alpha mask of the active texture. It does not check the bounds of the morph, see mouse_over_morph
+    def covers_point(self, x, y):
+        texture = self.active_texture
+        if not isinstance(texture, dict) or texture.get('alpha_mask') is None:
+            return True
+        world_position = self.world_position
+        texture_width, texture_height = texture['dimensions']
+        insets = self.nine_slice_insets()
+        if insets is None:
+            insets = [0, 0, 0, 0]
+        texture_x = self.texture_coordinate(x - world_position[0], self.width, texture_width, insets[0], insets[2],
+                                            self.active_texture_scale)
+        texture_y = self.texture_coordinate(world_position[1] + self.height - y, self.height, texture_height,
+                                            insets[3], insets[1], self.active_texture_scale)
+        mask = texture['alpha_mask']
+        row = min(max(int(texture_y) // texture['alpha_mask_downsample'], 0), len(mask) - 1)
+        column = min(max(int(texture_x) // texture['alpha_mask_downsample'], 0), len(mask[0]) * 8 - 1)
+        return ((mask[row, column >> 3] >> (7 - (column & 7))) & 1) == 1
+
+    # turns a distance from the left (or the top) of the morph into the pixels of the texture along the same
+    # axis. start and end are the nine slice insets at the two sides which keep their size, 0 if the texture
+    # is stretched as a whole. They shrink the same way the backend shrinks them when the morph is too small
+    def texture_coordinate(self, distance, size, texture_size, start, end, scale):
+        shrink = min(1.0, size / ((start + end) * scale)) if start + end > 0 else 1.0
+        start_size = start * scale * shrink
+        end_size = end * scale * shrink
+        if distance < start_size:
+            return distance / start_size * start
+        if distance > size - end_size:
+            return texture_size - (size - distance) / end_size * end
+        middle_size = size - start_size - end_size
+        if middle_size <= 0:
+            return start
+        return start + (distance - start_size) / middle_size * (texture_size - start - end)
+
+    # a PNG file can come with a JSON file of the same name that says more about the texture. For now that is
+    # "nine_slice", the insets [left, bottom, right, top] in pixels of a texture that is drawn as nine slices,
+    # see set_nine_slice
+    def read_texture_metadata(self, texture):
+        metadata_path = os.path.splitext(texture['full_path'])[0] + '.json'
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+            texture['nine_slice'] = metadata.get('nine_slice')
+        return texture
+
+    # makes the texture a nine slice texture, insets are [left, bottom, right, top] in pixels of the texture and
+    # None makes it a normal texture again. The corners of a nine slice texture keep their size and the rest
+    # stretches, so a morph with a nine slice texture can have any size and does not take the size of the
+    # texture. It affects only this morph, the other morphs with the same texture keep the insets of its JSON file
+    def set_nine_slice(self, name, insets):
+        self.nine_slices[name] = insets
+        if self.active_texture_name == name:
+            self.appearance_changed()
+
+    # the nine slice insets of the active texture, those given to set_nine_slice or else those of the JSON file of
+    # the texture. None if the active texture is not a nine slice texture
+    def nine_slice_insets(self):
+        if self.active_texture_name in self.nine_slices:
+            return self.nine_slices[self.active_texture_name]
+        if isinstance(self.active_texture, dict):
+            return self.active_texture.get('nine_slice')
+        return None
 
 
 
     # one texture can be active at the time in order to display on screen
     def activate_texture(self, name):
         self.active_texture = self.textures[name]
-        self.width = round(self.textures[name]['dimensions'][0] * self.textures[name]['scale'])
-        self.height = round(self.textures[name]['dimensions'][1] * self.textures[name]['scale'])
-        self.scale = self.textures[name]['scale']
+        self.active_texture_name = name
+        self.active_texture_scale = self.texture_scales.get(name, 1)
+        if self.textures[name].get('is_loaded', True) and self.nine_slice_insets() is None:
+            self.width = round(self.textures[name]['dimensions'][0] * self.active_texture_scale)
+            self.height = round(self.textures[name]['dimensions'][1] * self.active_texture_scale)
+        self.scale = self.active_texture_scale
+        self.appearance_changed()
 
 
     # add the Morph as a child to another Morph, the other Morph becomes the parent
@@ -364,20 +862,85 @@ class Morph(pylivecoding.LiveObject):
 
         morph.parent = self
         morph.world = self.world
+        for added_morph in morph.all_morphs():
+            added_morph.acquire_textures()
         self.children.append(morph)
-
+        self.invalidate_subtree_handles_events()
+        self.invalidate_subtree_bounds()
+        if self.world is not None:
+            self.world.morph_added(morph)
+
+    # remove a child Morph, the child and its own children no longer belong to the world and give their textures
+    # back to the texture cache, see release_textures
+    def remove_morph(self, morph):
+        self.children.remove(morph)
+        for removed_morph in morph.all_morphs():
+            removed_morph.release_textures()
+        self.invalidate_subtree_handles_events()
+        self.invalidate_subtree_bounds()
+        world = self.world
+        morph.parent = None
+        if world is not None:
+            world.morph_removed(morph)
+        morph.world = None
+
+    # returns this morph followed by all of its children, their children and so on
+    def all_morphs(self):
+        morphs = [self]
+        for morph in morphs:
+            morphs.extend(morph.children)
+        return morphs
+
+
+    # the indices that lead from the top parent to this morph, the first is the index of the top parent's child
+    # and the last the index of this morph among its siblings
+    def tree_path(self):
+        path = []
+        morph = self
+        while morph.parent is not None:
+            path.append(morph.parent.children.index(morph))
+            morph = morph.parent
+        path.reverse()
+        return path
+
+    # the morphs an event passes through to reach this morph, starting from the child of the world
+    # that contains it and ending with this morph
+    def event_path(self):
+        path = []
+        morph = self
+        while morph is not None and morph is not morph.world:
+            path.append(morph)
+            morph = morph.parent
+        path.reverse()
+        return path
+
+    # whether this morph is one of the parents of another morph, or the parent of its parent and so on
+    def is_ancestor_of(self, morph):
+        morph = morph.parent
+        while morph is not None:
+            if morph is self:
+                return True
+            morph = morph.parent
+        return False
 
     # returns a child morph of a specific name of course this depend on the definition
-    # of a name at the creation of Morph or after
+    # of a name at the creation of Morph or after. The morphs are searched depth first, each child and the morphs
+    # inside it before its next sibling, and the first with the name is returned. Inside a world the name registry
+    # of the world gives the morphs with the name directly and the first of them in that order is returned
     def get_child_morph_named(self, name):
-        if len(self.children)>0:
-            for child in self.children:
-                if child.name == name:
-                    return child
-                elif child.get_child_morph_named(name) is not None:
-                    return child.get_child_morph_named(name)
-        else:
-            return None
+        world = self.world
+        if world is not None:
+            morphs = [morph for morph in world.name_registry.morphs_named(name) if self.is_ancestor_of(morph)]
+            if len(morphs) == 0:
+                return None
+            return min(morphs, key=world.tree_order_key)
+        for child in self.children:
+            if child.name == name:
+                return child
+            morph = child.get_child_morph_named(name)
+            if morph is not None:
+                return morph
+        return None
 
 
 
@@ -401,19 +964,40 @@ class Morph(pylivecoding.LiveObject):
     # specialised method. Generally this should not be overridden by your classes unless you
     # want to override the general event behavior of the morph. For specific event override the
     # relevant methods instead.
+    # A click or a turn of the mouse wheel can only be handled by the morphs under the mouse cursor, so children
+    # whose subtree bounds are not under it are skipped together with everything inside them. Mouse moves reach
+    # the morphs under the mouse and the morphs the mouse just left, so those know it went out
     def on_event(self, event, context):
-
+        click = event.type in {'LEFTMOUSE', 'RIGHTMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}
+        x, y = self.world.mouse_position
         if len(self.children)>0:
             for morph in self.children:
-                morph.on_event(event, context)
+                if morph.subtree_handles_events and (not click or morph.subtree_contains_point(x, y)):
+                    morph.on_event(event, context)
+
+        self.handle_event(event, context)
 
+    # called before any of its children handles a mouse click under the mouse cursor, starting from the morph
+    # closest to the world. Only for morphs that handle events. Set world.consumed_event to True to stop the
+    # click from reaching the children, for example to block a panel while it is disabled
+    def on_capture_event(self, event):
+        return
+
+    # handles the event only for this morph without passing it to its children. World uses this
+    # directly for the morphs it finds under the mouse cursor
+    def handle_event(self, event, context):
         if self.handles_events and not self.is_hidden and not self.world.consumed_event:
+            if self.world.profiler is not None:
+                self.world.profiler.count_event(self)
             if event.type in {'LEFTMOUSE', 'RIGHTMOUSE'}:
                 self.on_mouse_click(event)
 
             elif event.type in {'MOUSEMOVE'}:
                 self.on_mouse_over(event)
 
+            elif event.type in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
+                self.on_mouse_wheel(event)
+
 
 
 
@@ -490,6 +1074,504 @@ class Morph(pylivecoding.LiveObject):
         else:
             return self.world.event
 
+    # an event when the mouse wheel turns while the mouse is over the morph or one of its children. Set
+    # world.consumed_event to True when the morph uses it, so its parents and Blender do not use it as well
+    def on_mouse_wheel(self, event):
+        return
+
+
+# The spatial index is how a World finds which morphs are under the mouse cursor without asking every
+# morph it contains. The world is divided into a grid of square cells and each morph is registered in
+# every cell its bounds overlap. Morphs do not update the index themselves, they only mark themselves as
+# dirty when they move, resize or hide and the index updates them all together the next time it is queried.
+# Hidden morphs are not registered at all.
+class MorphSpatialIndex(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, cell_size=64):
+        super().__init__()
+        self.cell_size = cell_size
+
+        # each cell is a set of morphs , keyed by the column and row of the cell
+        self.cells = {}
+
+        # for each registered morph its bounds in world coordinates and the range of cells it occupies
+        self.morph_bounds = {}
+        self.morph_cells = {}
+
+        # morphs that need to be registered again before the next query
+        self.dirty_morphs = set()
+
+    def mark_dirty(self, morph):
+        self.dirty_morphs.add(morph)
+
+    # removes a morph from the index, for example when it is removed from the world
+    def remove(self, morph):
+        self.dirty_morphs.discard(morph)
+        cell_range = self.morph_cells.pop(morph, None)
+        self.morph_bounds.pop(morph, None)
+        if cell_range is not None:
+            cx1, cy1, cx2, cy2 = cell_range
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    cell = self.cells[(cx, cy)]
+                    cell.discard(morph)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    # registers a morph to all the cells its bounds overlap , if it is already registered its
+    # old cells are replaced
+    def insert(self, morph):
+        self.remove(morph)
+        if morph.is_hidden:
+            return
+        world_position = morph.world_position
+        x1 = world_position[0]
+        y1 = world_position[1]
+        x2 = x1 + morph.width
+        y2 = y1 + morph.height
+        cell_range = (int(x1 // self.cell_size), int(y1 // self.cell_size),
+                      int(x2 // self.cell_size), int(y2 // self.cell_size))
+        cx1, cy1, cx2, cy2 = cell_range
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.cells.setdefault((cx, cy), set()).add(morph)
+        self.morph_bounds[morph] = (x1, y1, x2, y2)
+        self.morph_cells[morph] = cell_range
+
+    def update(self):
+        while self.dirty_morphs:
+            self.insert(self.dirty_morphs.pop())
+
+    # returns the morphs that contain the point, the same way mouse_over_morph does. The order of the
+    # morphs is not defined
+    def morphs_at(self, x, y):
+        self.update()
+        cell = self.cells.get((int(x // self.cell_size), int(y // self.cell_size)))
+        if cell is None:
+            return []
+        result = []
+        for morph in cell:
+            x1, y1, x2, y2 = self.morph_bounds[morph]
+            if x > x1 and x < x2 and y > y1 and y < y2:
+                result.append(morph)
+        return result
+
+
+# The morph store is the compact storage of a World. Instead of each morph keeping its own lists for position
+# and color, the positions, sizes, colors, flags and parents of all the morphs of the world are kept in NumPy
+# arrays, one row per morph. Each morph gets a slot (a row) when it is added to the world and its properties
+# read and write that row. This keeps the geometry of thousands of morphs close together in memory so it can be
+# read and changed for many morphs at once with a single NumPy operation, see move_morphs, recolor_morphs,
+# hide_morphs and world_positions. A morph in the store is only a view of its slot, the instance variables of
+# its geometry, color and flags are cleared and its position and color lists are dropped. The cached world
+# position and the area the morph was last drawn at are kept in the store too, so a drawn morph of a compact
+# world takes less memory than one that keeps its own values. Reading and writing a single property through
+# the arrays is slower than through instance variables, the store pays off for the operations on many morphs.
+# The arrays hold floats, the store remembers which values were given as ints and which colors as tuples, so
+# the properties of a morph give back the same values and types they were given
+class MorphStore(pylivecoding.LiveObject):
+    instances = []
+
+    # the bits of the flags array
+    HIDDEN = 1
+    HANDLES_EVENTS = 2
+    CAN_DRAW = 4
+    IN_USE = 8
+    COLOR_TUPLE = 16
+    WORLD_POSITION_CACHED = 32
+    DRAWN = 64
+
+    # the first bit in the integers array of the values of a slot, each bit tells whether a value was an int
+    POSITION = 0
+    SIZE = 2
+    COLOR = 4
+    WORLD_POSITION = 8
+    DRAWN_BOUNDS = 10
+
+    # the numbers the store gives back as ints
+    INTEGER_TYPES = (int, numpy.integer)
+
+    def __init__(self, capacity=256):
+        super().__init__()
+        self.capacity = 0
+
+        # slots up to count have been used at least once, slots freed by removed morphs are reused first
+        self.count = 0
+        self.free_slots = []
+
+        self.positions = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.sizes = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.colors = numpy.zeros((0, 4), dtype=numpy.float64)
+        self.flags = numpy.zeros(0, dtype=numpy.uint8)
+        self.integers = numpy.zeros(0, dtype=numpy.uint16)
+
+        # the caches of the world position and of the area each morph was last drawn at, valid when the
+        # WORLD_POSITION_CACHED and DRAWN flags are set
+        self.world_position_cache = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.drawn_bounds_cache = numpy.zeros((0, 4), dtype=numpy.float64)
+
+        # the slot of the parent of each morph, -1 for the morphs that their parent is the world
+        self.parents = numpy.zeros(0, dtype=numpy.int32)
+
+        # the morph that uses each slot or None for the free slots
+        self.morphs = []
+        self.grow(capacity)
+
+    # makes the arrays bigger keeping their content, the store doubles its capacity every time it runs out of slots
+    def grow(self, capacity):
+        for array_name in ('positions', 'sizes', 'colors', 'flags', 'integers', 'parents', 'world_position_cache',
+                           'drawn_bounds_cache'):
+            old_array = getattr(self, array_name)
+            new_array = numpy.zeros((capacity,) + old_array.shape[1:], dtype=old_array.dtype)
+            new_array[:len(old_array)] = old_array
+            setattr(self, array_name, new_array)
+        self.parents[self.capacity:] = -1
+        self.morphs.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    # gives the morph a slot and moves its geometry, color and flags from its instance variables to the arrays.
+    # The instance variables are cleared so the morph keeps no copy of them, it is only a view of its slot
+    def attach(self, morph):
+        if morph._store is self:
+            return morph._slot
+        if morph._store is not None:
+            morph._store.detach(morph)
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+        else:
+            if self.count == self.capacity:
+                self.grow(max(self.capacity * 2, 1))
+            slot = self.count
+            self.count += 1
+        self.flags[slot] = self.IN_USE
+        self.set_position(slot, morph._position)
+        self.set_size(slot, 0, morph._width)
+        self.set_size(slot, 1, morph._height)
+        self.set_color(slot, morph._color)
+        self.flags[slot] |= self.HIDDEN if morph._is_hidden else 0
+        self.flags[slot] |= self.HANDLES_EVENTS if morph._handles_events else 0
+        self.flags[slot] |= self.CAN_DRAW if morph._can_draw else 0
+        self.set_drawn_bounds(slot, morph._drawn_bounds)
+        self.morphs[slot] = morph
+        morph._store = self
+        morph._slot = slot
+        self.set_parent(slot, morph.parent)
+
+        morph._position = None
+        morph._width = None
+        morph._height = None
+        morph._color = None
+        morph._is_hidden = None
+        morph._handles_events = None
+        morph._can_draw = None
+        morph._drawn_bounds = None
+        morph._world_position_cache = None
+        morph._absolute_position_cache = None
+        return slot
+
+    # gives the values back to the instance variables of the morph and frees its slot
+    def detach(self, morph):
+        if morph._store is not self:
+            return
+        slot = morph._slot
+        morph._position = self.position(slot)
+        morph._width = self.size(slot, 0)
+        morph._height = self.size(slot, 1)
+        morph._color = self.color(slot)
+        morph._is_hidden = bool(self.flags[slot] & self.HIDDEN)
+        morph._handles_events = bool(self.flags[slot] & self.HANDLES_EVENTS)
+        morph._can_draw = bool(self.flags[slot] & self.CAN_DRAW)
+        morph._drawn_bounds = self.drawn_bounds(slot)
+        morph._store = None
+        morph._slot = -1
+        self.flags[slot] = 0
+        self.parents[slot] = -1
+        self.morphs[slot] = None
+        self.free_slots.append(slot)
+
+    # the values of a row as Python numbers, ints where ints were given
+    def values(self, array, slot, first_bit):
+        integers = self.integers.item(slot) >> first_bit
+        values = array[slot].tolist()
+        if integers:
+            for index in range(len(values)):
+                if integers & (1 << index):
+                    values[index] = int(values[index])
+        return values
+
+    # writes the values one by one, for a few values that is faster than converting them to an array
+    def set_values(self, array, slot, first_bit, values):
+        integers = self.integers.item(slot) & ~(((1 << len(values)) - 1) << first_bit)
+        for index, value in enumerate(values):
+            array[slot, index] = value
+            if isinstance(value, self.INTEGER_TYPES):
+                integers |= 1 << (first_bit + index)
+        self.integers[slot] = integers
+
+    # the position is read and written far more often than the rest, so it does the same as values and
+    # set_values without their loops
+    def position(self, slot):
+        integers = self.integers.item(slot) >> self.POSITION
+        x = self.positions.item(slot, 0)
+        y = self.positions.item(slot, 1)
+        return [int(x) if integers & 1 else x, int(y) if integers & 2 else y]
+
+    def set_position(self, slot, position):
+        x, y = position
+        self.positions[slot, 0] = x
+        self.positions[slot, 1] = y
+        integers = self.integers.item(slot) & ~(3 << self.POSITION)
+        if isinstance(x, self.INTEGER_TYPES):
+            integers |= 1 << self.POSITION
+        if isinstance(y, self.INTEGER_TYPES):
+            integers |= 2 << self.POSITION
+        self.integers[slot] = integers
+
+    def size(self, slot, axis):
+        if self.integers.item(slot) & (1 << (self.SIZE + axis)):
+            return int(self.sizes.item(slot, axis))
+        return self.sizes.item(slot, axis)
+
+    def set_size(self, slot, axis, value):
+        self.sizes[slot, axis] = value
+        bit = 1 << (self.SIZE + axis)
+        if isinstance(value, self.INTEGER_TYPES):
+            self.integers[slot] |= bit
+        else:
+            self.integers[slot] &= ~bit & 0xFFFF
+
+    def color(self, slot):
+        color = self.values(self.colors, slot, self.COLOR)
+        if self.flags[slot] & self.COLOR_TUPLE:
+            return tuple(color)
+        return color
+
+    def set_color(self, slot, color):
+        self.set_values(self.colors, slot, self.COLOR, color)
+        self.set_flag(slot, self.COLOR_TUPLE, isinstance(color, tuple))
+
+    def set_flag(self, slot, flag, value):
+        if value:
+            self.flags[slot] |= flag
+        else:
+            self.flags[slot] &= ~flag & 0xFF
+
+    # the world position of the morph, calculated from the world position of its parent only when it is
+    # not cached yet
+    def world_position(self, morph):
+        slot = morph._slot
+        if self.flags.item(slot) & self.WORLD_POSITION_CACHED:
+            integers = self.integers.item(slot) >> self.WORLD_POSITION
+            x = self.world_position_cache.item(slot, 0)
+            y = self.world_position_cache.item(slot, 1)
+            return [int(x) if integers & 1 else x, int(y) if integers & 2 else y]
+        if morph._parent is not None:
+            parent_position = morph._parent.world_position
+            position = self.position(slot)
+            world_position = [parent_position[0] + position[0], parent_position[1] + position[1]]
+        else:
+            world_position = [0, 0]
+        self.set_values(self.world_position_cache, slot, self.WORLD_POSITION, world_position)
+        self.flags[slot] |= self.WORLD_POSITION_CACHED
+        return world_position
+
+    # empties the world position cache of the slot, returns False if it was already empty
+    def clear_world_position(self, slot):
+        if not self.flags.item(slot) & self.WORLD_POSITION_CACHED:
+            return False
+        self.flags[slot] &= ~self.WORLD_POSITION_CACHED & 0xFF
+        return True
+
+    def drawn_bounds(self, slot):
+        if self.flags.item(slot) & self.DRAWN:
+            return self.values(self.drawn_bounds_cache, slot, self.DRAWN_BOUNDS)
+        return None
+
+    def set_drawn_bounds(self, slot, bounds):
+        if bounds is None:
+            self.flags[slot] &= ~self.DRAWN & 0xFF
+        else:
+            self.set_values(self.drawn_bounds_cache, slot, self.DRAWN_BOUNDS, bounds)
+            self.flags[slot] |= self.DRAWN
+
+    def set_parent(self, slot, parent):
+        if parent is not None and parent._store is self:
+            self.parents[slot] = parent._slot
+        else:
+            self.parents[slot] = -1
+
+    def slots_of(self, morphs):
+        return numpy.array([morph._slot for morph in morphs], dtype=numpy.intp)
+
+    # the bits of the integers array of the values that are ints, for a value given to all the slots at once
+    def integer_bits(self, values, first_bit):
+        bits = 0
+        for index in range(len(values)):
+            if isinstance(values[index], self.INTEGER_TYPES):
+                bits |= 1 << (first_bit + index)
+        return bits
+
+    # moves all the morphs by the same offset [x, y], their children move with them. Each morph is moved once
+    # even if it is given more than once
+    def move_morphs(self, morphs, offset):
+        morphs = list(dict.fromkeys(morphs))
+        slots = self.slots_of(morphs)
+        self.positions[slots] += offset
+        not_integers = (3 << self.POSITION) & ~self.integer_bits(offset, self.POSITION)
+        self.integers[slots] &= ~not_integers & 0xFFFF
+        for morph in morphs:
+            morph.invalidate_world_position()
+
+    # gives the same color to all the morphs
+    def recolor_morphs(self, morphs, color):
+        slots = self.slots_of(morphs)
+        self.colors[slots] = color
+        self.integers[slots] &= ~(15 << self.COLOR) & 0xFFFF
+        self.integers[slots] |= self.integer_bits(color, self.COLOR)
+        if isinstance(color, tuple):
+            self.flags[slots] |= self.COLOR_TUPLE
+        else:
+            self.flags[slots] &= ~self.COLOR_TUPLE & 0xFF
+        for morph in morphs:
+            morph.appearance_changed()
+
+    # hides or shows all the morphs and their children
+    def hide_morphs(self, morphs, hidden=True):
+        changed = []
+        for morph in morphs:
+            changed.extend(morph.all_morphs())
+        slots = self.slots_of(changed)
+        if hidden:
+            self.flags[slots] |= self.HIDDEN
+        else:
+            self.flags[slots] &= ~self.HIDDEN & 0xFF
+        for morph in changed:
+            morph.bounds_changed()
+
+    # the world positions of all slots calculated together. Each step adds to each morph the sum of positions
+    # gathered by its current ancestor and then jumps to that ancestor's ancestor , so a tree of depth d
+    # needs only about log2(d) steps
+    def world_positions(self):
+        positions = self.positions[:self.count].copy()
+        ancestors = self.parents[:self.count].copy()
+        has_ancestor = ancestors >= 0
+        while has_ancestor.any():
+            positions[has_ancestor] += positions[ancestors[has_ancestor]]
+            ancestors[has_ancestor] = ancestors[ancestors[has_ancestor]]
+            has_ancestor = ancestors >= 0
+        return positions
+
+
+# The name registry keeps track of the names of all morphs inside a World so that a morph can be found
+# by its name without searching the whole world. Many morphs can have the same name. Names can also be
+# searched by their beginning or with a glob pattern like "button_*"
+class MorphNameRegistry(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self):
+        super().__init__()
+
+        # for each name the morphs that have it, in the order they were registered. The morphs are the keys of a
+        # dict, which keeps their order and adds and removes them without searching
+        self.morphs_by_name = {}
+
+        # the same for the children of each parent, keyed by (parent, name), and the parent each morph was
+        # registered with, because a morph that is removed no longer knows its parent
+        self.children_by_name = {}
+        self.registered_parents = {}
+
+        # all names sorted alphabetically, so the names that begin the same way are next to each other
+        self.sorted_names = []
+
+    def add(self, morph):
+        name = morph.name
+        if name not in self.morphs_by_name:
+            self.morphs_by_name[name] = {}
+            bisect.insort(self.sorted_names, name)
+        self.morphs_by_name[name][morph] = None
+        self.children_by_name.setdefault((morph.parent, name), {})[morph] = None
+        self.registered_parents[morph] = morph.parent
+
+    def remove(self, morph, name=None):
+        if name is None:
+            name = morph.name
+        morphs = self.morphs_by_name.get(name)
+        if morphs is None or morph not in morphs:
+            return
+        del morphs[morph]
+        if len(morphs) == 0:
+            del self.morphs_by_name[name]
+            del self.sorted_names[bisect.bisect_left(self.sorted_names, name)]
+        key = (self.registered_parents.pop(morph), name)
+        children = self.children_by_name[key]
+        del children[morph]
+        if len(children) == 0:
+            del self.children_by_name[key]
+
+    def rename(self, morph, old_name, new_name):
+        self.remove(morph, old_name)
+        self.add(morph)
+
+    # all morphs with this name
+    def morphs_named(self, name):
+        return list(self.morphs_by_name.get(name, ()))
+
+    # the first morph registered with this name or None
+    def morph_named(self, name):
+        morphs = self.morphs_by_name.get(name)
+        if morphs:
+            return next(iter(morphs))
+        return None
+
+    # the first child of the parent with this name, in the order of the children of the parent, or None
+    def child_named(self, parent, name):
+        children = self.children_by_name.get((parent, name))
+        if not children:
+            return None
+        if len(children) == 1:
+            return next(iter(children))
+        for child in parent.children:
+            if child in children:
+                return child
+        return None
+
+    # all morphs that their name begins with prefix
+    def morphs_with_prefix(self, prefix):
+        morphs = []
+        index = bisect.bisect_left(self.sorted_names, prefix)
+        while index < len(self.sorted_names) and self.sorted_names[index].startswith(prefix):
+            morphs.extend(self.morphs_by_name[self.sorted_names[index]])
+            index += 1
+        return morphs
+
+    # all morphs that their name matches a glob pattern like "button_*" or "row_??"
+    def morphs_matching(self, pattern):
+        morphs = []
+        for name in fnmatch.filter(self.sorted_names, pattern):
+            morphs.extend(self.morphs_by_name[name])
+        return morphs
+
+
+# A copy of a Blender event and of the region that received it. Blender events can only be used while the modal
+# method of the operator is running, so World keeps this copy instead when it queues events for later
+class QueuedEvent:
+    def __init__(self, event, region):
+        self.type = event.type
+        self.value = event.value
+        self.mouse_region_x = event.mouse_region_x
+        self.mouse_region_y = event.mouse_region_y
+        self.shift = getattr(event, 'shift', False)
+        self.ctrl = getattr(event, 'ctrl', False)
+        self.alt = getattr(event, 'alt', False)
+        self.region = QueuedRegion(region)
+
+
+class QueuedRegion:
+    def __init__(self, region):
+        self.x = region.x
+        self.y = region.y
+        self.width = region.width
+        self.height = region.height
+
 
 # World morph is a simple morph that triggers and handles the drawing methods and event methods
 # for each child morph. In order for a morph to be a child of a World it has to be added to it or
@@ -505,7 +1587,9 @@ class Morph(pylivecoding.LiveObject):
 # created a world , creted the morphs and added the morphs to the world via add_morph method.
 class World(Morph):
     instances = []
-    def __init__(self, **kargs):
+    # compact_storage: keeps the geometry, color and flags of the morphs of the world in a MorphStore
+    # this is recommended for worlds with thousands of morphs
+    def __init__(self, compact_storage=False, **kargs):
 
         super().__init__(**kargs)
 
@@ -551,6 +1635,10 @@ class World(Morph):
         # for Morpheas any other region can draw graphics and receive events as well
         # this is useful when you replicate the same internal window for example when
         # you have opened multiple 3d views
+        # every time the draw area changes its version increases so morphs know their cached absolute position
+        # is out of date
+        self.draw_area_version = 0
+        self._draw_area = [0, 0, 0, 0]
         self.draw_area = [0,0,0,0]
         self.draw_area_position = [0, 0]
         self.draw_area_width = 300
@@ -561,9 +1649,66 @@ class World(Morph):
         # so it depends on self.mouse_cursor_inside
         self.auto_hide = True
 
+        # the spatial index keeps track of where each morph is located inside the world, so mouse events are
+        # sent only to the morphs under the mouse cursor instead of every morph of the world. Disable it to
+        # send every event to every morph
+        self.spatial_index = MorphSpatialIndex()
+        self.use_spatial_index = True
+
+        # the morphs that handle events and that the mouse was over during the last mouse move, they
+        # receive the next mouse move even if the mouse is no longer over them so they know the mouse went out
+        self.hovered_morphs = []
+
+        # the index of each child among its siblings by parent, for the structure version they were found for,
+        # see child_index
+        self._child_indices = {}
+        self._child_indices_version = -1
+
+        # the name registry finds the morphs of the world by name, see get_child_morph_named
+        self.name_registry = MorphNameRegistry()
+
+        # the morphs that moved, resized, hid or changed appearance since the last draw. From them the world
+        # calculates the damaged rectangles, the areas of the world that have to be drawn again. When there are
+        # more rectangles than max_damaged_rectangles they are merged into one
+        self.damaged_morphs = set()
+
+        # the other canvases that draw the world, like MSoftwareCanvas. Each keeps its own set of damaged morphs
+        # and takes them when it draws, so it does not take the damage of mOpenGLCanvas, see damage
+        self.damage_listeners = weakref.WeakSet()
+
+        # increases every time morphs are added to or removed from the world
+        self.structure_version = 0
+        self.max_damaged_rectangles = 8
+        self._damage_draw_area_version = -1
+
+        # batching of events , see queue_event. The counters tell how many events the world received,
+        # how many it actually handled and how many mouse moves were replaced by a newer mouse move
+        self.batch_events = False
+        self.event_queue = []
+        self.events_received = 0
+        self.events_processed = 0
+        self.events_coalesced = 0
+        self.batches_processed = 0
+
+        # the MorphStore of the world if compact storage is used, otherwise None
+        if compact_storage:
+            self.morph_store = MorphStore()
+        else:
+            self.morph_store = None
+
+        # the MTextureAtlasBuilder of the last call to build_texture_atlas
+        self.texture_atlas = None
+
+        # the MFrameProfiler that times each frame, None while profiling is off, see enable_profiling
+        self.profiler = None
+
         self._width = 2000
         self._height = 2000
 
+        # a world is the world of itself, this way the world can be treated like any other morph
+        # when it comes to calculating positions
+        self._world = self
+
         #MOpenGLCanvas is the backend of Morpheas responsible for all drawing functionality
 
         self.mOpenGLCanvas = backend.MOpenGLCanvas(self)
@@ -574,6 +1719,19 @@ class World(Morph):
 
 
 
+    @property
+    def draw_area(self):
+        return self._draw_area
+
+    # the draw area is assigned an OpenGL buffer on every draw, so the version changes only when the
+    # values are actually different
+    @draw_area.setter
+    def draw_area(self, value):
+        value = list(value)
+        if value != self._draw_area:
+            self._draw_area = value
+            self.draw_area_version += 1
+
     # position with coordinates that start [0,0] at the bottom of the entire Blender window
     # (not to be confused with Blender's own internal windows)
     def get_absolute_position(self):
@@ -582,6 +1740,7 @@ class World(Morph):
     #  draw depends on Morph draw, what it does additionally is the auto_hide feature
     def draw(self, context):
         self.draw_area_context = context
+        textures.finish_all_loading()
         if self.event is not None:
             # Use OpenGL to get the size of the region we can draw without overlapping with other areas
             mybuffer = bgl.Buffer(bgl.GL_INT, 4)
@@ -612,6 +1771,26 @@ class World(Morph):
 
                 self.mOpenGLCanvas.draw()
 
+        if self.profiler is not None:
+            self.profiler.end_frame()
+
+    # starts timing every frame, keeping the last frame_count frames in world.profiler, see profiler.py.
+    # Profiling again starts over with no frames
+    def enable_profiling(self, frame_count=120):
+        self.profiler = profiler.MFrameProfiler(frame_count)
+        return self.profiler
+
+    def disable_profiling(self):
+        self.profiler = None
+
+    # for a world that will not be drawn again, for example when the addon that draws it is unregistered. Its
+    # morphs give their textures back to the texture cache and the worker threads of the cache stop, the cache
+    # starts them again if another world loads textures asynchronously
+    def close(self):
+        for morph in self.all_morphs():
+            morph.release_textures()
+        self.texture_cache.close()
+
 
     # a world cannot have a world by itself and of course not a parent
     # this is why we override the Morph add_morph method
@@ -619,18 +1798,300 @@ class World(Morph):
         super().add_morph(morph)
         morph.world = self
 
+    # called when a morph is added to a morph that belongs to this world. The morph and all its children now
+    # belong to this world
+    def morph_added(self, morph):
+        self.structure_version += 1
+        for child in morph.all_morphs():
+            child.world = self
+            if self.morph_store is not None:
+                self.morph_store.attach(child)
+            child.bounds_changed()
+            self.name_registry.add(child)
+
+    # called when a morph is removed from a morph that belongs to this world
+    def morph_removed(self, morph):
+        self.structure_version += 1
+        for child in morph.all_morphs():
+            self.spatial_index.remove(child)
+            self.name_registry.remove(child)
+            if child in self.hovered_morphs:
+                self.hovered_morphs.remove(child)
+            if self.morph_store is not None:
+                self.morph_store.detach(child)
+            self.damage(child)
+            child.world = None
+
+    # adds the morph to the damaged morphs of the world and of the other canvases that draw the world
+    def damage(self, morph):
+        self.damaged_morphs.add(morph)
+        if self.damage_listeners:
+            for listener in self.damage_listeners:
+                listener.damaged_morphs.add(morph)
+
+    # returns the damaged rectangles [x1, y1, x2, y2] in world coordinates since the last time it was called.
+    # For each damaged morph both the area it used to occupy and the area it occupies now are damaged.
+    # If the draw area of the world changed everything is damaged
+    def collect_damage(self):
+        rectangles = []
+        for morph in self.damaged_morphs:
+            drawn_bounds = morph.drawn_bounds
+            if drawn_bounds is not None:
+                rectangles.append(drawn_bounds)
+            drawn_bounds = morph.visible_world_bounds(self)
+            morph.drawn_bounds = drawn_bounds
+            if drawn_bounds is not None:
+                rectangles.append(drawn_bounds)
+        self.damaged_morphs.clear()
+        if self._damage_draw_area_version != self.draw_area_version:
+            self._damage_draw_area_version = self.draw_area_version
+            return [[0, 0, self.width, self.height]]
+        return self.merge_rectangles(rectangles)
+
+    # merges the rectangles that overlap or touch until no two rectangles overlap
+    def merge_rectangles(self, rectangles):
+        merged = []
+        for rectangle in rectangles:
+            rectangle = list(rectangle)
+            index = 0
+            while index < len(merged):
+                other = merged[index]
+                if (rectangle[0] <= other[2] and other[0] <= rectangle[2] and
+                        rectangle[1] <= other[3] and other[1] <= rectangle[3]):
+                    rectangle = [min(rectangle[0], other[0]), min(rectangle[1], other[1]),
+                                 max(rectangle[2], other[2]), max(rectangle[3], other[3])]
+                    merged.pop(index)
+                    index = 0
+                else:
+                    index += 1
+            merged.append(rectangle)
+        if len(merged) > self.max_damaged_rectangles:
+            merged = [[min(rectangle[0] for rectangle in merged), min(rectangle[1] for rectangle in merged),
+                       max(rectangle[2] for rectangle in merged), max(rectangle[3] for rectangle in merged)]]
+        return merged
+
+    # the morphs under the mouse cursor in the order they receive events. Morphs that are clipped by their parents
+    # at the mouse cursor are left out because they are not drawn there
+    def morphs_under_mouse(self):
+        x, y = self.mouse_position
+        morphs = [morph for morph in self.spatial_index.morphs_at(x, y)
+                  if morph.covers_point(x, y) and morph.inside_parents(x, y)]
+        return self.sort_in_event_order(morphs)
+
+    # morphs receive events in the order on_event visits them. Children before their parent and
+    # children in the order they were added
+    def sort_in_event_order(self, morphs):
+        return sorted(morphs, key=self.event_order_key)
+
+    def event_order_key(self, morph):
+        return self.tree_order_key(morph) + [float('inf')]
+
+    # the same as the tree_path of the morph, using the child indices kept by the world
+    def tree_order_key(self, morph):
+        path = []
+        while morph.parent is not None:
+            path.append(self.child_index(morph))
+            morph = morph.parent
+        path.reverse()
+        return path
+
+    # the index of a morph of the world among its siblings. The indices of the children of each parent are
+    # kept until morphs are added to or removed from the world, so sorting does not search the children
+    def child_index(self, morph):
+        if self._child_indices_version != self.structure_version:
+            self._child_indices = {}
+            self._child_indices_version = self.structure_version
+        indices = self._child_indices.get(morph.parent)
+        if indices is None:
+            indices = {child: index for index, child in enumerate(morph.parent.children)}
+            self._child_indices[morph.parent] = indices
+        return indices[morph]
+
+    # sends a mouse event only to the morphs that are under the mouse cursor.
+    # A mouse move goes to every morph under the mouse and to those that were under the mouse on the previous
+    # mouse move, so they can handle the mouse going out, and to the morphs being dragged. A morph the mouse is
+    # not over and was not over on the previous mouse move does not get the mouse move at all, so on_mouse_out
+    # is called once when the mouse leaves a morph and never for a morph the mouse has not entered. A mouse move
+    # is never consumed.
+    # A mouse click or a turn of the mouse wheel first finds the morph under the mouse that is deepest inside the
+    # tree of morphs, the target.
+    # Then it travels from the child of the world that contains the target down to the target, calling
+    # on_capture_event (capture) and then back up from the target to the world calling handle_event (bubble).
+    # The moment a morph consumes the click it stops. If no morph on the way consumes it the next morph
+    # under the mouse becomes the target. Branches where no morph handles events are skipped completely
+    def dispatch_event(self, event, context):
+        if event.type not in {'LEFTMOUSE', 'RIGHTMOUSE', 'MOUSEMOVE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
+            return
+        if event.type == 'MOUSEMOVE':
+            morphs = [morph for morph in self.morphs_under_mouse() if morph.handles_events]
+            targets = self.sort_in_event_order(set(morphs).union(self.hovered_morphs))
+            for morph in targets:
+                morph.handle_event(event, context)
+            # a dragged morph follows the mouse even when the mouse moves faster than the morph
+            self.hovered_morphs = morphs + [morph for morph in targets if morph.drag_drop and morph not in morphs]
+            return
+
+        captured = set()
+        bubbled = set()
+        for target in self.morphs_under_mouse():
+            path = target.event_path()
+            if not path[0].subtree_handles_events:
+                continue
+            for morph in path:
+                if morph not in captured:
+                    captured.add(morph)
+                    if morph.handles_events and not morph.is_hidden:
+                        morph.on_capture_event(event)
+                        if self.consumed_event:
+                            return
+            for morph in reversed(path):
+                if morph not in bubbled:
+                    bubbled.add(morph)
+                    morph.handle_event(event, context)
+                    if self.consumed_event:
+                        return
 
     # again this depends on Morph on_event
     # Here we automatically set up information about which region has been
     # assigned by Blender to handle events
+    # If batch_events is enabled the event is not handled immediately, it is added to the event queue
+    # instead, see queue_event
     def on_event(self, event, context):
-
-        bmx = context.region.x
-        bmy = context.region.y
+        if self.batch_events:
+            self.queue_event(event, context)
+        else:
+            self.events_received += 1
+            self.process_event(event, context, context.region)
+
+    # Blender can send many mouse moves between two redraws. With batch_events enabled each event is kept
+    # in the event queue and a mouse move that follows another mouse move replaces it, because only the
+    # latest mouse position matters. Clicks and any other events keep their order. The queue is handled by
+    # process_event_queue which should be called once per tick of the modal operator, for example on its
+    # TIMER event. A click or a turn of the mouse wheel handles the queue immediately so consumed_event tells
+    # correctly whether it should be passed to Blender
+    def queue_event(self, event, context):
+        self.events_received += 1
+        queued_event = QueuedEvent(event, context.region)
+        if event.type == 'MOUSEMOVE' and len(self.event_queue) > 0 and self.event_queue[-1].type == 'MOUSEMOVE':
+            self.event_queue[-1] = queued_event
+            self.events_coalesced += 1
+        else:
+            self.event_queue.append(queued_event)
+        if event.type in {'LEFTMOUSE', 'RIGHTMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
+            self.process_event_queue(context)
+        else:
+            self.consumed_event = False
+
+    # handles all the events of the event queue in the order they arrived and returns whether any was consumed
+    def process_event_queue(self, context):
+        if len(self.event_queue) == 0:
+            return False
+        queued_events = self.event_queue
+        self.event_queue = []
+        consumed_event = False
+        for queued_event in queued_events:
+            self.process_event(queued_event, context, queued_event.region)
+            consumed_event = consumed_event or self.consumed_event
+        self.batches_processed += 1
+        self.consumed_event = consumed_event
+        return consumed_event
+
+    def reset_event_counters(self):
+        self.events_received = 0
+        self.events_processed = 0
+        self.events_coalesced = 0
+        self.batches_processed = 0
+
+    # packs the textures of all morphs into texture atlases so they can be drawn with far fewer texture binds.
+    # The pages of the atlas are kept in cache_path, by default the atlas_cache folder next to the textures,
+    # and are built again only when a PNG file changes. Textures loaded after this are not in the atlas
+    # until it is built again, which gives the pages of the previous atlas back to the texture cache
+    def build_texture_atlas(self, cache_path=None, page_size=2048, padding=2):
+        if cache_path is None:
+            cache_path = os.path.join(os.path.dirname(self.texture_full_path('atlas')), 'atlas_cache')
+        old_atlas = self.texture_atlas
+        self.texture_atlas = atlas.MTextureAtlasBuilder(self, cache_path, page_size, padding)
+        pages = self.texture_atlas.build()
+        if old_atlas is not None:
+            self.texture_atlas.release_pages(old_atlas.pages)
+        return pages
+
+    # the skin bundles built by build_skin_bundle next to the PNG files of the textures, the newest first. Each
+    # build writes a new file named after the time it was built
+    def skin_bundle_paths(self):
+        folder = os.path.dirname(self.texture_full_path('skin'))
+        return [os.path.join(folder, file_name) for file_name in sorted(os.listdir(folder), reverse=True)
+                if fnmatch.fnmatch(file_name, 'skin.*.mskin')]
+
+    # the newest skin bundle or None if none has been built
+    def skin_bundle_path(self):
+        paths = self.skin_bundle_paths()
+        if len(paths) == 0:
+            return None
+        return paths[0]
+
+    # builds a skin bundle with all the PNG files of the folder of the textures and the pages of the texture
+    # atlas if there is one, see bundle.py. Without a path the bundle is written to a new file, a file that is
+    # mapped in memory cannot be replaced on Windows and the textures read from the open bundle keep using it.
+    # The older bundles it replaces are removed, except the open one which is removed by a later build after
+    # open_skin_bundle has closed it. A bundle built to a path replaces only that file
+    def build_skin_bundle(self, path=None):
+        folder = os.path.dirname(self.texture_full_path('skin'))
+        if path is None:
+            path = os.path.join(folder, 'skin.%020d.mskin' % time.time_ns())
+        elif Morph.skin_bundle is not None and os.path.realpath(path) == os.path.realpath(Morph.skin_bundle.path):
+            raise ValueError("the skin bundle is open and cannot be replaced : " + path)
+        full_paths = [os.path.join(folder, file_name) for file_name in sorted(os.listdir(folder))
+                      if file_name.endswith('.png')]
+        atlas_layouts = {}
+        if self.texture_atlas is not None:
+            full_paths += [page['full_path'] for page in self.texture_atlas.pages]
+            atlas_layouts[self.texture_atlas.key] = {'layout': self.texture_atlas.layout,
+                                                     'pages': self.texture_atlas.page_paths}
+        builder = bundle.MSkinBundleBuilder(self.read_texture, self.texture_options())
+        builder.build(path + '.tmp', full_paths, atlas_layouts)
+        os.replace(path + '.tmp', path)
+        if os.path.dirname(path) == folder and fnmatch.fnmatch(os.path.basename(path), 'skin.*.mskin'):
+            self.remove_old_skin_bundles(path)
+        return path
+
+    # removes the bundles older than the bundle at path, except the open one and those Windows does not allow to
+    # remove because something still uses them
+    def remove_old_skin_bundles(self, path):
+        kept_paths = {os.path.realpath(path)}
+        if Morph.skin_bundle is not None:
+            kept_paths.add(os.path.realpath(Morph.skin_bundle.path))
+        for old_path in self.skin_bundle_paths():
+            if os.path.basename(old_path) < os.path.basename(path) and os.path.realpath(old_path) not in kept_paths:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    # maps the skin bundle in memory, by default the newest, and makes all morphs read their textures from it.
+    # The bundle that was open before is closed, no file is removed. Returns the bundle or None if there is
+    # no bundle
+    def open_skin_bundle(self, path=None):
+        if path is None:
+            path = self.skin_bundle_path()
+        if path is None or not os.path.exists(path):
+            return None
+        old_bundle = Morph.skin_bundle
+        Morph.skin_bundle = bundle.MSkinBundle(path)
+        if old_bundle is not None:
+            old_bundle.close()
+        return Morph.skin_bundle
+
+    # region is the Blender region that handles the events, for a queued event it is the copy of the region
+    # taken when the event arrived
+    def process_event(self, event, context, region):
+        self.events_processed += 1
+        bmx = region.x
+        bmy = region.y
         self.window_position = (bmx, bmy)
 
-        self.window_width =  context.region.width
-        self.window_height = context.region.height
+        self.window_width =  region.width
+        self.window_height = region.height
 
         self.mouse_position_absolute = [event.mouse_region_x + self.window_position[0], event.mouse_region_y + self.window_position[1]]
         self.event = event
@@ -644,8 +2105,18 @@ class World(Morph):
 
         self.consumed_event = False
 
-        for morph in self.children:
-            morph.on_event(event, context)
+        if self.profiler is not None:
+            start = self.profiler.start()
+        if self.use_spatial_index:
+            self.dispatch_event(event, context)
+        else:
+            click = event.type in {'LEFTMOUSE', 'RIGHTMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}
+            x, y = self.mouse_position
+            for morph in self.children:
+                if not click or morph.subtree_contains_point(x, y):
+                    morph.on_event(event, context)
+        if self.profiler is not None:
+            self.profiler.stop('events', start)
 
 
 
@@ -664,6 +2135,9 @@ class TextMorph(Morph):
 
 
     def draw(self):
+        profiler = self.world.profiler if self.world is not None else None
+        if profiler is not None:
+            start = profiler.start()
         self.text_lines = self.text.splitlines()
         if (not self.is_hidden):
             bgl.glColor4f(*self.color)
@@ -671,6 +2145,8 @@ class TextMorph(Morph):
             for x in range(0,len(self.text_lines)):
                 blf.position(self.font_id, self.position[0], self.position[1] + (self.size*x*(-1)), 0)
                 blf.draw(self.font_id, self.text_lines[x])
+        if profiler is not None:
+            profiler.stop('text', start)
 
 
 # a ButtonMorph is a morph that responds to an action. This is a default
@@ -685,7 +2161,9 @@ class ButtonMorph(Morph):
         self.handles_events = True
         self.handles_mouse_down = True
 
-        # hover glow mode will make the button semi transparent if the mouse is outside its boundaries
+        # hover glow mode will make the button semi transparent if the mouse is outside its boundaries.
+        # World sends mouse out only when the mouse leaves the button, so the button is fully opaque until
+        # the mouse has been over it once
         self.hover_glow_mode = hover_glow_mode
 
     def on_mouse_in(self):
@@ -717,3 +2195,151 @@ class ButtonMorph(Morph):
 
 
 
+
+
+# a ListMorph shows the items of a data source as rows, from the first item at the top, like the rows of an
+# asset browser. With columns larger than 1 it is a grid that fills each row from the left. Only the rows inside
+# the list plus overscan rows above and below it are morphs, when the list scrolls the rows that leave it go to
+# the row pool and are used again for the items that come in, so the number of morphs depends on the size of the
+# list and not on the number of items. Rows in the pool stay children of the list but are hidden, this way
+# scrolling does not add or remove morphs from the world.
+# data_source: any sequence of items, something with len() and indexing like a list
+# row_factory: an object with the method create_row(list_morph) that returns a new row morph and the method
+# bind_row(row, item, index) that makes a row show an item. A row can show many items over time, bind_row
+# should set everything about the row that depends on the item
+# Call update_rows after the data source changes or the list is resized
+class ListMorph(Morph):
+    instances = []
+    def __init__(self, data_source=(), row_factory=None, row_height=20, columns=1, overscan=2, scroll_step=None,
+                 **kargs):
+        super().__init__(**kargs)
+        self.data_source = data_source
+        self.row_factory = row_factory
+        self.row_height = row_height
+        self.columns = columns
+        self.overscan = overscan
+
+        # how far the list scrolls with each turn of the mouse wheel, by default 3 rows
+        if scroll_step is None:
+            self.scroll_step = row_height * 3
+        else:
+            self.scroll_step = scroll_step
+
+        # how far the list has scrolled from its top, in pixels
+        self.scroll_offset = 0
+
+        # the row morph showing each item index and the rows that show nothing
+        self.rows = {}
+        self.row_pool = []
+
+        # how many rows were ever created and how many times a row was bound to an item
+        self.rows_created = 0
+        self.rows_bound = 0
+
+        self.handles_events = True
+        self.update_rows()
+
+    # the rows in the pool stay hidden when the list is shown
+    @Morph.is_hidden.setter
+    def is_hidden(self, value):
+        Morph.is_hidden.fset(self, value)
+        for row in self.row_pool:
+            row.is_hidden = True
+
+    def row_count(self):
+        return (len(self.data_source) + self.columns - 1) // self.columns
+
+    def max_scroll_offset(self):
+        return max(self.row_count() * self.row_height - self.height, 0)
+
+    def scroll_to(self, offset):
+        offset = min(max(offset, 0), self.max_scroll_offset())
+        if offset != self.scroll_offset:
+            self.scroll_offset = offset
+            self.update_rows()
+
+    def scroll_by(self, distance):
+        self.scroll_to(self.scroll_offset + distance)
+
+    # scrolls as little as needed to show the whole row of the item
+    def scroll_to_index(self, index):
+        top = (index // self.columns) * self.row_height
+        if top < self.scroll_offset:
+            self.scroll_to(top)
+        elif top + self.row_height > self.scroll_offset + self.height:
+            self.scroll_to(top + self.row_height - self.height)
+
+    # the item indices that have a row, the rows inside the list and overscan rows above and below it
+    def visible_indices(self):
+        first_row = max(int(self.scroll_offset // self.row_height) - self.overscan, 0)
+        last_row = min(int((self.scroll_offset + self.height) // self.row_height) + self.overscan,
+                       self.row_count() - 1)
+        return range(first_row * self.columns, min((last_row + 1) * self.columns, len(self.data_source)))
+
+    # the row showing the item with the index, None if the item has no row at the moment
+    def row_for_index(self, index):
+        return self.rows.get(index)
+
+    # the index of the item a row shows, None for a row in the pool
+    def index_of_row(self, row):
+        for index, other in self.rows.items():
+            if other is row:
+                return index
+        return None
+
+    # gives a row to each visible item and places it. Rows of items that are no longer visible go to the pool
+    # first so they can be used for the items that became visible. A row that keeps its item is not bound again
+    # unless rebind is True, for example because the items of the data source changed
+    def update_rows(self, rebind=False):
+        self.scroll_offset = min(max(self.scroll_offset, 0), self.max_scroll_offset())
+        indices = self.visible_indices()
+        for index in [index for index in self.rows if index not in indices]:
+            row = self.rows.pop(index)
+            row.is_hidden = True
+            self.row_pool.append(row)
+        column_width = self.width / self.columns
+        for index in indices:
+            row = self.rows.get(index)
+            if row is None:
+                row = self.take_row()
+                self.rows[index] = row
+                self.bind_row(row, index)
+            elif rebind:
+                self.bind_row(row, index)
+            position = [(index % self.columns) * column_width,
+                        self.height - (index // self.columns + 1) * self.row_height + self.scroll_offset]
+            if row.position != position:
+                row.position = position
+            if row.width != column_width:
+                row.width = column_width
+            if row.height != self.row_height:
+                row.height = self.row_height
+
+    # a row from the pool or a new row from the row factory if the pool is empty
+    def take_row(self):
+        if len(self.row_pool) > 0:
+            row = self.row_pool.pop()
+            row.is_hidden = False
+            return row
+        row = self.row_factory.create_row(self)
+        self.rows_created += 1
+        self.add_morph(row)
+        return row
+
+    def bind_row(self, row, index):
+        self.row_factory.bind_row(row, self.data_source[index], index)
+        self.rows_bound += 1
+
+    # shows another data source from its top
+    def set_data_source(self, data_source):
+        self.data_source = data_source
+        self.scroll_offset = 0
+        self.update_rows(rebind=True)
+
+    def on_mouse_wheel(self, event):
+        if self.mouse_over_morph:
+            if event.type == 'WHEELDOWNMOUSE':
+                self.scroll_by(self.scroll_step)
+            else:
+                self.scroll_by(-self.scroll_step)
+            self.world.consumed_event = True
@@ -0,0 +1,26 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Headless stand-ins for the Blender modules Morpheas uses, bpy, bgl and blf. Outside Blender core and backend
+# import them from here instead, so Morpheas can create worlds, handle events and draw on any machine with
+# Python and NumPy, for tests, benchmarks and profiling. Nothing is drawn on screen, every OpenGL and blf call is
+# recorded in bgl.command_log instead. HeadlessContext and HeadlessEvent take the place of the context and event
+# objects Blender passes to the modal operator that calls World.on_event and World.draw
+
+from . import bgl, blf, bpy
+from .context import HeadlessArea, HeadlessRegion, HeadlessContext, HeadlessEvent
@@ -0,0 +1,212 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# The part of bgl Morpheas uses outside Blender. There is no OpenGL here, each call is added to command_log as a
+# tuple of the name of the function and its arguments, and the calls that give something back give what a
+# working OpenGL would: new names for buffers, textures, shaders and programs, successful compiles and links,
+# the viewport set with glViewport and no errors. Buffer keeps its data in a NumPy array
+
+import numpy
+
+# every call since the last clear_command_log, nothing is recorded while record_commands is False
+command_log = []
+record_commands = True
+
+_next_name = 1
+_viewport = [0, 0, 800, 600]
+
+
+def clear_command_log():
+    del command_log[:]
+
+
+def record(name, *arguments):
+    if record_commands:
+        command_log.append((name,) + arguments)
+
+
+# the counts of the calls in command_log by name of the function
+def command_counts():
+    counts = {}
+    for command in command_log:
+        counts[command[0]] = counts.get(command[0], 0) + 1
+    return counts
+
+
+GL_FALSE = 0
+GL_TRUE = 1
+GL_NO_ERROR = 0
+GL_ZERO = 0
+GL_ONE = 1
+GL_QUADS = 0x0007
+GL_TRIANGLES = 0x0004
+GL_TRIANGLE_FAN = 0x0006
+GL_SRC_ALPHA = 0x0302
+GL_ONE_MINUS_SRC_ALPHA = 0x0303
+GL_BLEND = 0x0BE2
+GL_VIEWPORT = 0x0BA2
+GL_SCISSOR_TEST = 0x0C11
+GL_COLOR_BUFFER_BIT = 0x00004000
+GL_TEXTURE_2D = 0x0DE1
+GL_BYTE = 0x1400
+GL_UNSIGNED_BYTE = 0x1401
+GL_SHORT = 0x1402
+GL_INT = 0x1404
+GL_UNSIGNED_INT = 0x1405
+GL_FLOAT = 0x1406
+GL_DOUBLE = 0x140A
+GL_RGBA = 0x1908
+GL_NEAREST = 0x2600
+GL_LINEAR = 0x2601
+GL_TEXTURE_MAG_FILTER = 0x2800
+GL_TEXTURE_MIN_FILTER = 0x2801
+GL_RGBA8 = 0x8058
+GL_SRGB8_ALPHA8 = 0x8C43
+GL_ARRAY_BUFFER = 0x8892
+GL_ELEMENT_ARRAY_BUFFER = 0x8893
+GL_STATIC_DRAW = 0x88E4
+GL_DYNAMIC_DRAW = 0x88E8
+GL_FRAGMENT_SHADER = 0x8B30
+GL_VERTEX_SHADER = 0x8B31
+GL_COMPILE_STATUS = 0x8B81
+GL_LINK_STATUS = 0x8B82
+GL_TEXTURE_2D_ARRAY = 0x8C1A
+
+_buffer_types = {GL_BYTE: numpy.int8, GL_SHORT: numpy.int16, GL_INT: numpy.int32, GL_FLOAT: numpy.float32,
+                 GL_DOUBLE: numpy.float64}
+
+
+# the same as bgl.Buffer, dimensions is the length of the buffer or a list of lengths for a buffer of more
+# dimensions and template the values it starts with
+class Buffer:
+    def __init__(self, type, dimensions, template=None):
+        if isinstance(dimensions, int):
+            dimensions = [dimensions]
+        self.type = type
+        self.dimensions = list(dimensions)
+        self.array = numpy.zeros(self.dimensions, dtype=_buffer_types[type])
+        if template is not None:
+            self.array[...] = numpy.asarray(template).reshape(self.dimensions)
+
+    def __len__(self):
+        return self.dimensions[0]
+
+    def __getitem__(self, index):
+        value = self.array[index]
+        if isinstance(value, numpy.ndarray):
+            return value.tolist()
+        return value.item()
+
+    def __setitem__(self, index, value):
+        self.array[index] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    def to_list(self):
+        return self.array.tolist()
+
+
+# fills the buffer with new names, the way glGenBuffers, glGenTextures and glGenVertexArrays do
+def _generate_names(name, count, buffer):
+    global _next_name
+    record(name, count)
+    for index in range(count):
+        buffer[index] = _next_name
+        _next_name += 1
+
+
+def _new_name(name, *arguments):
+    global _next_name
+    record(name, *arguments)
+    _next_name += 1
+    return _next_name - 1
+
+
+def glGenBuffers(count, buffer):
+    _generate_names('glGenBuffers', count, buffer)
+
+
+def glGenTextures(count, buffer):
+    _generate_names('glGenTextures', count, buffer)
+
+
+def glGenVertexArrays(count, buffer):
+    _generate_names('glGenVertexArrays', count, buffer)
+
+
+def glCreateShader(type):
+    return _new_name('glCreateShader', type)
+
+
+def glCreateProgram():
+    return _new_name('glCreateProgram')
+
+
+def glGetShaderiv(shader, parameter, buffer):
+    record('glGetShaderiv', shader, parameter)
+    buffer[0] = GL_TRUE
+
+
+def glGetProgramiv(program, parameter, buffer):
+    record('glGetProgramiv', program, parameter)
+    buffer[0] = GL_TRUE
+
+
+def glGetUniformLocation(program, name):
+    record('glGetUniformLocation', program, name)
+    return abs(hash(name)) % 1024
+
+
+def glGetIntegerv(parameter, buffer):
+    record('glGetIntegerv', parameter)
+    if parameter == GL_VIEWPORT:
+        for index in range(4):
+            buffer[index] = _viewport[index]
+
+
+def glViewport(x, y, width, height):
+    record('glViewport', x, y, width, height)
+    _viewport[:] = [x, y, width, height]
+
+
+def glGetError():
+    return GL_NO_ERROR
+
+
+def _recorded(name):
+    def call(*arguments):
+        record(name, *arguments)
+    call.__name__ = name
+    return call
+
+
+# the calls that only change the state of OpenGL or draw
+for _name in ['glAttachShader', 'glBegin', 'glBindBuffer', 'glBindTexture', 'glBindVertexArray', 'glBlendFunc',
+              'glBufferData', 'glBufferSubData', 'glClear', 'glClearColor', 'glColor4f', 'glCompileShader',
+              'glDeleteBuffers', 'glDeleteShader',
+              'glDeleteTextures', 'glDeleteVertexArrays', 'glDisable', 'glDrawArrays', 'glDrawArraysInstanced',
+              'glDrawElements', 'glEnable', 'glEnableVertexAttribArray', 'glEnd', 'glGetProgramInfoLog',
+              'glGetShaderInfoLog', 'glLinkProgram', 'glScissor', 'glShaderSource', 'glTexCoord2f', 'glTexImage2D',
+              'glTexImage3D', 'glTexParameteri', 'glTexSubImage3D', 'glUniform1i', 'glUniform2f', 'glUseProgram',
+              'glVertex2f', 'glVertexAttribDivisor', 'glVertexAttribPointer']:
+    globals()[_name] = _recorded(_name)
+
+__all__ = ['Buffer'] + [name for name in list(globals()) if name.startswith('gl') or name.startswith('GL_')]
@@ -0,0 +1,51 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# the part of blf Morpheas uses outside Blender. Text is not drawn, the calls are recorded in bgl.command_log.
+# dimensions guesses the size of text, each character is 0.6 of the font size wide and a line is as high as
+# the font size
+
+from . import bgl
+
+# the size and position of each font by font id
+_sizes = {}
+_positions = {}
+
+
+def size(font_id, size, dpi=72):
+    bgl.record('blf.size', font_id, size, dpi)
+    _sizes[font_id] = size * dpi / 72
+
+
+def position(font_id, x, y, z):
+    bgl.record('blf.position', font_id, x, y, z)
+    _positions[font_id] = (x, y, z)
+
+
+def draw(font_id, text):
+    bgl.record('blf.draw', font_id, text)
+
+
+def dimensions(font_id, text):
+    font_size = _sizes.get(font_id, 11)
+    return (len(text) * font_size * 0.6, font_size)
+
+
+def load(path):
+    bgl.record('blf.load', path)
+    return len(_sizes) + 1
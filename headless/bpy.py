@@ -0,0 +1,37 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# the part of bpy Morpheas uses outside Blender
+
+import os
+
+
+# bpy.path, paths starting with // are relative to the blend file in Blender, here the // is simply removed
+class HeadlessPath:
+    def basename(self, path):
+        if path.startswith('//'):
+            path = path[2:]
+        return os.path.basename(path)
+
+    def abspath(self, path):
+        if path.startswith('//'):
+            path = path[2:]
+        return os.path.abspath(path)
+
+
+path = HeadlessPath()
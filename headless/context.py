@@ -0,0 +1,62 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# the context and event objects Blender gives to a modal operator, with only what Morpheas uses
+
+from . import bgl
+
+
+class HeadlessArea:
+    def __init__(self, type='VIEW_3D'):
+        self.type = type
+
+
+class HeadlessRegion:
+    def __init__(self, x=0, y=0, width=800, height=600, type='WINDOW'):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.type = type
+
+
+# the context of a region of the given size, it also makes the viewport of bgl the region so World.draw
+# draws to all of it
+class HeadlessContext:
+    def __init__(self, width=800, height=600, x=0, y=0, area_type='VIEW_3D'):
+        self.area = HeadlessArea(area_type)
+        self.region = HeadlessRegion(x, y, width, height)
+        bgl.glViewport(x, y, width, height)
+
+
+# an event with the mouse at x, y in the coordinates of the region of the context
+class HeadlessEvent:
+    def __init__(self, type='MOUSEMOVE', value='NOTHING', x=0, y=0, context=None, shift=False, ctrl=False,
+                 alt=False):
+        self.type = type
+        self.value = value
+        self.mouse_region_x = x
+        self.mouse_region_y = y
+        self.mouse_x = x
+        self.mouse_y = y
+        if context is not None:
+            self.mouse_x = x + context.region.x
+            self.mouse_y = y + context.region.y
+        self.shift = shift
+        self.ctrl = ctrl
+        self.alt = alt
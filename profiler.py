@@ -0,0 +1,141 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# The frame profiler times what a World does during each frame, handling events, bringing the vertices up to date,
+# sending the draw calls to OpenGL and drawing text. It counts for each morph the events it handled and the redraws
+# it caused, and for each frame how many events and redraws there were. It keeps the last frame_count frames, older
+# frames are dropped. A frame ends each time the World draws and holds everything that happened since the previous
+# frame ended, so the events handled between two draws belong to the frame of the second. Profiling is off unless
+# World.enable_profiling is called, see World.profiler
+
+import json, time, weakref
+from .. import pylivecoding
+
+
+class MFrameProfiler(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, frame_count=120):
+        super().__init__()
+        self.frame_count = frame_count
+
+        # times are in seconds since the profiler was created
+        self.origin = time.perf_counter()
+
+        # the last frames, frames[next_index] is the oldest once the ring is full
+        self.frames = []
+        self.next_index = 0
+        self.frame_number = 0
+        self.current_frame = self.new_frame(0.0)
+
+        # [events handled, redraws caused] by morph, a morph that is no longer used drops out
+        self.morph_counters = weakref.WeakKeyDictionary()
+
+    def new_frame(self, start):
+        return {'number': self.frame_number, 'start': start, 'duration': 0.0, 'sections': {}, 'counts': {},
+                'spans': [], 'events': 0, 'redraws': 0}
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    # starts timing a section, give what it returns to stop
+    def start(self):
+        return self.now()
+
+    # adds the time since start to the section of the current frame
+    def stop(self, section, start):
+        duration = time.perf_counter() - self.origin - start
+        frame = self.current_frame
+        frame['sections'][section] = frame['sections'].get(section, 0.0) + duration
+        frame['counts'][section] = frame['counts'].get(section, 0) + 1
+        frame['spans'].append((section, start, duration))
+        return duration
+
+    def count_event(self, morph):
+        self.morph_counters.setdefault(morph, [0, 0])[0] += 1
+        self.current_frame['events'] += 1
+
+    def count_redraw(self, morph):
+        self.morph_counters.setdefault(morph, [0, 0])[1] += 1
+        self.current_frame['redraws'] += 1
+
+    # ends the current frame, puts it in the ring of frames and starts the next one
+    def end_frame(self):
+        end = self.now()
+        frame = self.current_frame
+        frame['duration'] = end - frame['start']
+        if len(self.frames) < self.frame_count:
+            self.frames.append(frame)
+        else:
+            self.frames[self.next_index] = frame
+        self.next_index = (self.next_index + 1) % self.frame_count
+        self.frame_number += 1
+        self.current_frame = self.new_frame(end)
+        return frame
+
+    # the frames kept, oldest first, or only the last count of them
+    def last_frames(self, count=None):
+        frames = self.frames[self.next_index:] + self.frames[:self.next_index]
+        if count is not None:
+            frames = frames[max(len(frames) - count, 0):]
+        return frames
+
+    # the mean and the longest time of each section per frame and of the frames themselves over the kept frames
+    def summary(self):
+        frames = self.last_frames()
+        summary = {'frames': len(frames), 'sections': {}}
+        if len(frames) == 0:
+            return summary
+        durations = [frame['duration'] for frame in frames]
+        summary['frame_mean'] = sum(durations) / len(frames)
+        summary['frame_max'] = max(durations)
+        sections = set()
+        for frame in frames:
+            sections.update(frame['sections'])
+        for section in sorted(sections):
+            times = [frame['sections'].get(section, 0.0) for frame in frames]
+            summary['sections'][section] = {'mean': sum(times) / len(frames), 'max': max(times)}
+        return summary
+
+    # the counters of the morphs, busiest first
+    def morph_statistics(self):
+        statistics = [{'morph': morph, 'name': morph.name, 'events': counters[0], 'redraws': counters[1]}
+                      for morph, counters in self.morph_counters.items()]
+        return sorted(statistics, key=lambda entry: entry['events'] + entry['redraws'], reverse=True)
+
+    def reset(self):
+        self.frames = []
+        self.next_index = 0
+        self.current_frame = self.new_frame(self.now())
+        self.morph_counters = weakref.WeakKeyDictionary()
+
+    # the kept frames in the trace event format of Chrome, which chrome://tracing and Perfetto can open. Each
+    # frame and each timed section is a complete event with its start and duration in microseconds
+    def chrome_trace(self):
+        trace_events = []
+        for frame in self.last_frames():
+            trace_events.append({'name': 'frame %d' % frame['number'], 'cat': 'frame', 'ph': 'X', 'pid': 1,
+                                 'tid': 1, 'ts': frame['start'] * 1e6, 'dur': frame['duration'] * 1e6})
+            for section, start, duration in frame['spans']:
+                trace_events.append({'name': section, 'cat': 'morpheas', 'ph': 'X', 'pid': 1, 'tid': 1,
+                                     'ts': start * 1e6, 'dur': duration * 1e6})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+        return path
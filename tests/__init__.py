@@ -1,5 +1,6 @@
-from . import test_backend, test_core
+from . import test_backend, test_core, test_headless
 def run(loger):
     test_backend.run(loger)
     test_core.run(loger)
+    test_headless.run(loger)
     return
@@ -0,0 +1,233 @@
+# The benchmarks of Morpheas. They build synthetic worlds of a given number of morphs, depth and fan out and time
+# event handling, vertex generation and texture loading and measure the memory each morph takes. The results
+# are a dictionary that can be saved as JSON, so the results of two versions can be compared by a script.
+# The benchmarks do not draw, outside Blender they use the headless stand-ins of the Blender modules.
+# To run them outside Blender from the folder that holds the addon:
+#     python -m <addon>.morpheas.tests.benchmark --morphs 1000 --depth 4 --fan-out 6 --output results.json
+
+import json, os, platform, random, sys, tempfile, time, tracemalloc
+import numpy
+from .. import core, textures
+from ..headless import HeadlessContext, HeadlessEvent
+
+def run(logger, output_path=None, **parameters):
+    benchmark = MorpheasBenchmark(**parameters)
+    results = benchmark.run()
+    logger.info(json.dumps(results, indent=2))
+    if output_path is not None:
+        benchmark.save(output_path)
+    return results
+
+# a morph that loads its textures from the folder of the benchmark through its own texture cache
+class BenchmarkMorph(core.Morph):
+    instances = []
+    texture_folder = None
+    texture_cache = None
+
+    def texture_full_path(self, name):
+        return os.path.join(self.texture_folder, name + '.png')
+
+class MorpheasBenchmark():
+    instances = []
+
+    # changes whenever the results change their meaning, results of different versions should not be compared
+    format_version = 3
+
+    def __init__(self, morphs=1000, depth=4, fan_out=6, events=2000, repeats=3, textures=20, texture_size=64,
+                 seed=0):
+        self.__class__.instances.append(self)
+        self.parameters = {'morphs': morphs, 'depth': depth, 'fan_out': fan_out, 'events': events,
+                           'repeats': repeats, 'textures': textures, 'texture_size': texture_size, 'seed': seed}
+        self.results = {}
+
+    def run(self):
+        self.results = {'format_version': self.format_version,
+                        'python': platform.python_version(), 'numpy': numpy.__version__,
+                        'platform': platform.platform(), 'parameters': self.parameters}
+        self.results['memory_per_morph'] = self.measure_memory()
+        self.results['morphs_built'] = len(self.build_world().all_morphs()) - 1
+        self.results['mouse_move'] = self.time_events(self.mouse_moves)
+        self.results['click'] = self.time_events(self.clicks)
+        self.results['drag'] = self.time_events(self.drags)
+        self.results['drag']['morphs_moved'] = self.moved_morphs(self.world)
+        assert self.results['drag']['morphs_moved'] > 0, "the drags did not move any morph"
+        self.results['display_list_compile'] = self.time_call(
+            lambda world: world.mOpenGLCanvas.display_list.compile())
+        self.results['generate_vertices_list'] = self.time_call(
+            lambda world: world.mOpenGLCanvas.generate_vertices_list(),
+            lambda world: world.mOpenGLCanvas.display_list.compile())
+        self.results['load_texture'] = self.time_texture_loading()
+        return self.results
+
+    def save(self, path):
+        with open(path, 'w') as results_file:
+            json.dump(self.results, results_file, indent=2, sort_keys=True)
+        return path
+
+    # a world with the morphs of the parameters. Each morph has fan_out children until depth is reached, the
+    # world counting as depth 0, and no morphs are added after morphs are reached. Children are laid out in a
+    # grid inside their parent, so each point of the world is over a whole branch of morphs. The morphs handle
+    # mouse down so that a press and mouse moves drag them
+    def build_world(self, morph_class=core.Morph):
+        morph_count = self.parameters['morphs']
+        fan_out = self.parameters['fan_out']
+        columns = int(numpy.ceil(numpy.sqrt(fan_out)))
+        rows = int(numpy.ceil(fan_out / columns))
+        world = core.World()
+        world.auto_hide = False
+        built = 0
+        parents = [(world, 0)]
+        while len(parents) > 0 and built < morph_count:
+            parent, parent_depth = parents.pop(0)
+            if parent_depth >= self.parameters['depth']:
+                continue
+            width = parent.width / columns
+            height = parent.height / rows
+            for index in range(fan_out):
+                if built >= morph_count:
+                    break
+                morph = morph_class(position=[(index % columns) * width, (index // columns) * height],
+                                    width=max(width * 0.9, 1), height=max(height * 0.9, 1))
+                morph.handles_events = True
+                morph.handles_mouse_down = True
+                parent.add_morph(morph)
+                parents.append((morph, parent_depth + 1))
+                built += 1
+        world.draw_area_width = world.width
+        world.draw_area_height = world.height
+        return world
+
+    # the memory the morphs of a world take divided by their number, counted with tracemalloc. The world itself
+    # is counted too, it is shared by all the morphs
+    def measure_memory(self):
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        world = self.build_world()
+        after = tracemalloc.get_traced_memory()[0]
+        if not was_tracing:
+            tracemalloc.stop()
+        morph_count = max(len(world.all_morphs()) - 1, 1)
+        return {'bytes_per_morph': (after - before) / morph_count, 'morphs': morph_count}
+
+    # the world learns where the mouse is when it draws, the benchmarks do not draw so they tell it themselves
+    def send(self, type, value, x, y):
+        self.world.mouse_position = [x, y]
+        self.world.on_event(HeadlessEvent(type, value, x, y, self.context), self.context)
+
+    def random_point(self, generator):
+        return generator.uniform(0, self.world.width), generator.uniform(0, self.world.height)
+
+    def mouse_moves(self, generator, count):
+        for index in range(count):
+            self.send('MOUSEMOVE', 'NOTHING', *self.random_point(generator))
+        return count
+
+    def clicks(self, generator, count):
+        for index in range(count // 2):
+            x, y = self.random_point(generator)
+            self.send('LEFTMOUSE', 'PRESS', x, y)
+            self.send('LEFTMOUSE', 'RELEASE', x, y)
+        return count // 2 * 2
+
+    # each drag is a press, 8 mouse moves and a release
+    def drags(self, generator, count):
+        sent = 0
+        while sent + 10 <= count:
+            x, y = self.random_point(generator)
+            self.send('LEFTMOUSE', 'PRESS', x, y)
+            for step in range(8):
+                x, y = x + 2, y + 1
+                self.send('MOUSEMOVE', 'NOTHING', x, y)
+            self.send('LEFTMOUSE', 'RELEASE', x, y)
+            sent += 10
+        return sent
+
+    # how many morphs of the world are not where they are in a world built again, build_world always builds the
+    # morphs in the same order at the same positions
+    def moved_morphs(self, world):
+        built_morphs = self.build_world().all_morphs()
+        return sum(morph.position != built_morph.position
+                   for morph, built_morph in zip(world.all_morphs(), built_morphs))
+
+    # times World.on_event for the events the sender sends, the same random events in each repeat. Events can
+    # change the world, drags move morphs, so each repeat starts from a world built again
+    def time_events(self, sender):
+        timings = []
+        sent = 0
+        for repeat in range(self.parameters['repeats']):
+            self.world = self.build_world()
+            self.context = HeadlessContext(int(self.world.width), int(self.world.height))
+            generator = random.Random(self.parameters['seed'])
+            start = time.perf_counter()
+            sent = sender(generator, self.parameters['events'])
+            timings.append(time.perf_counter() - start)
+        return self.summary(timings, sent, 'events_per_second')
+
+    # times the call with a world built again for each repeat, prepare brings the world to the state the call
+    # starts from and is not timed
+    def time_call(self, call, prepare=None):
+        timings = []
+        for repeat in range(self.parameters['repeats']):
+            world = self.build_world()
+            if prepare is not None:
+                prepare(world)
+            start = time.perf_counter()
+            call(world)
+            timings.append(time.perf_counter() - start)
+        return self.summary(timings, 1, 'calls_per_second')
+
+    # the time load_texture takes for a PNG file that is not in the texture cache and for one that is
+    def time_texture_loading(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_benchmark_')
+        size = self.parameters['texture_size']
+        generator = numpy.random.RandomState(self.parameters['seed'])
+        names = []
+        for index in range(self.parameters['textures']):
+            pixels = generator.randint(0, 256, (size, size, 4)).astype(numpy.uint8)
+            names.append('texture_%d' % index)
+            core.Image.fromarray(pixels, 'RGBA').save(os.path.join(folder, names[-1] + '.png'))
+        BenchmarkMorph.texture_folder = folder
+        BenchmarkMorph.texture_cache = textures.MTextureCache()
+        morph = BenchmarkMorph()
+        cold = []
+        warm = []
+        for name in names:
+            start = time.perf_counter()
+            morph.load_texture(name)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            morph.load_texture(name)
+            warm.append(time.perf_counter() - start)
+        morph.release_textures()
+        for name in names:
+            os.remove(os.path.join(folder, name + '.png'))
+        os.rmdir(folder)
+        return {'cold': self.summary(cold, 1, 'loads_per_second'),
+                'warm': self.summary(warm, 1, 'loads_per_second'),
+                'cache': BenchmarkMorph.texture_cache.stats()}
+
+    # the best and mean time of the timings and how many of count per second the best time means
+    def summary(self, timings, count, rate_name):
+        best = min(timings)
+        return {'best_seconds': best, 'mean_seconds': sum(timings) / len(timings), 'count': count,
+                rate_name: count / best if best > 0 else None}
+
+if __name__ == "__main__":
+    import argparse, logging
+    parser = argparse.ArgumentParser(description="Runs the benchmarks of Morpheas and saves the results as JSON")
+    parser.add_argument('--morphs', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fan-out', type=int, default=6)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--textures', type=int, default=20)
+    parser.add_argument('--texture-size', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    run(logging.getLogger('morpheas.benchmark'), arguments.output, morphs=arguments.morphs, depth=arguments.depth,
+        fan_out=arguments.fan_out, events=arguments.events, repeats=arguments.repeats, textures=arguments.textures,
+        texture_size=arguments.texture_size, seed=arguments.seed)
@@ -1,8 +1,12 @@
+import numpy
 from .. import backend,core
+from ..headless import HeadlessContext, HeadlessEvent, bgl
 
 def run(logger):
-    moglcanvas = TestMOpenGLCanvas.__init__(logger)
+    moglcanvas = TestMOpenGLCanvas(logger)
     moglcanvas.run()
+    software_canvas = TestMSoftwareCanvas(logger)
+    software_canvas.run()
 
 class TestMOpenGLCanvas():
     instances=[]
@@ -13,6 +17,224 @@ class TestMOpenGLCanvas():
         self.canvas = backend.MOpenGLCanvas(self.world)
         self.log = logger
 
+    # the tests draw with the headless bgl and count the OpenGL calls, inside Blender they are skipped
     def run(self):
-        return
+        if core.bgl is not bgl:
+            self.log.info("TestMOpenGLCanvas skipped, it runs only outside Blender")
+            return
+        for test in [self.test_texture_array, self.test_vertices, self.test_vertex_buffer,
+                     self.test_batches, self.test_nine_slice]:
+            self.context = HeadlessContext(64, 64)
+            self.world = core.World()
+            # the world draws only after it learned where the mouse is
+            self.world.on_event(HeadlessEvent('MOUSEMOVE', 'NOTHING', 60, 60, self.context), self.context)
+            self.world.draw(self.context)
+            self.canvas = self.world.mOpenGLCanvas
+            test()
+            self.log.info("TestMOpenGLCanvas " + test.__name__ + " passed")
 
+    # draws the world and returns how many times each OpenGL function was called
+    def draw(self):
+        bgl.clear_command_log()
+        self.world.draw(self.context)
+        return bgl.command_counts()
+
+    # a texture of one color as load_texture makes it
+    def texture(self, width, height):
+        pixels = numpy.full((height, width * 4), 255, dtype=numpy.uint8)
+        return {'dimensions': [width, height], 'full_path': None, 'data': None, 'pixels': pixels,
+                'data_type': bgl.GL_UNSIGNED_BYTE, 'is_loaded': True, 'is_gl_initialised': False, 'texture_id': 0}
+
+    def add_textured_morph(self, texture, x=0):
+        morph = core.Morph(position=[x, 0], width=8, height=8)
+        morph.active_texture = texture
+        self.world.add_morph(morph)
+        return morph
+
+    # the array texture is made once and each new texture is uploaded to its own layer, compiling the display
+    # list again uploads nothing unless a texture is no longer used. Textures too big for an array texture are
+    # drawn without instanced rendering
+    def test_texture_array(self):
+        self.canvas.instanced_rendering = True
+        first_texture = self.texture(4, 4)
+        self.add_textured_morph(first_texture)
+        self.add_textured_morph(first_texture, 8)
+        self.add_textured_morph(self.texture(8, 8), 16)
+        counts = self.draw()
+        assert counts.get('glTexImage3D') == 1 and counts.get('glTexSubImage3D') == 2, str(counts)
+        added = self.add_textured_morph(self.texture(8, 4), 24)
+        counts = self.draw()
+        assert 'glTexImage3D' not in counts and counts.get('glTexSubImage3D') == 1, str(counts)
+        self.world.add_morph(core.Morph(position=[32, 0], width=8, height=8))
+        counts = self.draw()
+        assert 'glTexImage3D' not in counts and 'glTexSubImage3D' not in counts, str(counts)
+        self.world.remove_morph(added)
+        counts = self.draw()
+        assert counts.get('glTexImage3D') == 1 and len(self.canvas.display_list.textures) == 2, str(counts)
+        assert counts.get('glDrawArraysInstanced') == 1
+        self.canvas.TEXTURE_ARRAY_MAX_SIZE = 16
+        self.add_textured_morph(self.texture(32, 32), 40)
+        counts = self.draw()
+        assert not self.canvas.instanced_rendering, "a texture too big for the array texture was put in it"
+        assert 'glDrawArraysInstanced' not in counts and counts.get('glDrawElements', 0) >= 1, str(counts)
+
+    # each morph is a rectangle of 4 vertices in OpenGL coordinates, a child is cut by its parent together with its
+    # texture coordinates and a hidden morph keeps its vertices but without any area
+    def test_vertices(self):
+        parent = core.Morph(position=[0, 0], width=32, height=32, color=[0.0, 0.0, 1.0, 1.0])
+        child = core.Morph(position=[16, 16], width=32, height=32, color=[1.0, 0.0, 0.0, 0.5])
+        child.active_texture = self.texture(2, 2)
+        parent.add_morph(child)
+        self.world.add_morph(parent)
+        self.draw()
+        vertices = self.canvas.vertex_data.reshape(-1, 4, backend.MOpenGLCanvas.VERTEX_SIZE)
+        slots = self.canvas.display_list.slots
+        assert vertices[slots[parent], :, 0:2].tolist() == [[-1, -1], [0, -1], [0, 0], [-1, 0]]
+        assert vertices[slots[child], :, 0:2].tolist() == [[-0.5, -0.5], [0, -0.5], [0, 0], [-0.5, 0]], \
+            "the child was not clipped by its parent"
+        assert vertices[slots[child], :, 6:8].tolist() == [[0, 1], [0.5, 1], [0.5, 0.5], [0, 0.5]]
+        assert vertices[slots[child], 0, 2:6].tolist() == [1.0, 0.0, 0.0, 0.5]
+        child.is_hidden = True
+        self.draw()
+        corners = self.canvas.vertex_data.reshape(-1, 4, backend.MOpenGLCanvas.VERTEX_SIZE)[slots[child], :, 0:2]
+        assert (corners == corners[0]).all(), "a hidden morph has an area"
+
+    # the vertex buffer grows by doubling and a morph that changed uploads only the vertices of its own slot
+    def test_vertex_buffer(self):
+        self.canvas.instanced_rendering = False
+        morphs = [core.Morph(position=[index % 8 * 4, index // 8 * 4], width=4, height=4) for index in range(70)]
+        for morph in morphs[:40]:
+            self.world.add_morph(morph)
+        self.draw()
+        reallocations = self.canvas.buffer_reallocations
+        assert self.canvas.vertex_buffer_capacity == 64
+        for morph in morphs[40:]:
+            self.world.add_morph(morph)
+        counts = self.draw()
+        assert self.canvas.vertex_buffer_capacity == 128 and self.canvas.buffer_reallocations == reallocations + 1
+        assert counts.get('glBufferSubData') == 1, "the vertices were not uploaded at once " + str(counts)
+        morphs[5].color = [1.0, 0.0, 0.0, 1.0]
+        self.draw()
+        uploads = [command for command in bgl.command_log if command[0] == 'glBufferSubData']
+        slot_bytes = 4 * backend.MOpenGLCanvas.VERTEX_SIZE * 4
+        slot = self.canvas.display_list.slots[morphs[5]]
+        assert [upload[2:4] for upload in uploads] == [(slot * slot_bytes, slot_bytes)], str(uploads)
+
+    # morphs one after the other with the same texture are drawn with one call and the state cache keeps the
+    # calls that would set what OpenGL already has from reaching it
+    def test_batches(self):
+        self.canvas.instanced_rendering = False
+        self.canvas.partial_redraw = False
+        first_texture = self.texture(4, 4)
+        self.add_textured_morph(first_texture)
+        self.add_textured_morph(first_texture, 8)
+        self.add_textured_morph(self.texture(4, 4), 16)
+        counts = self.draw()
+        assert [batch[2] for batch in self.canvas.draw_batches()] == [0, 1]
+        assert counts.get('glDrawElements') == 2, str(counts)
+        assert counts.get('glUseProgram') == 1 and counts.get('glBlendFunc') == 1, str(counts)
+        stats = self.canvas.frame_stats
+        assert stats['draw_calls'] == 2 and stats['texture_binds'] == 2 and stats['redundant_changes'] > 0
+
+    # a nine slice morph takes 9 rows, its corners keep their size and the rest stretches
+    def test_nine_slice(self):
+        morph = core.Morph(position=[0, 0], width=40, height=20)
+        morph.textures['panel'] = self.texture(8, 8)
+        morph.set_nine_slice('panel', [2, 2, 2, 2])
+        morph.activate_texture('panel')
+        assert [morph.width, morph.height] == [40, 20], "a nine slice morph took the size of its texture"
+        self.world.add_morph(morph)
+        self.draw()
+        display_list = self.canvas.display_list
+        slot = display_list.slots[morph]
+        assert display_list.row_counts[morph] == 9
+        pieces = display_list.commands[slot:slot + 9]
+        rectangles = pieces[:, display_list.X1:display_list.Y2 + 1].tolist()
+        assert rectangles[0] == [0, 0, 2, 2] and rectangles[4] == [2, 2, 38, 18] and rectangles[8] == [38, 18, 40, 20]
+        assert pieces[0, display_list.U1:display_list.V2 + 1].tolist() == [0, 0.75, 0.25, 1]
+
+# draws small worlds with the software canvas and checks the colors of the pixels
+class TestMSoftwareCanvas():
+    instances=[]
+
+    def __init__(self,logger):
+        self.__class__.instances.append(self)
+        self.log = logger
+
+    def run(self):
+        for test in [self.test_blending, self.test_clipping, self.test_culling,
+                     self.test_patching, self.test_damage]:
+            self.world = core.World()
+            self.canvas = backend.MSoftwareCanvas(self.world, 8, 8)
+            test()
+            self.log.info("TestMSoftwareCanvas " + test.__name__ + " passed")
+
+    # the pixel at x, y counting from the bottom left, as 8 bit RGBA
+    def pixel(self, x, y):
+        return self.canvas.image()[7 - y, x].tolist()
+
+    def test_blending(self):
+        self.world.add_morph(core.Morph(position=[0, 0], width=8, height=8, color=[0.0, 0.0, 1.0, 1.0]))
+        self.world.add_morph(core.Morph(position=[2, 2], width=4, height=4, color=[1.0, 0.0, 0.0, 0.5]))
+        self.canvas.draw()
+        assert self.pixel(0, 0) == [0, 0, 255, 255], "wrong background " + str(self.pixel(0, 0))
+        assert self.pixel(3, 3) == [128, 0, 128, 255], "wrong blending " + str(self.pixel(3, 3))
+
+    def test_clipping(self):
+        parent = core.Morph(position=[0, 0], width=4, height=4, color=[0.0, 0.0, 1.0, 1.0])
+        parent.add_morph(core.Morph(position=[2, 2], width=4, height=4, color=[1.0, 0.0, 0.0, 1.0]))
+        self.world.add_morph(parent)
+        self.canvas.draw()
+        assert self.pixel(3, 3) == [255, 0, 0, 255], "the child was not drawn"
+        assert self.pixel(5, 5) == [0, 0, 0, 0], "the child was not clipped by its parent"
+        assert self.canvas.frame_stats['quads'] == 2
+
+    # morphs outside the canvas or outside their parent are left out of the display list until they come into view
+    def test_culling(self):
+        scrolled = core.Morph(position=[0, 0], width=8, height=80, color=[0.0, 0.0, 0.0, 0.0])
+        for row in range(10):
+            scrolled.add_morph(core.Morph(position=[0, row * 8], width=8, height=8, color=[0.0, row / 9, 0.0, 1.0]))
+        self.world.add_morph(scrolled)
+        self.canvas.draw()
+        assert self.canvas.display_list.stats()['morphs'] == 2, "the rows outside the canvas were not culled"
+        scrolled.position = [0, -72]
+        self.canvas.draw()
+        assert self.canvas.display_list.stats()['morphs'] == 2, "the rows outside the canvas were not culled"
+        assert self.pixel(0, 0) == [0, 255, 0, 255], "the last row did not come into view " + str(self.pixel(0, 0))
+        last_row = scrolled.children[9]
+        last_row.width = 4
+        clipped = core.Morph(position=[5, 0], width=4, height=4)
+        last_row.add_morph(clipped)
+        self.canvas.draw()
+        assert clipped not in self.canvas.display_list.slots, "a child outside its parent was not culled"
+
+    # a morph that changed together with its parent is patched once, after its parent
+    def test_patching(self):
+        parent = core.Morph(position=[0, 0], width=4, height=4, color=[0.0, 0.0, 1.0, 1.0])
+        child = core.Morph(position=[1, 1], width=2, height=2, color=[1.0, 0.0, 0.0, 1.0])
+        parent.add_morph(child)
+        self.world.add_morph(parent)
+        self.canvas.draw()
+        patches = self.canvas.display_list.stats()['patches']
+        child.position = [2, 2]
+        parent.position = [4, 4]
+        self.canvas.draw()
+        assert self.canvas.display_list.stats()['patches'] == patches + 2, "a morph was patched more than once"
+        assert self.pixel(6, 6) == [255, 0, 0, 255], "the child was not moved with its parent"
+
+    # the canvas takes its own damage and leaves the damage of the world to mOpenGLCanvas, and it forgets the
+    # pixels of the textures the display list no longer has
+    def test_damage(self):
+        morph = core.Morph(position=[0, 0], width=4, height=4, color=[0.0, 0.0, 1.0, 1.0])
+        morph.active_texture = {'dimensions': [1, 1], 'pixels': numpy.full((1, 4), 255, dtype=numpy.uint8)}
+        self.world.add_morph(morph)
+        self.canvas.draw()
+        self.world.collect_damage()
+        morph.color = [1.0, 0.0, 0.0, 1.0]
+        self.canvas.draw()
+        assert self.pixel(1, 1) == [255, 0, 0, 255], "the changed morph was not drawn again"
+        assert morph in self.world.damaged_morphs, "the canvas took the damage of the world"
+        assert len(self.canvas.texture_images) == 1
+        self.world.remove_morph(morph)
+        self.canvas.draw()
+        assert self.canvas.texture_images == {}, "the pixels of a texture no longer drawn were kept"
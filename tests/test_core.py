@@ -1,7 +1,457 @@
+import os, shutil, tempfile, threading, tracemalloc
+import numpy
+from .. import core, textures
+from ..headless import HeadlessContext, HeadlessEvent, bgl
 
 def run(logger):
-    return
+    test_world = TestWorld(logger)
+    test_world.run()
 
+# drives a World with events and draws the way Blender would, using the headless stand-ins of the Blender
+# modules. Inside Blender the tests are skipped because they would draw outside of a draw callback
+class TestWorld():
+    instances=[]
 
+    def __init__(self,logger):
+        self.__class__.instances.append(self)
+        self.log = logger
 
+    def run(self):
+        if core.bgl is not bgl:
+            self.log.info("TestWorld skipped, it runs only outside Blender")
+            return
+        for test in [self.test_click, self.test_mouse_in_and_out, self.test_hover_glow, self.test_draw,
+                     self.test_profiling, self.test_list, self.test_drag, self.test_compact_storage,
+                     self.test_names, self.test_skin_bundle, self.test_asynchronous_loading,
+                     self.test_texture_atlas, self.test_event_routing, self.test_event_batching,
+                     self.test_damage, self.test_texture_cache, self.test_texture_pixels,
+                     self.test_alpha_mask]:
+            self.set_up()
+            test()
+            self.log.info("TestWorld " + test.__name__ + " passed")
 
+    def set_up(self):
+        self.context = HeadlessContext(400, 300)
+        self.world = core.World()
+        self.button = core.ButtonMorph(position=[10, 10], width=50, height=50)
+        self.world.add_morph(self.button)
+        self.world.draw(self.context)
+
+    # the world learns where the mouse is when it draws, like in Blender where a redraw follows each event.
+    # With auto_hide the world draws only while the mouse is inside the region
+    def send(self, type, value, x, y):
+        self.world.on_event(HeadlessEvent(type, value, x, y, self.context), self.context)
+        self.world.draw(self.context)
+
+    def test_click(self):
+        clicks = []
+        self.button.on_left_click = lambda: clicks.append(self.world.mouse_position)
+        self.send('MOUSEMOVE', 'NOTHING', 100, 100)
+        self.send('LEFTMOUSE', 'PRESS', 100, 100)
+        assert clicks == [], "a click outside the button reached it"
+        self.send('MOUSEMOVE', 'NOTHING', 20, 20)
+        self.send('LEFTMOUSE', 'PRESS', 20, 20)
+        assert clicks == [[20, 20]], "a click on the button did not reach it"
+        assert self.world.consumed_event, "a click on the button was not consumed"
+
+    def test_mouse_in_and_out(self):
+        changes = []
+        self.button.on_mouse_in = lambda: changes.append('in')
+        self.button.on_mouse_out = lambda: changes.append('out')
+        for x in [100, 20, 30, 100, 120]:
+            self.send('MOUSEMOVE', 'NOTHING', x, 20)
+        assert changes == ['in', 'in', 'out'], "unexpected mouse in and out " + str(changes)
+
+    # a button is opaque until the mouse leaves it, mouse moves away from it do not reach it. Each position is
+    # sent twice because the world handles a mouse move where the mouse was at the previous draw
+    def test_hover_glow(self):
+        alphas = []
+        for x in [100, 120, 20, 100, 20]:
+            self.send('MOUSEMOVE', 'NOTHING', x, 20)
+            self.send('MOUSEMOVE', 'NOTHING', x, 20)
+            alphas.append(self.button.color[3])
+        assert alphas == [1.0, 1.0, 1.0, 0.8, 1.0], "unexpected alpha of the button " + str(alphas)
+
+    def test_draw(self):
+        self.button.add_morph(core.Morph(position=[5, 5], width=10, height=10))
+        bgl.clear_command_log()
+        self.send('MOUSEMOVE', 'NOTHING', 200, 200)
+        canvas = self.world.mOpenGLCanvas
+        assert canvas.display_list.stats()['commands'] == 2, "the display list does not have both morphs"
+        assert bgl.command_counts().get('glDrawElements', 0) == canvas.frame_stats['draw_calls']
+        assert canvas.frame_stats['draw_calls'] >= 1, "nothing was drawn"
+
+    def test_profiling(self):
+        profiler = self.world.enable_profiling(frame_count=2)
+        for x in [20, 30, 40]:
+            self.send('MOUSEMOVE', 'NOTHING', x, 20)
+        frames = profiler.last_frames()
+        assert [frame['number'] for frame in frames] == [1, 2], "the profiler did not keep the last two frames"
+        assert 'events' in frames[-1]['sections'] and 'vertices' in frames[-1]['sections']
+        assert sum(frame['events'] for frame in frames) > 0, "the frames did not count the events"
+        statistics = profiler.morph_statistics()
+        assert statistics[0]['morph'] is self.button and statistics[0]['events'] > 0
+        trace_events = profiler.chrome_trace()['traceEvents']
+        assert all(trace_event['ph'] == 'X' for trace_event in trace_events)
+        self.world.disable_profiling()
+        self.send('MOUSEMOVE', 'NOTHING', 50, 20)
+        assert profiler.frame_number == 3, "the profiler kept counting after it was disabled"
+
+    def test_list(self):
+        items = list(range(1000))
+        row_factory = TestRowFactory()
+        item_list = core.ListMorph(data_source=items, row_factory=row_factory, row_height=10, overscan=1,
+                                   position=[100, 0], width=100, height=100)
+        self.world.add_morph(item_list)
+        assert item_list.rows_created == 12, "the list did not create only the visible rows"
+        top_row = item_list.row_for_index(0)
+        assert top_row.item == 0 and top_row.position == [0, 90], "the first item is not at the top"
+        self.send('MOUSEMOVE', 'NOTHING', 150, 50)
+        for repeat in range(10):
+            self.send('WHEELDOWNMOUSE', 'PRESS', 150, 50)
+        assert item_list.scroll_offset == 300, "the mouse wheel did not scroll the list"
+        assert self.world.consumed_event, "the mouse wheel over the list was not consumed"
+        assert item_list.rows_created == 13, "rows were created instead of taken from the pool"
+        assert item_list.row_for_index(0) is None and item_list.row_for_index(30).item == 30
+        item_list.scroll_to(100000)
+        assert item_list.scroll_offset == 9900 and item_list.row_for_index(999).position == [0, 0]
+        assert len(item_list.children) == 13
+
+    # each mouse move goes farther than the distance between the mouse and the edge of the dragged morph, the
+    # morph has to keep following the mouse even though the mouse is already outside it when a move arrives
+    def test_drag(self):
+        dragged = core.Morph(position=[110, 10], width=50, height=50)
+        dragged.handles_events = True
+        dragged.handles_mouse_down = True
+        self.world.add_morph(dragged)
+        self.send('MOUSEMOVE', 'NOTHING', 120, 20)
+        self.send('LEFTMOUSE', 'PRESS', 120, 20)
+        for x in [200, 280, 360, 360]:
+            self.send('MOUSEMOVE', 'NOTHING', x, 20)
+        assert dragged.position == [350, 10], "the dragged morph stopped at " + str(dragged.position)
+        assert dragged.drag_drop
+        self.send('LEFTMOUSE', 'RELEASE', 360, 20)
+        assert not dragged.drag_drop, "the drag did not end"
+
+    # morphs are found by name depth first, a morph inside an earlier child comes before a later child
+    def test_names(self):
+        first = core.Morph(name='a')
+        nested = core.Morph(name='b')
+        first.add_morph(nested)
+        later = core.Morph(name='b')
+        self.world.add_morph(first)
+        self.world.add_morph(later)
+        assert self.world.get_child_morph_named('b') is nested, "the later child was found before the nested one"
+        renamed = core.Morph(name='c')
+        self.world.add_morph(renamed)
+        self.world.add_morph(core.Morph(name='c'))
+        renamed.name = 'd'
+        renamed.name = 'c'
+        assert self.world.name_registry.child_named(self.world, 'c') is renamed, "the children order was lost"
+        assert self.world.get_child_morph_named('c') is renamed
+        assert set(self.world.name_registry.morphs_with_prefix('b')) == {nested, later}
+        self.world.remove_morph(first)
+        assert self.world.get_child_morph_named('b') is later, "a removed morph was found"
+    # a bundle gives back the pixels of the PNG files it was built from until a PNG file changes. Building a bundle
+    # removes the older bundles it replaces but not the open one, opening a bundle removes nothing
+    def test_skin_bundle(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        TestFolderWorld.texture_folder = folder
+        world = TestFolderWorld()
+        full_path = world.texture_full_path('a')
+        pixels = numpy.arange(3 * 2 * 4, dtype=numpy.uint8).reshape(3, 2, 4)
+        core.Image.fromarray(pixels, 'RGBA').save(full_path)
+        try:
+            expected = world.read_texture(full_path)['pixels']
+            first_path = world.build_skin_bundle()
+            second_path = world.build_skin_bundle()
+            assert world.skin_bundle_paths() == [second_path], "the replaced bundle was not removed"
+            custom_path = world.build_skin_bundle(os.path.join(folder, 'custom.mskin'))
+            world.open_skin_bundle(custom_path)
+            assert world.skin_bundle_paths() == [second_path], "opening a bundle removed another bundle"
+            skin_bundle = world.open_skin_bundle()
+            third_path = world.build_skin_bundle()
+            assert world.skin_bundle_paths() == [third_path, second_path], "the open bundle was removed"
+            assert os.path.exists(custom_path) and not os.path.exists(first_path)
+            texture = skin_bundle.read_texture(full_path)
+            assert texture['from_bundle'] and numpy.array_equal(texture['pixels'], expected)
+            core.Image.fromarray(255 - pixels, 'RGBA').save(full_path)
+            os.utime(full_path, (os.stat(full_path).st_atime, os.stat(full_path).st_mtime + 10))
+            assert skin_bundle.read_texture(full_path) is None and skin_bundle.stale == 1, "a changed PNG was read"
+            assert numpy.array_equal(world.read_texture(full_path)['pixels'], 255 - expected)
+        finally:
+            if core.Morph.skin_bundle is not None:
+                core.Morph.skin_bundle.close()
+                core.Morph.skin_bundle = None
+            shutil.rmtree(folder)
+    # a morph with its own texture cache gets its texture when the world draws after the texture has loaded.
+    # While it loads the morph is not drawn but its children are
+    def test_asynchronous_loading(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        core.Image.new('RGBA', (4, 4)).save(os.path.join(folder, 'a.png'))
+        TestFolderMorph.texture_folder = folder
+        TestFolderMorph.texture_cache = textures.MTextureCache()
+        TestFolderMorph.read_allowed = threading.Event()
+        try:
+            loading = TestFolderMorph(position=[100, 100], width=20, height=20)
+            child = core.Morph(position=[2, 2], width=5, height=5)
+            loading.add_morph(child)
+            self.world.add_morph(loading)
+            texture = loading.load_texture('a', asynchronous=True)
+            self.send('MOUSEMOVE', 'NOTHING', 200, 200)
+            display_list = self.world.mOpenGLCanvas.display_list
+            visible = display_list.commands[:, display_list.VISIBLE]
+            assert not texture['is_loaded'] and visible[display_list.slots[loading]] == 0
+            assert visible[display_list.slots[child]] == 1, "the children of a loading morph were hidden"
+            TestFolderMorph.read_allowed.set()
+            TestFolderMorph.texture_cache.close()
+            self.send('MOUSEMOVE', 'NOTHING', 200, 200)
+            assert texture['is_loaded'] and texture['dimensions'] == [4, 4], "the texture was not filled in"
+            assert display_list.commands[display_list.slots[loading], display_list.VISIBLE] == 1
+            assert TestFolderMorph.texture_cache not in textures.loading_caches
+        finally:
+            TestFolderMorph.read_allowed.set()
+            TestFolderMorph.texture_cache.close()
+            shutil.rmtree(folder)
+
+    # the same file is read once and shared, a record no one holds is dropped once the cache is over its budget,
+    # the least recently used first, and the OpenGL texture of a dropped record is given to the backend to delete
+    def test_texture_cache(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        for name in ['a', 'b']:
+            core.Image.new('RGBA', (4, 4)).save(os.path.join(folder, name + '.png'))
+        cache = textures.MTextureCache(byte_budget=100)
+        reader = lambda full_path: {'full_path': full_path, 'bytes': 64, 'is_gl_initialised': False}
+        try:
+            first = cache.acquire(os.path.join(folder, 'a.png'), reader)
+            assert cache.acquire(os.path.join(folder, '.', 'a.png'), reader) is first
+            assert cache.misses == 1 and cache.hits == 1 and cache.reference_counts[first['cache_key']] == 2
+            first['is_gl_initialised'] = True
+            first['texture_id'] = 7
+            cache.release(first)
+            cache.release(first)
+            assert cache.evictions == 0, "a texture was dropped while the cache fits its budget"
+            second = cache.acquire(os.path.join(folder, 'b.png'), reader)
+            assert list(cache.records.values()) == [second] and cache.evictions == 1
+            assert cache.bytes_in_use == 64 and cache.take_released_texture_ids() == [7]
+            cache.release(second)
+            cache.clear()
+            assert cache.stats()['textures'] == 0 and cache.take_released_texture_ids() == []
+        finally:
+            shutil.rmtree(folder)
+
+    # the pixels stay 8 bits per channel from the PNG file to the graphic card, an sRGB texture is uploaded as
+    # such and premultiplying rounds to the nearest value
+    def test_texture_pixels(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        full_path = os.path.join(folder, 'a.png')
+        core.Image.new('RGBA', (2, 3), (255, 100, 0, 128)).save(full_path)
+        try:
+            texture = self.button.read_texture(full_path, premultiplied_alpha=True, srgb_to_linear=True)
+            assert texture['pixels'].dtype == numpy.uint8 and texture['pixels'].shape == (3, 8)
+            assert texture['pixels'][0, 0:4].tolist() == [128, 50, 0, 128]
+            assert texture['data_type'] == bgl.GL_UNSIGNED_BYTE and texture['bytes'] == 24
+            assert texture['bytes_saved'] == 72
+            bgl.clear_command_log()
+            self.world.mOpenGLCanvas.initialise_texture(texture)
+            uploads = [command for command in bgl.command_log if command[0] == 'glTexImage2D']
+            assert [upload[3:9] for upload in uploads] == [(bgl.GL_SRGB8_ALPHA8, 2, 3, 0, bgl.GL_RGBA,
+                                                            bgl.GL_UNSIGNED_BYTE)], str(uploads)
+        finally:
+            shutil.rmtree(folder)
+
+    # a morph with alpha_mask_threshold lets the clicks on its transparent pixels through, the others take the
+    # clicks on their whole bounds
+    def test_alpha_mask(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        image = core.Image.new('RGBA', (20, 20), (255, 255, 255, 255))
+        image.paste((0, 0, 0, 0), (0, 0, 10, 20))
+        image.save(os.path.join(folder, 'a.png'))
+        TestFolderMorph.texture_folder = folder
+        TestFolderMorph.texture_cache = textures.MTextureCache()
+        TestFolderMorph.read_allowed = threading.Event()
+        TestFolderMorph.read_allowed.set()
+        try:
+            calls = []
+            masked = TestFolderMorph(position=[100, 100])
+            masked.alpha_mask_threshold = 1
+            masked.load_texture('a')
+            unmasked = TestFolderMorph(position=[200, 100])
+            unmasked.load_texture('a')
+            assert masked.active_texture is not unmasked.active_texture
+            assert 'alpha_mask' not in unmasked.active_texture, "a morph has an alpha mask it did not ask for"
+            for name, morph in [('masked', masked), ('unmasked', unmasked)]:
+                morph.handles_events = True
+                morph.on_mouse_click = lambda event, name=name: calls.append(name)
+                self.world.add_morph(morph)
+            for x, y in [(105, 110), (115, 110), (205, 110)]:
+                self.send('MOUSEMOVE', 'NOTHING', x, y)
+                self.send('LEFTMOUSE', 'PRESS', x, y)
+            assert calls == ['masked', 'unmasked'], "the clicks went on " + str(calls)
+        finally:
+            shutil.rmtree(folder)
+
+    # the morphs draw copies of their textures that point to the page of the atlas and do not keep the pixels.
+    # The pages come from the texture cache and building the atlas again gives back and deletes the old pages
+    def test_texture_atlas(self):
+        folder = tempfile.mkdtemp(prefix='morpheas_test_')
+        for name, size in [('a', (6, 4)), ('b', (3, 3)), ('c', (5, 5))]:
+            core.Image.new('RGBA', size, (255, 0, 0, 255)).save(os.path.join(folder, name + '.png'))
+        TestFolderWorld.texture_folder = folder
+        TestFolderMorph.texture_folder = folder
+        TestFolderMorph.texture_cache = textures.MTextureCache()
+        TestFolderMorph.read_allowed = threading.Event()
+        TestFolderMorph.read_allowed.set()
+        world = TestFolderWorld()
+        texture_cache = world.texture_cache
+        try:
+            first = TestFolderMorph(texture='a')
+            world.add_morph(first)
+            world.add_morph(TestFolderMorph(texture='b', position=[10, 0]))
+            old_page = world.build_texture_atlas(page_size=32, padding=2)[0]
+            texture = first.active_texture
+            assert texture['atlas'] is old_page and texture['pixels'] is None, "the copy kept the pixels"
+            assert texture_cache.reference_counts[old_page['cache_key']] == 1, "the page is not in the cache"
+            world.mOpenGLCanvas.initialise_texture(old_page)
+            world.add_morph(TestFolderMorph(texture='c', position=[20, 0]))
+            new_page = world.build_texture_atlas(page_size=32, padding=2)[0]
+            assert new_page is not old_page and old_page['cache_key'] not in texture_cache.records
+            assert old_page['texture_id'] in texture_cache.take_released_texture_ids(), "the old page was not freed"
+        finally:
+            world.texture_atlas.release_pages(world.texture_atlas.pages)
+            shutil.rmtree(folder)
+    # a click goes down from the child of the world to the deepest morph under the mouse (capture) and back up
+    # (bubble), and stops at the first morph that consumes it
+    def test_event_routing(self):
+        calls = []
+        panel = core.Morph(position=[100, 100], width=100, height=100)
+        inner = core.Morph(position=[10, 10], width=50, height=50)
+        panel.add_morph(inner)
+        self.world.add_morph(panel)
+        for name, morph in [('panel', panel), ('inner', inner)]:
+            morph.handles_events = True
+            morph.on_capture_event = lambda event, name=name: calls.append('capture ' + name)
+            morph.on_mouse_click = lambda event, name=name: calls.append('click ' + name)
+        self.send('MOUSEMOVE', 'NOTHING', 120, 120)
+        self.send('LEFTMOUSE', 'PRESS', 120, 120)
+        assert calls == ['capture panel', 'capture inner', 'click inner', 'click panel'], str(calls)
+        del calls[:]
+        inner.on_mouse_click = lambda event: self.consume(calls, 'click inner')
+        self.send('LEFTMOUSE', 'PRESS', 120, 120)
+        assert calls == ['capture panel', 'capture inner', 'click inner'], "the click went on " + str(calls)
+        del calls[:]
+        panel.on_capture_event = lambda event: self.consume(calls, 'capture panel')
+        self.send('LEFTMOUSE', 'PRESS', 120, 120)
+        assert calls == ['capture panel'], "a captured click reached " + str(calls)
+        assert self.world.consumed_event
+
+    # with batch_events the mouse moves wait in the queue, each replacing the one before it, until the queue is
+    # handled. A click handles the queue at once so the world can tell Blender whether it was consumed
+    def test_event_batching(self):
+        self.world.batch_events = True
+        self.world.reset_event_counters()
+        for x in [100, 110, 20, 25]:
+            self.world.on_event(HeadlessEvent('MOUSEMOVE', 'NOTHING', x, 20, self.context), self.context)
+        assert self.world.events_coalesced == 3 and self.world.events_processed == 0, "the mouse moves were handled"
+        assert not self.world.process_event_queue(self.context)
+        assert self.world.events_processed == 1 and self.world.batches_processed == 1
+        self.world.draw(self.context)
+        clicks = []
+        self.button.on_left_click = lambda: clicks.append(self.world.mouse_position)
+        self.world.on_event(HeadlessEvent('MOUSEMOVE', 'NOTHING', 20, 20, self.context), self.context)
+        self.world.on_event(HeadlessEvent('LEFTMOUSE', 'PRESS', 20, 20, self.context), self.context)
+        assert clicks == [[25, 20]] and self.world.consumed_event, "the click was not handled at once"
+        assert self.world.event_queue == [] and self.world.events_processed == 3
+
+    # a morph that changed damages where it was and where it is now, rectangles that overlap are merged. With
+    # partial redraw a frame without damage is not drawn and a damaged one is drawn only inside its damage
+    def test_damage(self):
+        self.world.collect_damage()
+        morph = core.Morph(position=[100, 100], width=10, height=10)
+        self.world.add_morph(morph)
+        assert self.world.collect_damage() == [[100, 100, 110, 110]]
+        morph.position = [105, 100]
+        assert self.world.collect_damage() == [[100, 100, 115, 110]], "the old and new area were not merged"
+        morph.position = [200, 200]
+        assert sorted(self.world.collect_damage()) == [[105, 100, 115, 110], [200, 200, 210, 210]]
+        assert self.world.collect_damage() == [], "the damage was not forgotten"
+        self.world.max_damaged_rectangles = 1
+        morph.position = [300, 200]
+        assert self.world.collect_damage() == [[200, 200, 310, 210]], "too many rectangles were not merged"
+        canvas = self.world.mOpenGLCanvas
+        canvas.partial_redraw = True
+        self.send('MOUSEMOVE', 'NOTHING', 50, 250)
+        self.send('MOUSEMOVE', 'NOTHING', 50, 250)
+        assert canvas.frames_skipped == 1, "a frame without damage was drawn"
+        bgl.clear_command_log()
+        morph.color = [1.0, 0.0, 0.0, 1.0]
+        self.send('MOUSEMOVE', 'NOTHING', 50, 250)
+        assert [command[1:] for command in bgl.command_log if command[0] == 'glScissor'] == [(300, 200, 11, 11)]
+
+    def consume(self, calls, call):
+        calls.append(call)
+        self.world.consumed_event = True
+    # a morph of a compact world is a view of its slot, it gives back the values it was given and after the world
+    # has drawn it takes less memory than a morph that keeps its own values
+    def test_compact_storage(self):
+        compact_world = core.World(compact_storage=True)
+        morph = core.Morph(position=[5, 6.5], width=10, height=10, color=(1, 0, 0.5, 1))
+        compact_world.add_morph(morph)
+        assert morph._position is None and morph._color is None, "the morph kept a copy of its values"
+        assert not hasattr(morph, '__dict__') or '_position' not in morph.__dict__
+        assert morph.position == [5, 6.5] and type(morph.position[0]) is int
+        assert morph.color == (1, 0, 0.5, 1) and type(morph.color) is tuple
+        compact_world.morph_store.move_morphs([morph, morph], [1, 1])
+        assert morph.position == [6, 7.5] and morph.world_position == [6, 7.5], "the morph did not move once"
+        compact_world.remove_morph(morph)
+        assert morph._store is None and morph.position == [6, 7.5], "the morph lost its values when removed"
+        sizes = [self.bytes_per_morph(compact_storage) for compact_storage in (False, True)]
+        assert sizes[1] < sizes[0], "a compact morph takes %d bytes, a normal one %d" % (sizes[1], sizes[0])
+
+    # the memory a world of many drawn morphs with their own colors takes for each of its morphs
+    def bytes_per_morph(self, compact_storage, count=2000):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        world = core.World(compact_storage=compact_storage)
+        for index in range(count):
+            world.add_morph(core.Morph(position=[index % 50 * 8, index // 50 * 8], width=6, height=6,
+                                       color=[index % 10 / 10, 0.5, 0.5, 1]))
+        world.draw(self.context)
+        world.collect_damage()
+        size = (tracemalloc.get_traced_memory()[0] - before) / count
+        tracemalloc.stop()
+        world.close()
+        return size
+
+
+# a morph with its own texture cache that takes its textures from a folder and reads them only once it is
+# allowed to, see test_asynchronous_loading
+class TestFolderMorph(core.Morph):
+    instances = []
+    texture_folder = None
+    texture_cache = None
+    read_allowed = None
+
+    def texture_full_path(self, name):
+        return os.path.join(self.texture_folder, name + '.png')
+
+    def read_texture(self, full_path, **options):
+        self.read_allowed.wait()
+        return super().read_texture(full_path, **options)
+
+# a world that takes its textures from the folder of test_skin_bundle
+class TestFolderWorld(core.World):
+    instances = []
+    texture_folder = None
+
+    def texture_full_path(self, name):
+        return os.path.join(self.texture_folder, name + '.png')
+
+
+# makes the rows of the list in test_list, each row remembers the item it shows
+class TestRowFactory():
+    def create_row(self, list_morph):
+        return core.Morph()
+
+    def bind_row(self, row, item, index):
+        row.item = item
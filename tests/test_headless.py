@@ -0,0 +1,41 @@
+import os, subprocess, sys
+from .. import core
+from ..headless import bgl
+
+def run(logger):
+    test_headless = TestHeadless(logger)
+    test_headless.run()
+
+# imports the package in a new Python process without Blender, the way tests and benchmarks run outside Blender.
+# Inside Blender the test is skipped because the Blender modules can always be imported there
+class TestHeadless():
+    instances=[]
+
+    def __init__(self,logger):
+        self.__class__.instances.append(self)
+        self.log = logger
+
+    def run(self):
+        if core.bgl is not bgl:
+            self.log.info("TestHeadless skipped, it runs only outside Blender")
+            return
+        self.test_import()
+        self.log.info("TestHeadless test_import passed")
+
+    def test_import(self):
+        package = __package__.rsplit('.', 1)[0]
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for part in package.split('.'):
+            root = os.path.dirname(root)
+        source = "import importlib, sys\n" \
+                 "core = importlib.import_module('" + package + ".core')\n" \
+                 "headless = importlib.import_module('" + package + ".headless')\n" \
+                 "assert 'bpy' not in sys.modules, 'the Blender modules were imported'\n" \
+                 "assert core.bgl is headless.bgl, 'the headless bgl was not used'\n" \
+                 "assert core.Image.new('RGBA', (2, 2)).size == (2, 2)\n"
+        environment = dict(os.environ)
+        environment['PYTHONPATH'] = os.pathsep.join([root] + sys.path)
+        result = subprocess.run([sys.executable, '-c', source], env=environment, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        assert result.returncode == 0, "the package cannot be imported outside Blender\n" + \
+            result.stdout.decode(errors='replace')
@@ -0,0 +1,227 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# The texture cache. Many morphs use the same PNG file, fifty buttons of the same skin for example, and without
+# the cache each one would decode the file and keep its own copy of the pixels. The cache hands out one texture
+# record for each PNG file, whatever the scale each morph draws it at, and counts how many morphs hold it.
+# Records no morph holds stay in the cache so loading them again is free, until the cache needs the memory.
+# Then the ones used least recently are dropped.
+# Textures can also be loaded asynchronously. The PNG file is decoded by worker threads and the record is filled
+# in later by finish_loading. The World calls finish_all_loading every time it draws, which finishes the loads of
+# every cache, see acquire
+
+import os, collections, concurrent.futures, logging, weakref
+from .. import pylivecoding
+
+logger = logging.getLogger(__name__)
+
+
+class MTextureCache(pylivecoding.LiveObject):
+    instances = []
+    def __init__(self, byte_budget=256 * 1024 * 1024, worker_count=4):
+        super().__init__()
+
+        # the most memory in bytes the textures of the cache may take. Textures held by morphs are never dropped
+        # so the cache can go above the budget if the morphs hold that much
+        self.byte_budget = byte_budget
+
+        # the texture records by key, least recently used first, and how many morphs hold each one
+        self.records = collections.OrderedDict()
+        self.reference_counts = {}
+
+        # the OpenGL ids of the dropped textures, the backend deletes them the next time it draws
+        self.released_texture_ids = []
+
+        # the futures of the textures the worker threads are loading and the functions to call once each
+        # has loaded, by key. The worker threads start with the first asynchronous load
+        self.loading = {}
+        self.load_callbacks = {}
+        self.worker_count = worker_count
+        self.executor = None
+
+        self.bytes_in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failures = 0
+
+    # the same file under a different path is the same texture, a file that changed is a different texture
+    def key(self, full_path):
+        real_path = os.path.realpath(full_path)
+        return (real_path, os.path.getmtime(real_path))
+
+    # returns the texture record of the PNG file and counts one more holder for it. reader is called with the
+    # options to load the file when it is not in the cache, see Morph.read_texture. The same file loaded with
+    # different options is a different texture. When asynchronous is True and the file is not in the cache the
+    # reader is called by a worker thread and the record is returned empty, with is_loaded False, and
+    # on_load is called with it once it has loaded. Asking for a texture that is still loading without
+    # asynchronous waits for it
+    def acquire(self, full_path, reader, options=None, asynchronous=False, on_load=None):
+        if options is None:
+            options = {}
+        key = self.key(full_path) + tuple(sorted(options.items()))
+        record = self.records.get(key)
+        if record is None:
+            self.misses += 1
+            if asynchronous:
+                record = self.start_loading(key, full_path, reader, options)
+            else:
+                record = self.add(key, reader(full_path, **options))
+        else:
+            self.hits += 1
+            self.records.move_to_end(key)
+            if key in self.loading and not asynchronous and self.finish(key) is None:
+                record = self.add(key, reader(full_path, **options))
+        if key in self.loading and on_load is not None:
+            self.load_callbacks[key].append(on_load)
+        self.reference_counts[key] += 1
+        self.evict()
+        return record
+
+    # starts loading the PNG files in the background without holding them, so they are in the cache when
+    # morphs ask for them
+    def prefetch(self, full_paths, reader, options=None):
+        if options is None:
+            options = {}
+        for full_path in full_paths:
+            key = self.key(full_path) + tuple(sorted(options.items()))
+            if key not in self.records:
+                self.start_loading(key, full_path, reader, options)
+
+    def add(self, key, record):
+        record['cache_key'] = key
+        self.records[key] = record
+        self.reference_counts[key] = 0
+        self.bytes_in_use += record['bytes']
+        return record
+
+    # adds an empty record for the texture and gives the reading of the file to a worker thread
+    def start_loading(self, key, full_path, reader, options):
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.worker_count)
+        record = self.add(key, {'dimensions': [0, 0], 'full_path': full_path, 'data': None, 'pixels': None,
+                                'bytes': 0, 'is_loaded': False, 'is_gl_initialised': False, 'texture_id': 0})
+        self.loading[key] = self.executor.submit(reader, full_path, **options)
+        self.load_callbacks[key] = []
+        loading_caches.add(self)
+        return record
+
+    # fills in the records of the textures the worker threads have finished with and lets their holders know.
+    # It has to be called from the thread that draws, returns the records that loaded
+    def finish_loading(self):
+        loaded = []
+        for key in list(self.loading):
+            if self.loading[key].done():
+                record = self.finish(key)
+                if record is not None:
+                    loaded.append(record)
+        return loaded
+
+    # waits for the texture to load and fills in its record. A texture that failed to load is logged and left out
+    # of the cache and its holders keep the empty record
+    def finish(self, key):
+        future = self.loading.pop(key)
+        callbacks = self.load_callbacks.pop(key)
+        if len(self.loading) == 0:
+            loading_caches.discard(self)
+        record = self.records[key]
+        try:
+            record.update(future.result())
+        except Exception as error:
+            logger.warning("failed to load texture %s : %s", record['full_path'], error)
+            self.failures += 1
+            del self.records[key]
+            del self.reference_counts[key]
+            return None
+        self.bytes_in_use += record['bytes']
+        for callback in callbacks:
+            callback(record)
+        self.evict()
+        return record
+
+    # a holder of the record does not need it anymore
+    def release(self, record):
+        key = record.get('cache_key')
+        if self.reference_counts.get(key, 0) > 0:
+            self.reference_counts[key] -= 1
+            self.evict()
+
+    # drops the record at once if no one holds it, for a record that will not be asked for again
+    def discard(self, record):
+        key = record.get('cache_key')
+        if self.records.get(key) is record and self.reference_counts[key] == 0 and key not in self.loading:
+            self.drop(key)
+
+    # drops the least recently used records no one holds until the cache fits its budget
+    def evict(self):
+        if self.bytes_in_use <= self.byte_budget:
+            return
+        for key in list(self.records):
+            if self.bytes_in_use <= self.byte_budget:
+                break
+            if self.reference_counts[key] == 0 and key not in self.loading:
+                self.drop(key)
+
+    def drop(self, key):
+        record = self.records.pop(key)
+        del self.reference_counts[key]
+        self.bytes_in_use -= record['bytes']
+        self.evictions += 1
+        if record['is_gl_initialised']:
+            self.released_texture_ids.append(record['texture_id'])
+            record['is_gl_initialised'] = False
+
+    # returns the OpenGL ids of the dropped textures and forgets them
+    def take_released_texture_ids(self):
+        texture_ids = self.released_texture_ids
+        self.released_texture_ids = []
+        return texture_ids
+
+    # waits for the textures being loaded and stops the worker threads, they start again with the next
+    # asynchronous load. The textures that loaded are filled in by the next finish_loading
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    # drops every record no one holds
+    def clear(self):
+        for key in list(self.records):
+            if self.reference_counts[key] == 0 and key not in self.loading:
+                self.drop(key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'failures': self.failures,
+                'bytes_in_use': self.bytes_in_use, 'byte_budget': self.byte_budget, 'textures': len(self.records),
+                'bytes_saved': sum(record.get('bytes_saved', 0) for record in self.records.values()),
+                'held_textures': sum(1 for count in self.reference_counts.values() if count > 0),
+                'loading': len(self.loading)}
+
+
+# the cache shared by the morphs of all worlds, see Morph.texture_cache
+shared_texture_cache = MTextureCache()
+
+# the caches that have textures loading, a morph class can have its own cache instead of the shared one
+loading_caches = weakref.WeakSet()
+
+# fills in the textures the worker threads of all caches have finished with, returns the records that loaded
+def finish_all_loading():
+    loaded = []
+    for cache in list(loading_caches):
+        loaded.extend(cache.finish_loading())
+    return loaded